@@ -252,7 +252,12 @@ class Admin(commands.Cog, name="admin", command_attrs={}):
                 return
 
     async def blacklist_check(self, ctx: commands.Context):
-        bl = await self.bot.db.fetch_blacklist(ctx.author.id)
+        # the index answers for everyone that isn't blacklisted, only blacklisted users need their row.
+        # until it's loaded every user is looked up, a missing index must not let anyone through.
+        if self.bot.db.blacklist_index.loaded and not self.bot.db.is_blacklisted(ctx.author.id):
+            return True
+
+        bl = self.bot.db.get_blacklist(ctx.author.id) or await self.bot.db.fetch_blacklist(ctx.author.id, cache=True)
         if bl and bl.is_blacklisted:
             raise BlacklistedUser(
                 obj=bl,
@@ -323,29 +328,24 @@ class Admin(commands.Cog, name="admin", command_attrs={}):
             Table.USERECO,
             Table.USERS,
         ]
-        entries: list[int] = []
-        for table in remove_from:
-            if table in exclude:
-                continue
-            user_id_key, cache = self.bot.db._table_to_cache[table]
-            if action == "GET":
-                query = f"SELECT {user_id_key} FROM {table}"
-                res = await self.bot.db.fetch(query)
-                entries.extend(int(entry[user_id_key]) for entry in res)
-            elif action == "REMOVE":
-                for user_id in user_ids:
-                    cache.pop(int(user_id), None)
-
-                query = f"DELETE FROM {table} WHERE {user_id_key} = $1"
-                await self.bot.db.executemany(
-                    query,
-                    table,
-                    user_id_key,
-                    *[tuple(str(user_id)) for user_id in user_ids],
-                )
-
+        tables = [table for table in remove_from if table not in exclude]
         if action == "GET":
-            return entries
+            # de-duplicated on the server and read through a cursor.
+            return [user_id async for user_id in self.bot.db.distinct_ids(*tables)]
+
+        # one connection for every table, and all or nothing when removing.
+        async with self.bot.db.transaction():
+            for table in tables:
+                query = f"DELETE FROM {table} WHERE userid = $1"
+                await self.bot.db.executemany(query, *[(int(user_id),) for user_id in user_ids])
+
+        if action == "REMOVE":
+            for user_id in user_ids:
+                self.bot.db.forget_ensured_user(int(user_id))
+                if Table.BADGES in tables:
+                    self.bot.db.badge_index.discard_user(int(user_id))
+                for table in tables:
+                    self.bot.db._table_to_cache[table][1].pop(int(user_id), None)
 
     @commands.hybrid_group(name="owner")
     @discord.app_commands.guilds(OS)
@@ -365,15 +365,17 @@ class Admin(commands.Cog, name="admin", command_attrs={}):
         Default is `False`.
         """
         await ctx.typing()
-        # type: ignore
-        db_users: list[int] = await self.get_or_remove_users_from_database("GET")
-        set_db_users = set(db_users)
         set_discord_users = {x.id for x in self.bot.users}
-        extra_users = list(set_db_users - set_discord_users)
+        db_user_count = 0
+        extra_users: list[int] = []
+        async for user_id in self.bot.db.distinct_ids(Table.BADGES, Table.BLACKLIST, Table.USERECO, Table.USERS):
+            db_user_count += 1
+            if user_id not in set_discord_users:
+                extra_users.append(user_id)
         if view:
             await ctx.send(
                 (
-                    f"Unqiue users in the database: {len(set_db_users)}\n"
+                    f"Unqiue users in the database: {db_user_count}\n"
                     f"Unique users for the bot: {len(set_discord_users)}\n"
                     f"{len(extra_users)} users are in the database but not sharing a server with the bot.\n"
                     "set `view` to False to remove them from the database."
@@ -743,6 +745,53 @@ class Admin(commands.Cog, name="admin", command_attrs={}):
 
         await message.edit(content=f"Done! Chunked {chunked} guilds.")
 
+    @owner.command(name="dbstats")
+    @commands.check(permissions.is_owner)
+    async def db_stats(
+        self,
+        ctx: commands.Context,
+        sort: Literal["total", "count", "max", "errors"] = "total",
+        amount: int = 10,
+        reset: bool = False,
+    ):
+        """Show the query shapes that spend the most time in Postgres and who runs them.
+
+        Args:
+            sort: What to rank the shapes by. Defaults to the total time spent.
+            amount: How many shapes to show. Defaults to 10.
+            reset: Clear the stats after showing them.
+        """
+        stats = self.bot.db.query_stats
+        wait_p50, wait_p95, wait_p99 = stats.acquire.percentiles(50, 95, 99)
+        lines = [
+            f"{stats.total_queries:,} queries over {len(stats.shapes):,} shapes",
+            f"pool wait: p50 {wait_p50 * 1000:.1f}ms | p95 {wait_p95 * 1000:.1f}ms | p99 {wait_p99 * 1000:.1f}ms"
+            f" | max {stats.acquire.max * 1000:.1f}ms",
+            f"pool: {self.bot.db.pool_manager!r}",
+        ]
+        if self.bot.db.replicas is not None:
+            lines.append(f"replicas: {self.bot.db.replicas!r}")
+            lines.extend(f"  {replica!r}" for replica in self.bot.db.replicas.replicas)
+        lines.append("")
+        for entry in stats.top(amount, by=sort):
+            p50, p95, p99 = entry.percentiles(50, 95, 99)
+            caller, calls = entry.callers.most_common(1)[0]
+            lines.append(
+                f"{entry.count:,}x | {entry.total:.2f}s total | p50 {p50 * 1000:.1f}ms | p95 {p95 * 1000:.1f}ms"
+                f" | p99 {p99 * 1000:.1f}ms | {entry.errors} errors | {entry.slow} slow"
+            )
+            lines.append(f"  {entry.shape[:300]}")
+            lines.append(f"  mostly from {caller} ({calls:,} of {sum(entry.callers.values()):,} sampled)")
+
+        text = "\n".join(lines)
+        if len(text) > 1900:
+            await ctx.send(file=discord.File(BytesIO(text.encode()), filename="dbstats.txt"))
+        else:
+            await ctx.send(f"```\n{text}```")
+
+        if reset:
+            stats.reset()
+
     async def get_commit(self, ctx):
         COMMAND = "git branch -vv"
         proc = await asyncio.create_subprocess_shell(
@@ -851,8 +900,8 @@ class Admin(commands.Cog, name="admin", command_attrs={}):
     @commands.check(permissions.is_owner)
     async def chunk_guilds(self, ctx):
         bruh = await ctx.send("Chunking guilds...")
-        # chunk db because why not
-        await self.bot.db.chunk(guilds=True)
+        # only picks up the guild rows that changed since the last refresh.
+        await self.bot.db.refresh(Table.GUILDS)
         chunked_guilds = 0
         chunked = []
 
@@ -961,13 +1010,16 @@ class Admin(commands.Cog, name="admin", command_attrs={}):
 
             db_user = await self.bot.db.add_blacklist(user_id)
 
-        kwargs: dict[str, Any] = {"blacklisted": options.blacklist}
-        if options.reason:
-            kwargs["reason"] = options.reason
-        if options.days:
-            kwargs["blacklistedtill"] = options.days
+        if options.blacklist and options.days:
+            # sets blacklistedtill and expires_at, the blacklist is lifted when it runs out.
+            await self.bot.db.temp_blacklist(user_id, options.days, options.reason)
+        else:
+            # no expiry either way, a permanent blacklist must not keep an old temporary one's.
+            kwargs: dict[str, Any] = {"blacklisted": options.blacklist, "blacklistedtill": None, "expires_at": None}
+            if options.reason:
+                kwargs["reason"] = options.reason
 
-        await db_user.edit(**kwargs)
+            await db_user.edit(**kwargs)
 
         temp = " temporarily" if options.blacklist and options.days else ""
         what = "blacklisted" if options.blacklist else "unblacklisted"
@@ -1065,8 +1117,9 @@ class Admin(commands.Cog, name="admin", command_attrs={}):
             user_blacklist = await self.bot.db.getch("blacklist", int(user_id))
             if not user_blacklist:
                 await self.bot.db.add_blacklist(user.id, blacklisted=True)
-            elif user_blacklist.is_blacklisted is False:
-                await user_blacklist.edit(blacklisted=True)
+            elif not user_blacklist.is_blacklisted or getattr(user_blacklist, "expires_at", None) is not None:
+                # temporary blacklists become permanent.
+                await user_blacklist.edit(blacklisted=True, blacklistedtill=None, expires_at=None)
         await ctx.send("Done.")
         await self.add_success_reaction()
         return
@@ -10,6 +10,7 @@ import discord
 from discord.ext import commands, tasks
 from index import DEV, colors, config
 from lunarapi import Client, endpoints
+from Manager.database import Table
 from Manager.emoji import Emoji
 from Manager.logger import formatColor
 from sentry_sdk import capture_exception
@@ -98,6 +99,14 @@ class autoposting(commands.Cog, name="ap"):
             channel = await self.bot.fetch_channel(channel_id)
         return channel
 
+    async def remove_channel(self, guild_id: int) -> None:
+        # the edit writes through to the autopost registry.
+        db_guild = await self.bot.db.getch(Table.GUILDS, guild_id)
+        if db_guild is not None:
+            await db_guild.edit(hentaichannel=None)
+        else:
+            self.bot.db.autopost_channels.discard(guild_id)
+
     @tasks.loop(minutes=5)
     async def autoh(self):
         posts = 0
@@ -110,13 +119,13 @@ class autoposting(commands.Cog, name="ap"):
             colour=colors.prim,
         )
 
-        db_guilds = await self.bot.db.fetch_guilds()
-        hentai_channel_ids = [(x, x.hentai_channel_id) for x in db_guilds if x.hentai_channel_id is not None]
+        # only the guilds with an autopost channel, kept in memory by the database.
+        hentai_channel_ids = self.bot.db.autopost_channels
 
         # for _ in range(len(hentai_channel_ids)):
         #     data = await get_hentai_img()
         channel = ""
-        for (guild, channel_id) in hentai_channel_ids:
+        for (guild_id, channel_id) in hentai_channel_ids:
             try:
                 embed.set_image(url=(await self.get_hentai_img())["url"])
             except Exception:
@@ -129,8 +138,8 @@ class autoposting(commands.Cog, name="ap"):
             try:
                 channel = await self.bot.fetch_channel(channel_id)
             except discord.NotFound:
-                log(f"Autoposting - {channel.id} is invalid, removing the channel.")
-                await guild.edit(hentaichannel=None)
+                log(f"Autoposting - {channel_id} is invalid, removing the channel.")
+                await self.remove_channel(guild_id)
                 continue
 
             if not channel:
@@ -154,7 +163,7 @@ class autoposting(commands.Cog, name="ap"):
 
             # remove channel from db if it's not a NSFW channel
             if not channel.is_nsfw():
-                await guild.edit(hentaichannel=None)
+                await self.remove_channel(guild_id)
                 # await self.bot.db.execute(
                 #     "DELETE FROM guilds WHERE hentaichannel = $1", str(channel_id)
                 # )
@@ -207,7 +216,7 @@ class autoposting(commands.Cog, name="ap"):
                 log("AutoPosting - Removing hentai channel from database")
                 # this is probably an awful idea but its the only way to remove the channel if the bot is not allowed to post in it
                 # lets hope discord doesnt fuck up and the webhook is actually there
-                await guild.edit(hentaichannel=None)
+                await self.remove_channel(guild_id)
 
                 # subtarct 1 from the posts
                 posts -= 1
@@ -95,7 +95,7 @@ class Dev(commands.Cog, name="dev"):
         db_user = await self.bot.db.fetch_blacklist(user.id)
 
         if not db_user or db_user is None:
-            await self.bot.db.add_temp_blacklist(user.id, blacklisted=True, days=days)
+            await self.bot.db.add_temp_blacklist(user.id, days=days)
             await Embed(
                 title="Temporary Blacklist",
                 description=f"{user.id} was not in the database!\nThey have been added and blacklisted for {days} days.",
@@ -105,7 +105,7 @@ class Dev(commands.Cog, name="dev"):
             #     user.id, blacklisted=True, days=days
             # ) # Exchanged for modify, leaving it for archival and reverting purposes
 
-            await db_user.modify(blacklisted=True, blacklistedtill=days)
+            await self.bot.db.temp_blacklist(user.id, days)
             await Embed(
                 title="Temporary Blacklist",
                 description=f"{user.id} has been blacklisted for {days} days.",
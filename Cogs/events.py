@@ -128,36 +128,14 @@ class events(commands.Cog):
             await log_channel.send(embed=embed)
 
     @commands.Cog.listener(name="on_command")
-    async def blacklist_check(self, ctx):
+    async def ensure_user_rows(self, ctx):
 
         if ctx.author.bot:
             return
-        db_blacklist_user = self.bot.db.get_blacklist(ctx.author.id) or await self.bot.db.fetch_blacklist(ctx.author.id)
-        if not db_blacklist_user:
-            await self.bot.db.add_blacklist(ctx.author.id, False)
-            log(f"No blacklist entry detected for: {ctx.author.id} / {ctx.author} | Added to database!")
 
-    @commands.Cog.listener(name="on_command")
-    async def badge(self, ctx):
-
-        if ctx.author.bot:
-            return
-
-        badge_user = await self.bot.db.fetchrow("SELECT * FROM public.badges WHERE userid = $1", ctx.author.id)
-        if not badge_user:
-            await self.bot.db.execute("INSERT INTO badges (userid) VALUES ($1)", ctx.author.id)
-            log(f"No badge entry detected for: {ctx.author.id} / {ctx.author} | Added to database!")
-
-    @commands.Cog.listener(name="on_command")
-    async def eco(self, ctx):
-
-        if ctx.author.bot:
-            return
-
-        db_eco_user = self.bot.db.get_economy_user(ctx.author.id) or await self.bot.db.fetch_economy_user(ctx.author.id)
-        if not db_eco_user:
-            await self.bot.db.add_economy_user(ctx.author.id, balance=1000, bank=500)
-            log(f"No economy entry detected for: {ctx.author.id} / {ctx.author} | Added to database!")
+        added = await self.bot.db.ensure_user(ctx.author.id)
+        for table in added:
+            log(f"No {table} entry detected for: {ctx.author.id} / {ctx.author} | Added to database!")
 
     #     if ctx.author.bot:
     #         return
@@ -172,7 +150,9 @@ class events(commands.Cog):
         if not ctx.guild or ctx.author.bot:
             return
 
-        db_user = await self.bot.db.getch("users", ctx.author.id)
+        # only logging, getch gives None instead of queueing when the pool is saturated.
+        with self.bot.db.non_critical():
+            db_user = await self.bot.db.getch("users", ctx.author.id)
         if db_user and not db_user.message_tracking:
             return
 
@@ -243,19 +223,20 @@ class events(commands.Cog):
         await channel.send(embed=embed)
         # Add server to database
 
-        db_guild = await self.bot.db.fetch_guild(guild.id)
-        if db_guild:
-            log(f"New guild joined: {guild.id} | But it was already in the DB")
-        else:
-            await self.bot.db.add_guild(guild.id)
-            log(f"New guild joined: {guild.id} | Added to database!")
+        async with self.bot.db.acquire():
+            db_guild = await self.bot.db.fetch_guild(guild.id)
+            if db_guild:
+                log(f"New guild joined: {guild.id} | But it was already in the DB")
+            else:
+                await self.bot.db.add_guild(guild.id)
+                log(f"New guild joined: {guild.id} | Added to database!")
 
-        guild_commands = await self.bot.db.fetchrow("SELECT * FROM commands WHERE guild = $1", guild.id)
-        if not guild_commands:
-            await self.bot.db.execute("INSERT INTO commands (guild) VALUES ($1)", guild.id)
+            guild_commands = await self.bot.db.fetchrow("SELECT * FROM commands WHERE guild = $1", guild.id)
+            if not guild_commands:
+                await self.bot.db.execute("INSERT INTO commands (guild) VALUES ($1)", guild.id)
 
-        # add to blacklist and handle if blacklisted
-        db_guild_blacklist = await self.bot.db.getch("guildblacklists", guild.id)
+            # add to blacklist and handle if blacklisted
+            db_guild_blacklist = await self.bot.db.getch("guildblacklists", guild.id)
         if db_guild_blacklist and db_guild_blacklist.is_blacklisted:
             await guild.leave()
             log(f"Left {guild.id} / {guild.name} because it was blacklisted")
@@ -265,11 +246,8 @@ class events(commands.Cog):
         if DEV:
             return
 
-        db_user = await self.bot.db.getch("users", ctx.author.id)
-        if not db_user:
-            db_user = await self.bot.db.add_user(ctx.author.id)
-
-        await db_user.edit(usedcmds=db_user.used_commands + 1)  # type: ignore
+        # the users row exists already, see ensure_user_rows. batched, see Database.command_uses
+        self.bot.db.command_uses.increment(ctx.author.id)
 
 
 async def setup(bot: AGB) -> None:
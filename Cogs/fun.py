@@ -20,6 +20,7 @@ import nekos
 from dadjokes import Dadjoke
 from discord.ext import commands
 from index import Website, colors, config
+from Manager.database import Table
 from sentry_sdk import capture_exception
 from utils import imports, permissions
 from utils.checks import voter_only
@@ -307,7 +308,7 @@ class Fun(commands.Cog, name="fun"):
         Generates a pie chart, representing the last 10000 messages in the specified channel.
         This command has a server wide cooldown of 300 seconds.
         """
-        db_user = self.bot.db.get_user(ctx.author.id) or await self.bot.db.fetch_user(ctx.author.id)
+        db_user = await self.bot.db.getch(Table.USERS, ctx.author.id)
         if not db_user or not db_user.message_tracking:
             await ctx.send("You are opted out of message tracking!\nTo opt back in, use `/optin`")
             return
@@ -361,7 +362,7 @@ class Fun(commands.Cog, name="fun"):
         And proceed to build a chart out of that.
         This command has a global serverwide cooldown of 3600 seconds.
         """
-        db_user = self.bot.db.get_user(ctx.author.id) or await self.bot.db.fetch_user(ctx.author.id)
+        db_user = await self.bot.db.getch(Table.USERS, ctx.author.id)
         if not db_user or not db_user.message_tracking:
             await ctx.send("You are opted out of message tracking!\nTo opt back in, use `/optin`")
             return
@@ -22,6 +22,7 @@ import requests
 from discord.ext import commands
 from discord.ui import Button, View
 from index import colors, config
+from Manager.database import Table
 from utils import default, imports, permissions
 from utils.common_filters import filter_mass_mentions
 from utils.embeds import EmbedMaker as Embed
@@ -391,7 +392,8 @@ class Information(commands.Cog, name="info"):
         else:
             shards = f"{self.bot.shard_count:,} shards"
         made = discord.utils.format_dt(self.bot.user.created_at, style="R")
-        total_used_cmds = f"{sum(x.used_commands for x in await self.bot.db.fetch_users()):,}"
+        used_cmds = await self.bot.db.sum_column(Table.USERS, "usedcmds") + self.bot.db.command_uses.pending
+        total_used_cmds = f"{used_cmds:,}"
         uptime = discord.utils.format_dt(self.bot.launch_time, style="R")
         cpu = psutil.cpu_percent()
         cpu_box = default.draw_box(round(cpu), ":blue_square:", ":black_large_square:")
@@ -563,23 +565,12 @@ class Information(commands.Cog, name="info"):
         user_balance = f"${usereco.balance:,}"
         user_bank = f"${usereco.bank:,}"
 
-        # TODO: will do later... like when needed....
-        badges = ""
-        # cached_badges = self.bot.db._badges
-        # fetched_badges = (
-        #    list(cached_badges.values())
-        #    if cached_badges
-        #    else await self.bot.db.fetch_badges()
-        # )
-
-        #    badges_list = [
-        #    badge for badge in fetched_badges if badge.has_badge(user.id) is True
-        # ]
-        # badges = " ".join(b.name for b in badges_list)
-
-        db_user = self.bot.db.get_user(user.id) or await self.bot.db.fetch_user(user.id)
+        badges = " ".join(b.name for b in self.bot.db.get_user_badges(user.id))
+
+        db_user = await self.bot.db.getch(Table.USERS, user.id)
         if db_user:
-            used_commands = db_user.used_commands + 1
+            # increments are written in batches, see Database.command_uses
+            used_commands = db_user.used_commands + self.bot.db.command_uses.get_pending(user.id) + 1
             bio = db_user.bio
         else:
             used_commands = 1
@@ -608,7 +599,7 @@ class Information(commands.Cog, name="info"):
         if bio is None:
             return await ctx.send_help(ctx.command)
 
-        db_user = self.bot.db.get_user(ctx.author.id) or await self.bot.db.fetch_user(ctx.author.id)
+        db_user = await self.bot.db.getch(Table.USERS, ctx.author.id)
         if not db_user:
             await ctx.send("You have no profile..?")
             return
@@ -639,7 +630,7 @@ class Information(commands.Cog, name="info"):
     @permissions.dynamic_ownerbypass_cooldown(1, 5, commands.BucketType.user)
     async def _out(self, ctx):
         """Opt out of the bot's message history fetching"""
-        db_user = self.bot.db.get_user(ctx.author.id) or await self.bot.db.fetch_user(ctx.author.id)
+        db_user = await self.bot.db.getch(Table.USERS, ctx.author.id)
         if not db_user or not db_user.message_tracking:
             await ctx.send("You are already opted out of message tracking!")
             return
@@ -650,7 +641,7 @@ class Information(commands.Cog, name="info"):
     @permissions.dynamic_ownerbypass_cooldown(1, 5, commands.BucketType.user)
     async def _in(self, ctx):
         """Opt in to the bot's message history fetching"""
-        db_user = self.bot.db.get_user(ctx.author.id) or await self.bot.db.fetch_user(ctx.author.id)
+        db_user = await self.bot.db.getch(Table.USERS, ctx.author.id)
         if not db_user:
             db_user = await self.bot.db.add_user(ctx.author.id)
         if db_user.message_tracking:
@@ -15,6 +15,7 @@ import discord
 from discord.app_commands import Choice, Transform, Transformer
 from discord.ext import commands
 from index import Website, colors, config, delay
+from Manager.database import Table
 from sentry_sdk import capture_exception
 from utils import checks, default, imports, permissions
 from utils.embeds import EmbedMaker as Embed
@@ -281,7 +282,7 @@ class Moderator(commands.Cog, name="mod"):
                 await ctx.send(f"command: {ctx.command}\n\ncommand: {command}\n\nexception: {e}")
                 return
 
-        db_command_guild = self.bot.db.get_command(ctx.guild.id) or await self.bot.db.fetch_command_guild(ctx.guild.id)
+        db_command_guild = await self.bot.db.getch(Table.COMMANDS, ctx.guild.id)
         if not db_command_guild:
             db_command_guild = await self.bot.db.add_command_guild(ctx.guild.id)
 
@@ -17,7 +17,7 @@ from utils.embeds import EmbedMaker as Embed
 
 
 if TYPE_CHECKING:
-    from Manager.database import User as DBUser, Blacklist as DBBlacklist, Badge as DBBadge
+    from Manager.database import User as DBUser, Badge as DBBadge
     from index import AGB
 
 
@@ -28,14 +28,14 @@ class UserinfoPermissionView(discord.ui.View):
         user: Union[discord.Member, discord.User],
         initial_embed: discord.Embed,
         message: discord.Message,
-        db_info: tuple[DBUser, DBBlacklist, list[DBBadge]],
+        db_info: tuple[DBUser, bool, list[DBBadge]],
     ):
         super().__init__(timeout=120)
         self.ctx = ctx
         self.user = user
         self.initial_embed = initial_embed
         self.message = message
-        self.db_user, self.db_blacklist, self.db_badges = db_info
+        self.db_user, self.is_blacklisted, self.db_badges = db_info
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id == self.ctx.author.id:
@@ -83,7 +83,9 @@ class UserinfoPermissionView(discord.ui.View):
         self.agb_user_stats.disabled = True
         self.user_info.disabled = False
 
-        used_commands = self.db_user.used_commands or "None"
+        # increments are written in batches, see Database.command_uses
+        pending = self.ctx.bot.db.command_uses.get_pending(self.db_user.userid)
+        used_commands = (self.db_user.used_commands + pending) or "None"
         badges = ", ".join(b.name for b in self.db_badges) or "None"
 
         embed = Embed(title="AGB User Stats")
@@ -99,7 +101,7 @@ class UserinfoPermissionView(discord.ui.View):
         )
         embed.add_field(
             name="Is Blacklisted?",
-            value=f"{['No', 'Yes'][self.db_blacklist.blacklisted]}",
+            value=f"{['No', 'Yes'][self.is_blacklisted]}",
             inline=False,
         )
         embed.add_field(
@@ -732,10 +734,8 @@ You can give yourself the colors by doing `/colorme <color>`. \nExample: `/color
                 else ""
             )
 
-        db_blacklist = await self.bot.db.getch("blacklist", user.id) or await self.bot.db.add_blacklist(user.id)
         db_user = await self.bot.db.getch("users", user.id) or await self.bot.db.add_user(user.id)
-        all_db_badges = await self.bot.db.fetch_badges()
-        db_badges = [badge for badge in all_db_badges if badge.has(user.id)]
+        db_badges = self.bot.db.get_user_badges(user.id)
         try:
             if len(chunked) == len(self.bot.guilds):
                 mutuals = f"\nMutual Servers: `{len(self.bot.guilds)} server(s)`"
@@ -760,7 +760,7 @@ You can give yourself the colors by doing `/colorme <color>`. \nExample: `/color
             user=user,
             initial_embed=embed,
             message=fetching,
-            db_info=(db_user, db_blacklist, db_badges),
+            db_info=(db_user, self.bot.db.is_blacklisted(user.id), db_badges),
         )
         await fetching.edit(
             content=None,
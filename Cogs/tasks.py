@@ -11,11 +11,10 @@ import discord
 import discordlists
 from statcord import StatcordClient
 from discord.ext import commands, tasks
-from index import DEV, colors
-from Manager.emoji import Emoji
+from index import DEV
+from Manager.database import Table
 from utils import imports
 from utils.default import log
-from utils.embeds import EmbedMaker as Embed
 
 if TYPE_CHECKING:
     from index import AGB
@@ -44,17 +43,19 @@ class Tasks(commands.Cog, name="task"):
 
     @tasks.loop(count=1)
     async def get_guilds(self):
-        for guild in self.bot.guilds:
-            guild_commands = await self.bot.db.execute("SELECT * FROM commands WHERE guild = $1", guild.id)
-            if not guild_commands:
-                await self.bot.db.execute("INSERT INTO commands (guild) VALUES ($1)", guild.id)
-                log(f"New guild detected: {guild.id} | Added to commands database!")
+        # pin one connection for the whole sweep instead of acquiring one per query.
+        async with self.bot.db.acquire():
+            for guild in self.bot.guilds:
+                guild_commands = await self.bot.db.fetchrow("SELECT * FROM commands WHERE guild = $1", guild.id)
+                if not guild_commands:
+                    await self.bot.db.execute("INSERT INTO commands (guild) VALUES ($1)", guild.id)
+                    log(f"New guild detected: {guild.id} | Added to commands database!")
 
-            db_guild = self.bot.db.get_guild(guild.id) or await self.bot.db.fetch_guild(guild.id)
-            if not db_guild:
-                await self.bot.db.add_guild(guild.id)
+                db_guild = await self.bot.db.getch(Table.GUILDS, guild.id)
+                if not db_guild:
+                    await self.bot.db.add_guild(guild.id)
 
-                log(f"New guild detected: {guild.id} | Added to guilds database!")
+                    log(f"New guild detected: {guild.id} | Added to guilds database!")
 
     @get_guilds.before_loop
     async def delay_task_until_bot_ready(self):
@@ -66,51 +67,6 @@ class Tasks(commands.Cog, name="task"):
         self.get_guilds.stop()
         self.statcord_client.stop()
 
-    @tasks.loop(time=[datetime.time(hour=h, minute=0) for h in range(24)])
-    async def blacklist_sweep(self):
-        changes = 0
-        checked = 0
-        total_users = 0
-        start_embed = Embed(
-            title=f"{Emoji.loading} Blackist checks started",
-            color=colors.prim,
-            thumbnail=None,
-        )
-        sembed = await self.bot.fetch_channel(1004423443833442335)
-        await sembed.send(embed=start_embed)
-
-        blacklisted_users = await self.bot.db.fetch_blacklists(blacklisted=True)
-        total_users = len(blacklisted_users)
-        for user in blacklisted_users:
-            checked += 1
-            if not user:
-                continue
-
-            if not user.blacklistedtill:
-                continue
-
-            if not user.blacklisted:
-                continue
-
-            now = datetime.datetime.now()
-            try:
-                blacklist_date = datetime.datetime.strptime(str(user.blacklistedtill), "%Y-%m-%d %H:%M:%S.%f")
-            except Exception:
-                blacklist_date = datetime.datetime.strptime(str(user.blacklistedtill), "%Y-%m-%d %H:%M:%S.%f+00")
-            if blacklist_date < now:
-                await user.edit(blacklisted=False, blacklistedtill=None)
-                changes += 1
-
-        await asyncio.sleep(3)
-        comp_embed = Embed(
-            title=f"{Emoji.yes} Blacklist checks completed",
-            description=f"*Checked: `{checked}/{total_users}`*\n*Cleared: `{changes}`*",
-            color=colors.green,
-            thumbnail=None,
-        ).set_footer(text=f"Scanned {total_users} total entries!")
-
-        await sembed.edit(embed=comp_embed)
-
     @tasks.loop(time=[datetime.time(hour=h, minute=0) for h in range(24)])
     async def presence_loop(self):
         if datetime.datetime.now().month == 10 and datetime.datetime.now().day == 3:
@@ -142,10 +98,6 @@ class Tasks(commands.Cog, name="task"):
     async def delay_task_until_bot_ready(self):
         await self.bot.wait_until_ready()
 
-    @blacklist_sweep.before_loop
-    async def delay_task_until_bot_ready(self):
-        await asyncio.sleep(5)
-
     # make an event to update channels with the bots server count
     @tasks.loop(minutes=30)  # Updated to 30 mins with larger scale in mind
     async def update_stats(self):
@@ -171,6 +123,17 @@ class Tasks(commands.Cog, name="task"):
     #         ) as r:
     #             await r.json()
 
+    # patches the caches with rows other processes changed, instead of re-chunking whole tables.
+    @tasks.loop(minutes=1)
+    async def refresh_caches(self):
+        counts = await self.bot.db.refresh_all()
+        if changed := sum(counts.values()):
+            log(f"Cache Refresh - Patched {changed} changed rows")
+
+    @refresh_caches.before_loop
+    async def delay_task_until_bot_ready(self):
+        await self.bot.wait_until_ready()
+
     @tasks.loop(minutes=2)
     async def garbage(self):
         gc.collect()
@@ -185,42 +148,35 @@ class Tasks(commands.Cog, name="task"):
     #     await self.bot.wait_until_ready()
     #     await asyncio.sleep(5)
 
-    @blacklist_sweep.before_loop
-    async def delay_task_until_bot_ready(self):
-        await self.bot.wait_until_ready()
-        await asyncio.sleep(5)
-
     async def cog_unload(self) -> None:
         if self.api and hasattr(self.api, "close"):
             self.api.close()
 
-        self.blacklist_sweep.stop()
         self.presence_loop.stop()
         self.update_stats.stop()
         self.garbage.stop()
+        self.refresh_caches.stop()
 
-        log("Blacklist Sweep - Stopped")
         log("Presence Loop - Stopped")
         log("Stat updater - Stopped")
         log("Garbage Collector - Stopped")
+        log("Cache Refresh - Stopped")
 
     async def cog_reload(self) -> None:
-        self.blacklist_sweep.stop()
         self.garbage.start()
 
-        log("Blacklist Sweep - Reloaded")
-
     async def cog_load(self) -> None:
+        self.refresh_caches.start()
+        log("Cache Refresh - Started")
+
         if not self.config.dev:
             self.presence_loop.start()
             # self.status_page.start()
-            self.blacklist_sweep.start()
             self.update_stats.start()
             self.garbage.start()
 
             log("Presence Loop - Started")
             # log("Status page - Started")
-            log("Blacklist Sweep - Started")
             log("Stat updater - Started")
             log("Garbage Collector - Started")
 
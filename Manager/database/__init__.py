@@ -1,2 +1,15 @@
+from .autopost import AutopostRegistry
+from .badges import BadgeIndex
+from .blacklist import BlacklistIndex
+from .cache import RecordCache
+from .counters import WriteBehindCounter
+from .expiry import BlacklistExpiry
 from .database import Database, Connection
+from .instrumentation import QueryStats
+from .invalidation import CacheInvalidator
 from .models import *
+from .pool import PoolManager
+from .replicas import ReplicaRouter
+from .singleflight import SingleFlight
+from .snapshot import CacheSnapshot
+from .sqlite import SQLitePoolManager
@@ -67,12 +67,8 @@ class AutoRoles(TypedDict):
 
 
 class Badges(TypedDict):
-    owner: NotRequired[List[int]]  # defaults to None
-    admin: NotRequired[Optional[List[int]]]  # defaults to None
-    mod: NotRequired[Optional[List[int]]]  # defaults to None
-    partner: NotRequired[Optional[List[int]]]  # defaults to None
-    support: NotRequired[List[int]]  # defaults to None
-    friend: NotRequired[Optional[List[int]]]  # defaults to None
+    # rows are only added and removed, see Badge.add/remove.
+    pass
 
 
 class Reminders(TypedDict):
@@ -89,6 +85,7 @@ class Blacklist(TypedDict):
     blacklisted: NotRequired[bool]  # defaults to False
     blacklistedtill: NotRequired[Optional[str]]  # defaults to None
     reason: NotRequired[Optional[str]]  # defaults to 'Unspecified'
+    expires_at: NotRequired[Optional[datetime]]  # defaults to None
 
 
 class Commands(TypedDict):
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Iterator, Optional
+
+from .models import Table
+
+if TYPE_CHECKING:
+    from .database import Connection
+
+__all__: tuple[str, ...] = ("AutopostRegistry",)
+
+# only the few guilds with an autopost channel are indexed, loading the registry reads just those.
+AUTOPOST_INDEX_SQL = (
+    f"CREATE INDEX IF NOT EXISTS {Table.GUILDS}_hentaichannel_idx "
+    f"ON {Table.GUILDS} (hentaichannel) WHERE hentaichannel IS NOT NULL"
+)
+
+
+class AutopostRegistry:
+    """The autopost channel of every guild that has one, held in memory.
+
+    Autoposting walks this instead of every guild row. It's loaded once with
+    :meth:`load` and kept current by every method of :class:`Database` that
+    writes or reads a guild row, ``Guild.edit(hentaichannel=...)`` included.
+    """
+
+    __slots__: tuple[str, ...] = ("_channels", "loaded")
+
+    def __init__(self) -> None:
+        # guild_id -> channel_id
+        self._channels: dict[int, int] = {}
+        self.loaded: bool = False
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} channels={len(self._channels)} loaded={self.loaded}>"
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._channels
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        # a copy, autoposting removes channels while it walks them.
+        return iter(list(self._channels.items()))
+
+    def get(self, guild_id: int) -> Optional[int]:
+        return self._channels.get(guild_id)
+
+    def set(self, guild_id: int, channel_id: Optional[int]) -> None:
+        if channel_id is None:
+            self._channels.pop(guild_id, None)
+        else:
+            self._channels[guild_id] = channel_id
+
+    def update(self, record: Any) -> None:
+        """Register a guild row, a :class:`Guild` or a raw record."""
+        try:
+            channel_id = record["hentaichannel"]
+        except KeyError:
+            # selected without the column, nothing to tell from it.
+            return
+        if channel_id is not NotImplemented:
+            self.set(int(record["guildid"]), channel_id)
+
+    def discard(self, guild_id: int) -> None:
+        self._channels.pop(guild_id, None)
+
+    async def load(self, connection: Connection) -> int:
+        """Replace the registry with the autopost channels in the database.
+
+        Returns
+        -------
+        int
+            The amount of guilds with an autopost channel.
+        """
+        rows = await connection.fetch(
+            f"SELECT guildid, hentaichannel FROM {Table.GUILDS} WHERE hentaichannel IS NOT NULL"
+        )
+        self._channels = {row["guildid"]: row["hentaichannel"] for row in rows}
+        self.loaded = True
+        return len(self._channels)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable
+
+from .models import Table
+
+if TYPE_CHECKING:
+    from .database import Connection
+
+__all__: tuple[str, ...] = ("BadgeIndex", "LEGACY_BADGES_TABLE", "BADGES_MIGRATION_SQL")
+
+# where the old layout, one row with an array of user ids per badge column, is kept after the migration.
+LEGACY_BADGES_TABLE = "badges_legacy"
+
+# moves the array layout aside and copies every array column into one (badge, userid) row per member.
+# does nothing once the table has the new layout, checking for the badge column keeps it idempotent.
+BADGES_MIGRATION_SQL: tuple[str, ...] = (
+    f"""
+DO $$
+DECLARE
+    badge_column text;
+BEGIN
+    IF to_regclass('{Table.BADGES}') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = '{Table.BADGES}' AND column_name = 'badge'
+    ) THEN
+        ALTER TABLE {Table.BADGES} RENAME TO {LEGACY_BADGES_TABLE};
+        CREATE TABLE {Table.BADGES} (badge text NOT NULL, userid bigint NOT NULL, PRIMARY KEY (badge, userid));
+        FOR badge_column IN
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = '{LEGACY_BADGES_TABLE}' AND data_type = 'ARRAY'
+        LOOP
+            EXECUTE format(
+                'INSERT INTO {Table.BADGES} (badge, userid) '
+                'SELECT %L, member FROM {LEGACY_BADGES_TABLE}, unnest(%I) AS member '
+                'WHERE member IS NOT NULL ON CONFLICT DO NOTHING',
+                badge_column,
+                badge_column
+            );
+        END LOOP;
+    END IF;
+END
+$$
+""",
+    f"CREATE TABLE IF NOT EXISTS {Table.BADGES} (badge text NOT NULL, userid bigint NOT NULL, PRIMARY KEY (badge, userid))",
+    # the primary key serves lookups by badge, this one the badges of a user.
+    f"CREATE INDEX IF NOT EXISTS {Table.BADGES}_userid_idx ON {Table.BADGES} (userid)",
+)
+
+
+class BadgeIndex:
+    """Which user has which badge, held in memory both ways.
+
+    Resolving the badges of a user is a dict lookup instead of a scan of
+    every badge's members. It's loaded with :meth:`load` and kept current by
+    :class:`Badge` and every method of :class:`Database` that reads or
+    writes the badges table.
+    """
+
+    __slots__: tuple[str, ...] = ("_users", "_members", "loaded")
+
+    def __init__(self) -> None:
+        # user_id -> names of their badges
+        self._users: dict[int, frozenset[str]] = {}
+        # badge name -> user ids, shared with the Badge objects.
+        self._members: dict[str, set[int]] = {}
+        self.loaded: bool = False
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} badges={len(self._members)} users={len(self._users)} loaded={self.loaded}>"
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @property
+    def names(self) -> list[str]:
+        """list[str]: Every badge that has or had members."""
+        return list(self._members)
+
+    def badges_of(self, user_id: int) -> frozenset[str]:
+        """The names of the badges a user has."""
+        return self._users.get(user_id, frozenset())
+
+    def members(self, badge: str) -> set[int]:
+        """The ids of the users with a badge, the same set as long as the badge exists."""
+        try:
+            return self._members[badge]
+        except KeyError:
+            members = self._members[badge] = set()
+            return members
+
+    def add(self, badge: str, user_id: int) -> None:
+        self.members(badge).add(user_id)
+        self._users[user_id] = self.badges_of(user_id) | {badge}
+
+    def discard(self, badge: str, user_id: int) -> None:
+        self.members(badge).discard(user_id)
+        badges = self.badges_of(user_id) - {badge}
+        if badges:
+            self._users[user_id] = badges
+        else:
+            self._users.pop(user_id, None)
+
+    def set_user(self, user_id: int, badges: Iterable[str]) -> None:
+        """Replace the badges of a user."""
+        badges = frozenset(badges)
+        for badge in self.badges_of(user_id) - badges:
+            self.members(badge).discard(user_id)
+        for badge in badges:
+            self.members(badge).add(user_id)
+
+        if badges:
+            self._users[user_id] = badges
+        else:
+            self._users.pop(user_id, None)
+
+    def discard_user(self, user_id: int) -> None:
+        self.set_user(user_id, ())
+
+    def drop(self, badge: str) -> None:
+        """Take a badge away from everyone."""
+        for user_id in list(self.members(badge)):
+            self.discard(badge, user_id)
+        del self._members[badge]
+
+    async def load(self, connection: Connection) -> int:
+        """Replace the index with the badges in the database.
+
+        Returns
+        -------
+        int
+            The amount of users with at least one badge.
+        """
+        rows = await connection.fetch(f"SELECT badge, userid FROM {Table.BADGES}")
+        users: dict[int, set[str]] = {}
+        for members in self._members.values():
+            # cleared in place, Badge objects hold on to these sets.
+            members.clear()
+        for row in rows:
+            users.setdefault(row["userid"], set()).add(row["badge"])
+            self.members(row["badge"]).add(row["userid"])
+
+        self._users = {user_id: frozenset(badges) for user_id, badges in users.items()}
+        self.loaded = True
+        return len(self._users)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Iterator
+
+from .models import Table
+
+if TYPE_CHECKING:
+    from .database import Connection
+
+__all__: tuple[str, ...] = ("BlacklistIndex",)
+
+# only the few blacklisted rows are indexed, loading the index reads just those.
+BLACKLISTED_INDEX_SQL = (
+    f"CREATE INDEX IF NOT EXISTS {Table.BLACKLIST}_blacklisted_idx ON {Table.BLACKLIST} (userid) WHERE blacklisted"
+)
+
+
+class BlacklistIndex:
+    """The ids of every blacklisted user, held in memory so checking a user costs no query.
+
+    Unlike the blacklist cache, which holds recently used rows whether they're
+    blacklisted or not, this holds exactly the users that are blacklisted.
+    It's loaded once with :meth:`load` and kept current by every method of
+    :class:`Database` that writes or reads a blacklist row.
+    """
+
+    __slots__: tuple[str, ...] = ("_ids", "loaded")
+
+    def __init__(self) -> None:
+        self._ids: set[int] = set()
+        self.loaded: bool = False
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} blacklisted={len(self._ids)} loaded={self.loaded}>"
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def set(self, user_id: int, blacklisted: bool) -> None:
+        if blacklisted:
+            self._ids.add(user_id)
+        else:
+            self._ids.discard(user_id)
+
+    def update(self, record: Any) -> None:
+        """Index a blacklist row, a :class:`Blacklist` or a raw record."""
+        self.set(int(record["userid"]), bool(record["blacklisted"]))
+
+    def discard(self, user_id: int) -> None:
+        self._ids.discard(user_id)
+
+    async def load(self, connection: Connection) -> int:
+        """Replace the index with the blacklisted users in the database.
+
+        Returns
+        -------
+        int
+            The amount of blacklisted users.
+        """
+        rows = await connection.fetch(f"SELECT userid FROM {Table.BLACKLIST} WHERE blacklisted")
+        self._ids = {row["userid"] for row in rows}
+        self.loaded = True
+        return len(self._ids)
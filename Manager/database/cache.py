@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import datetime
+from itertools import islice
+from typing import Any, Generic, Iterator, Optional, TypeVar
+
+__all__: tuple[str, ...] = ("RecordCache",)
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+_MISSING: Any = object()
+
+_SCALARS: tuple[type, ...] = (str, bytes, int, float, datetime)
+_CONTAINERS: tuple[type, ...] = (list, tuple, set, frozenset, dict)
+
+
+def _slot_values(value: Any) -> list[Any]:
+    names = {name for cls in type(value).__mro__ for name in getattr(cls, "__slots__", ())}
+    values = [getattr(value, name) for name in names if hasattr(value, name)]
+    return values + list(getattr(value, "__dict__", {}).values())
+
+
+def _owned_size(value: Any, *, top: bool = False) -> int:
+    """The bytes of ``value`` and of the scalars and containers it holds.
+
+    Other objects it references, like the database a record points to, are
+    shared between entries and only counted when they're the entry itself.
+    """
+    if value is None or isinstance(value, bool) or (type(value) is int and -5 <= value <= 256):
+        # singletons and cached ints, every entry shares them.
+        return 0
+    size = sys.getsizeof(value)
+    if isinstance(value, _SCALARS):
+        return size
+    if isinstance(value, dict):
+        children: Any = (*value.keys(), *value.values())
+    elif isinstance(value, _CONTAINERS):
+        children = value
+    elif top:
+        children = _slot_values(value)
+    else:
+        return 0
+    return size + sum(_owned_size(child) for child in children)
+
+
+class RecordCache(MutableMapping, Generic[K, V]):
+    """A mapping with an optional maximum size, LRU eviction and TTL.
+
+    Reads through :meth:`get` and ``[]`` count as hits or misses and move
+    the entry to the most recently used position. Iterating, ``in`` checks
+    and :meth:`peek` do neither.
+
+    Parameters
+    ----------
+    name: str
+        A display name, used in :meth:`__repr__`.
+    maxsize: Optional[int]
+        The maximum amount of entries. ``None`` means unbounded.
+    ttl: Optional[float]
+        Seconds an entry stays valid after it was set. ``None`` means forever.
+    """
+
+    __slots__: tuple[str, ...] = ("name", "maxsize", "ttl", "_data", "hits", "misses", "evictions", "expirations")
+
+    def __init__(self, name: str, *, maxsize: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        if maxsize is not None and maxsize <= 0:
+            raise ValueError("maxsize must be a positive integer or None")
+
+        self.name: str = name
+        self.maxsize: Optional[int] = maxsize
+        self.ttl: Optional[float] = ttl
+        # key -> (value, expires_at)
+        self._data: OrderedDict[K, tuple[V, float]] = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} name={self.name!r} {self.summary()}>"
+
+    def _expires_at(self) -> float:
+        return time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+
+    def _lookup(self, key: K) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return _MISSING
+
+        return value
+
+    def __getitem__(self, key: K) -> V:
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            raise KeyError(key)
+
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self._data[key] = (value, self._expires_at())
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __delitem__(self, key: K) -> None:
+        del self._data[key]
+
+    def __contains__(self, key: object) -> bool:
+        return self._lookup(key) is not _MISSING  # type: ignore
+
+    def __iter__(self) -> Iterator[K]:
+        now = time.monotonic()
+        return iter([key for key, (_, expires_at) in self._data.items() if expires_at > now])
+
+    def __len__(self) -> int:
+        # includes entries that expired but weren't looked up or purged yet.
+        return len(self._data)
+
+    def values(self) -> list[V]:  # type: ignore
+        now = time.monotonic()
+        return [value for value, expires_at in self._data.values() if expires_at > now]
+
+    def items(self) -> list[tuple[K, V]]:  # type: ignore
+        now = time.monotonic()
+        return [(key, value) for key, (value, expires_at) in self._data.items() if expires_at > now]
+
+    def get(self, key: K, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def peek(self, key: K, default: Any = None) -> Any:
+        """Get an entry without touching its LRU position or the hit/miss counters."""
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def pop(self, key: K, default: Any = _MISSING) -> Any:
+        value = self._lookup(key)
+        if value is _MISSING:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+
+        del self._data[key]
+        return value
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def purge_expired(self) -> int:
+        """Remove every expired entry.
+
+        Returns
+        -------
+        int
+            The amount of entries removed.
+        """
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at <= now]
+        for key in expired:
+            del self._data[key]
+
+        self.expirations += len(expired)
+        return len(expired)
+
+    @property
+    def hit_rate(self) -> float:
+        """float: The ratio of hits to lookups, between ``0.0`` and ``1.0``."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def fill_ratio(self) -> float:
+        """float: How full the cache is compared to ``maxsize``. Always ``0.0`` when unbounded."""
+        return len(self._data) / self.maxsize if self.maxsize else 0.0
+
+    def approximate_bytes(self, *, sample: int = 32) -> int:
+        """Estimate the memory the entries use from the size of the ``sample`` least recently used ones.
+
+        Counts the mapping, the keys and the values with the strings, numbers
+        and containers they hold, but not objects shared between entries.
+        """
+        if not self._data:
+            return sys.getsizeof(self._data)
+
+        sampled = list(islice(self._data.items(), sample))
+        owned = sum(
+            _owned_size(key) + _owned_size(value, top=True) + _owned_size(expires_at)
+            for key, (value, expires_at) in sampled
+        )
+        # plus the (value, expires_at) tuple every entry is stored as.
+        per_entry = owned / len(sampled) + sys.getsizeof(sampled[0][1])
+        return sys.getsizeof(self._data) + round(per_entry * len(self._data))
+
+    def summary(self) -> str:
+        """A short human readable summary of the size, estimated memory use and counters."""
+        size = f"{len(self._data)}/{self.maxsize} ({self.fill_ratio:.0%} full)" if self.maxsize else f"{len(self._data)}"
+        return (
+            f"{size} ~{self.approximate_bytes() / 1024:,.0f}KiB hit={self.hit_rate:.0%} "
+            f"ev={self.evictions} exp={self.expirations}"
+        )
+
+    def stats(self) -> dict[str, Any]:
+        """The counters as a dictionary, for logging or owner commands."""
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hit_rate,
+            "fill_ratio": self.fill_ratio,
+            "approximate_bytes": self.approximate_bytes(),
+        }
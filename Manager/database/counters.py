@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import TYPE_CHECKING, Any, Optional
+
+from utils.errors import DatabaseError
+
+from ..logger import formatColor
+from .models import Table
+
+if TYPE_CHECKING:
+    from .database import Connection
+
+__all__: tuple[str, ...] = ("WriteBehindCounter",)
+
+COUNTER_LOGGING_PREFIX = formatColor("[Counter]", "green")
+
+
+class WriteBehindCounter:
+    """Collects integer increments for a column in memory and writes them in batches.
+
+    Increments are merged per key and flushed as a single
+    ``UPDATE ... FROM unnest(...)`` statement, either every ``flush_interval``
+    seconds or as soon as ``max_pending`` distinct keys are waiting.
+    Cached rows get the flushed value, :meth:`get_pending` has what the
+    stored value is still missing.
+
+    Parameters
+    ----------
+    connection: :class:`Connection`
+        The connection used to run the flush query.
+    table: :class:`Table`
+        The table to update.
+    key_column: str
+        The ``bigint`` column used to match rows.
+    column: str
+        The ``int`` column to increment.
+    flush_interval: float
+        Seconds between timed flushes. Defaults to ``30.0``.
+    max_pending: int
+        Number of distinct keys that triggers an early flush. Defaults to ``500``.
+    """
+
+    __slots__: tuple[str, ...] = (
+        "connection",
+        "table",
+        "key_column",
+        "column",
+        "flush_interval",
+        "max_pending",
+        "_pending",
+        "_query",
+        "_task",
+        "_flush_lock",
+        "_early_flush",
+        "total_flushes",
+        "total_merged",
+    )
+
+    def __init__(
+        self,
+        connection: Connection,
+        /,
+        table: Table,
+        key_column: str,
+        column: str,
+        *,
+        flush_interval: float = 30.0,
+        max_pending: int = 500,
+    ) -> None:
+        self.connection: Connection = connection
+        self.table: Table = table
+        self.key_column: str = key_column
+        self.column: str = column
+        self.flush_interval: float = flush_interval
+        self.max_pending: int = max_pending
+
+        self._pending: dict[int, int] = {}
+        self._query: str = (
+            f"UPDATE {table} SET {column} = {table}.{column} + data.amount "
+            f"FROM unnest($1::bigint[], $2::int[]) AS data(key, amount) "
+            f"WHERE {table}.{key_column} = data.key "
+            f"RETURNING {table}.{key_column}, {table}.{column}"
+        )
+        self._task: Optional[asyncio.Task[None]] = None
+        self._flush_lock: asyncio.Lock = asyncio.Lock()
+        self._early_flush: asyncio.Event = asyncio.Event()
+
+        self.total_flushes: int = 0
+        self.total_merged: int = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} table={self.table} column={self.column} "
+            f"pending={len(self._pending)} flushes={self.total_flushes} merged={self.total_merged}>"
+        )
+
+    @property
+    def pending(self) -> int:
+        """int: The number of increments waiting to be flushed."""
+        return sum(self._pending.values())
+
+    def get_pending(self, key: int) -> int:
+        """Get the not yet flushed amount for a key.
+
+        Parameters
+        ----------
+        key: int
+            The key to look up.
+
+        Returns
+        -------
+        int
+            The amount waiting to be added to the stored value.
+        """
+        return self._pending.get(key, 0)
+
+    def increment(self, key: int, amount: int = 1) -> None:
+        """Queue an increment for a key.
+
+        Parameters
+        ----------
+        key: int
+            The key of the row to increment.
+        amount: int
+            The amount to add. Defaults to ``1``.
+        """
+        self._pending[key] = self._pending.get(key, 0) + amount
+        if len(self._pending) >= self.max_pending:
+            self._early_flush.set()
+
+    async def flush(self) -> int:
+        """Write every pending increment in one query.
+
+        Returns
+        -------
+        int
+            The number of increments merged into the flush.
+        """
+        # circular imports
+        from utils.default import log
+
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, {}
+            keys = list(pending.keys())
+            amounts = list(pending.values())
+            try:
+                rows = await self.connection.fetch(self._query, keys, amounts)
+            except DatabaseError:
+                # put everything back so the next flush can retry it.
+                for key, amount in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + amount
+                raise
+
+            self._patch_cache(rows)
+            merged = sum(amounts)
+            self.total_flushes += 1
+            self.total_merged += merged
+            log(
+                f"{COUNTER_LOGGING_PREFIX} Flushed {merged} {self.table}.{self.column} "
+                f"increments into {len(keys)} rows."
+            )
+            return merged
+
+    def _patch_cache(self, rows: list[Any]) -> None:
+        # the cache invalidation skips this process's own writes, cached rows would keep the old count.
+        table_to_cache = getattr(self.connection, "_table_to_cache", None)
+        if table_to_cache is None:
+            return
+
+        cache = table_to_cache[self.table][1]
+        for row in rows:
+            cached = cache.peek(row[self.key_column])
+            if cached is not None:
+                cached._update({self.column: row[self.column]})
+
+    async def _run(self) -> None:
+        # circular imports
+        from utils.default import log
+
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._early_flush.wait(), timeout=self.flush_interval)
+            self._early_flush.clear()
+            try:
+                await self.flush()
+            except DatabaseError as e:
+                log(f"{COUNTER_LOGGING_PREFIX} Failed to flush {self.table}.{self.column}: {e}")
+
+    def start(self) -> None:
+        """Start the background flush task. Does nothing if it's already running."""
+        if self._task is not None and not self._task.done():
+            return
+
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> int:
+        """Stop the background task and flush whatever is still pending.
+
+        Returns
+        -------
+        int
+            The number of increments merged into the final flush.
+        """
+        if self._task is not None:
+            # lets a flush in flight finish, cancelling it mid query would drop its batch.
+            async with self._flush_lock:
+                self._task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await self._task
+            self._task = None
+
+        return await self.flush()
@@ -1,12 +1,40 @@
 from __future__ import annotations
 
+import asyncio
 import contextlib
-from typing import TYPE_CHECKING, Any, Literal, NoReturn, Optional, Union, get_type_hints, overload
+import os
+import secrets
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Hashable,
+    Iterator,
+    Literal,
+    NoReturn,
+    Optional,
+    Union,
+    get_args,
+    overload,
+)
 
-from asyncpg import Pool, create_pool
+from asyncpg import Pool, PostgresError
 from utils.errors import DatabaseError
 
 from ..logger import formatColor
+from .autopost import AUTOPOST_INDEX_SQL, AutopostRegistry
+from .badges import BADGES_MIGRATION_SQL, BadgeIndex
+from .blacklist import BLACKLISTED_INDEX_SQL, BlacklistIndex
+from .cache import RecordCache
+from .counters import WriteBehindCounter
+from .expiry import BlacklistExpiry, parse_blacklistedtill
+from .instrumentation import QueryStats
+from .invalidation import CacheInvalidator
 from .models import (
     AGBRecord,
     AGBRecordClass,
@@ -21,9 +49,24 @@ from .models import (
     Table,
     User,
     UserEconomy,
+    resolve_table,
+    table_info,
     table_to_cls,
 )
+from .pool import PoolManager
+from .queries import (
+    compile_aggregate,
+    compile_changed_since,
+    compile_distinct,
+    compile_select,
+    compile_select_any,
+)
+from .replicas import FALLBACK_ERRORS, ReplicaRouter, is_read_only
+from .singleflight import SingleFlight
+from .snapshot import CacheSnapshot
+from .sqlite import SQLitePoolManager
 from .types import ValidBadge
+from .watermark import UPDATED_AT_COLUMN, install_updated_at
 
 if TYPE_CHECKING:
     from asyncpg import Connection as AsyncConnection
@@ -33,114 +76,355 @@ if TYPE_CHECKING:
 
 DATABASE_LOGGING_PREFIX = formatColor("[Database]", "green")
 
+_READ_METHODS: frozenset[str] = frozenset({"fetch", "fetchrow", "fetchval"})
+
 
 class Connection:
 
-    __slots__: tuple[str, ...] = ("bot", "_config", "_pool", "__open_connections")
+    __slots__: tuple[str, ...] = (
+        "bot",
+        "_config",
+        "pool_manager",
+        "replicas",
+        "__pinned",
+        "__critical",
+        "__primary_until",
+        "instance_id",
+        "query_stats",
+    )
 
     def __init__(
         self,
         bot: AGB,
         /,
         config: DBConfig,
+        *,
+        slow_query_threshold: Optional[float] = 0.5,
     ) -> None:
         self.bot: AGB = bot
         self._config = config
-        self._pool: Optional[Pool] = None
-
-        self.__open_connections: list[AsyncConnection] = []
+        # sizing, timeouts, retries and load shedding, configured by the optional "pool" object of the config.
+        # "backend": "sqlite" swaps Postgres for an in-process database, see Manager.database.sqlite.
+        backend = getattr(config, "backend", "postgres")
+        if backend == "sqlite":
+            self.pool_manager: PoolManager = SQLitePoolManager.from_config(config)
+        elif backend == "postgres":
+            self.pool_manager = PoolManager.from_config(getattr(config, "pool", None))
+        else:
+            raise ValueError(f"Unknown database backend {backend!r}, expected 'postgres' or 'sqlite'")
+        # read-only queries are spread over these when the config lists "replicas".
+        self.replicas: Optional[ReplicaRouter] = ReplicaRouter.from_config(config)
+        # per query shape timings and pool wait times, see QueryStats.
+        self.query_stats: QueryStats = QueryStats(slow_query_threshold=slow_query_threshold)
+        # sent as application_name, lets triggers tell which process made a change.
+        self.instance_id: str = f"agb-{os.getpid()}-{secrets.token_hex(4)}"
+
+        # connection pinned by acquire()/transaction() for the current task, if any.
+        self.__pinned: ContextVar[Optional[AsyncConnection]] = ContextVar(f"agb_pinned_{id(self)}", default=None)
+        # False inside non_critical(), queries there fail fast instead of queueing on a saturated pool.
+        self.__critical: ContextVar[bool] = ContextVar(f"agb_critical_{id(self)}", default=True)
+        # monotonic time until which reads from the current task stay on the primary, set by writes and primary().
+        self.__primary_until: ContextVar[float] = ContextVar(f"agb_primary_until_{id(self)}", default=0.0)
 
     @property
     def pool(self) -> Pool:
-        return self._pool  # type: ignore
+        return self.pool_manager.pool  # type: ignore
+
+    @property
+    def pinned_connection(self) -> Optional[AsyncConnection]:
+        """Optional[:class:`asyncpg.Connection`]: The connection pinned by :meth:`acquire` for the current task."""
+        pinned = self.__pinned.get()
+        return pinned if pinned is not None and not pinned.is_closed() else None
+
+    def _connect_kwargs(self) -> dict[str, Any]:
+        # the sqlite backend needs none of these.
+        return {
+            "user": getattr(self._config, "user", None),
+            "password": getattr(self._config, "password", None),
+            "host": getattr(self._config, "host", None),
+            "database": getattr(self._config, "database", None),
+            "port": getattr(self._config, "port", None),
+            "record_class": AGBRecordClass,
+            "server_settings": {"application_name": self.instance_id},
+        }
 
     async def create_connection(self) -> None:
-        self.__open_connections = []
-        if self._pool is not None and not self._pool._closed:
+        if self.pool is not None and not self.pool._closed:
             return
 
-        pool: Pool = await create_pool(
-            user=self._config.user,
-            password=self._config.password,
-            host=self._config.host,
-            database=self._config.database,
-            port=self._config.port,
-            record_class=AGBRecordClass,
-        )  # type: ignore
-        self._pool = pool
+        await self.pool_manager.create(**self._connect_kwargs())
 
         # circular imports
         from utils.default import log
 
         log(f"{DATABASE_LOGGING_PREFIX} Successfully created a connection to the database.")
 
-    async def __get_active_connection(self) -> AsyncConnection:
-        if len(self.__open_connections) == 0:
-            return await self.pool.acquire()
-        return self.__open_connections[0]
+        if self.replicas is not None:
+            await self.replicas.start(
+                record_class=AGBRecordClass,
+                server_settings={"application_name": self.instance_id},
+            )
+            log(f"{DATABASE_LOGGING_PREFIX} Routing reads to {self.replicas!r}.")
 
-    async def __close_connections(self, c: Optional[AsyncConnection] = None) -> None:
-        with contextlib.suppress(Exception):
-            if c and not c.is_closed():
-                await self.pool.release(c)
-                with contextlib.suppress(ValueError):
-                    self.__open_connections.remove(c)
-            for connection in self.__open_connections:
-                if connection.is_closed():
-                    self.__open_connections.remove(connection)
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[AsyncConnection]:
+        """Pin one pool connection for the duration of the block.
 
-    async def execute(self, query, *args) -> Any:
-        con = await self.__get_active_connection()
+        Every ``execute``/``fetch*`` call made inside the block, from this task,
+        reuses the pinned connection instead of acquiring one per query.
+        Nested calls reuse the connection that's already pinned.
+
+        Example
+        -------
+        .. code-block:: python
+
+            async with db.acquire():
+                await db.fetchrow(...)
+                await db.execute(...)
+        """
+        pinned = self.__pinned.get()
+        if pinned is not None and not pinned.is_closed():
+            yield pinned
+            return
+
+        start = time.perf_counter()
+        connection = await self.pool_manager.acquire(critical=self.__critical.get())
+        self.query_stats.record_acquire(time.perf_counter() - start)
+        token = self.__pinned.set(connection)
         try:
-            return await con.execute(query, *args)
-        except Exception as e:
-            raise DatabaseError(e) from e
+            yield connection
         finally:
-            await self.__close_connections(con)
+            self.__pinned.reset(token)
+            await self.pool_manager.release(connection)
 
-    async def executemany(self, query, *args) -> Any:
-        con = await self.__get_active_connection()
+    @contextlib.contextmanager
+    def non_critical(self) -> Iterator[None]:
+        """Mark the queries made inside the block, from this task, as safe to drop.
+
+        When the pool is saturated they raise :exc:`~utils.errors.PoolSaturated`
+        right away instead of waiting for a connection. Meant for work like
+        logging listeners, that shouldn't hold up commands when the database is busy.
+        """
+        token = self.__critical.set(False)
         try:
-            return await con.executemany(query, args)
-        except Exception as e:
-            raise DatabaseError(e) from e
+            yield
         finally:
-            await self.__close_connections(con)
+            self.__critical.reset(token)
 
-    async def fetch(self, query, *args) -> list[AGBRecordClass]:  # type: ignore
-        con = await self.__get_active_connection()
+    @contextlib.contextmanager
+    def primary(self) -> Iterator[None]:
+        """Run every query made inside the block, from this task, on the primary.
+
+        Reads already stay on the primary for a few seconds after the task wrote,
+        this is for reads that have to see writes made elsewhere, like the
+        cache watermarks.
+        """
+        token = self.__primary_until.set(float("inf"))
         try:
-            return await con.fetch(query, *args)
-        except Exception as e:
-            raise DatabaseError(e) from e
+            yield
         finally:
-            await self.__close_connections(con)
+            self.__primary_until.reset(token)
+
+    def __use_replica(self, method: str, query: str) -> bool:
+        return (
+            self.replicas is not None
+            and method in _READ_METHODS
+            # acquire()/transaction() blocks may read their own uncommitted writes.
+            and self.__pinned.get() is None
+            and time.monotonic() >= self.__primary_until.get()
+            and is_read_only(query)
+        )
 
-    async def fetchrow(self, query, *args) -> Optional[AGBRecordClass]:
-        con = await self.__get_active_connection()
+    @contextlib.asynccontextmanager
+    async def transaction(self, **kwargs: Any) -> AsyncIterator[AsyncConnection]:
+        """Like :meth:`acquire` but runs the block inside a transaction.
+
+        The transaction is committed when the block exits and rolled back if it raises.
+        Nested calls create a savepoint. Keyword arguments are passed to
+        :meth:`asyncpg.Connection.transaction`.
+        """
+        async with self.acquire() as connection:
+            async with connection.transaction(**kwargs):
+                yield connection
+
+    def _call_context(self) -> tuple[bool, bool]:
+        """Whether the current task's queries are critical and whether its reads stay on the primary."""
+        return self.__critical.get(), time.monotonic() < self.__primary_until.get()
+
+    @contextlib.asynccontextmanager
+    async def _cursor_transaction(self) -> AsyncIterator[AsyncConnection]:
+        """A transaction on a connection of its own, for cursors iterated by a generator.
+
+        Unlike :meth:`transaction` the connection isn't pinned. A generator runs
+        in its caller's context, pinning there would send every query the caller
+        makes between two batches to the cursor's transaction.
+        """
+        start = time.perf_counter()
+        connection = await self.pool_manager.acquire(critical=self.__critical.get())
+        self.query_stats.record_acquire(time.perf_counter() - start)
         try:
-            return await con.fetchrow(query, *args)
-        except Exception as e:
-            raise DatabaseError(e) from e
+            async with connection.transaction():
+                yield connection
         finally:
-            await self.__close_connections(con)
+            await self.pool_manager.release(connection)
+
+    async def __get_active_connection(self) -> AsyncConnection:
+        pinned = self.__pinned.get()
+        if pinned is not None and not pinned.is_closed():
+            return pinned
+
+        start = time.perf_counter()
+        connection = await self.pool_manager.acquire(critical=self.__critical.get())
+        self.query_stats.record_acquire(time.perf_counter() - start)
+        return connection
+
+    async def __close_connections(self, c: Optional[AsyncConnection] = None) -> None:
+        # pinned connections are released by acquire()
+        if c is None or c is self.__pinned.get():
+            return
+        await self.pool_manager.release(c)
+
+    async def __run(self, method: str, query: str, args: tuple[Any, ...]) -> Any:
+        stats = self.query_stats
+
+        if self.__use_replica(method, query):
+            replica = self.replicas.pick()  # type: ignore
+            if replica is not None:
+                start = time.perf_counter()
+                failed = False
+                try:
+                    return await replica.run(method, query, args)
+                except FALLBACK_ERRORS as e:
+                    # the primary can always answer, the query runs there below.
+                    failed = True
+                    self.replicas.mark_failed(replica, e)  # type: ignore
+                except Exception as e:
+                    failed = True
+                    raise DatabaseError(e) from e
+                finally:
+                    stats.record(query, args, time.perf_counter() - start, failed=failed)
+
+        elif self.replicas is not None and not (method in _READ_METHODS and is_read_only(query)):
+            # reads that follow this write in the same task have to see it, replicas may lag behind.
+            self.__primary_until.set(max(self.__primary_until.get(), time.monotonic() + self.replicas.sticky))
+
+        attempt = 0
+        while True:
+            con = await self.__get_active_connection()
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await getattr(con, method)(query, *args)
+            except Exception as e:
+                failed = True
+                # a pinned connection may be inside a transaction, only its owner can retry that.
+                delay = (
+                    None
+                    if con is self.__pinned.get()
+                    else self.pool_manager.retry_delay(e, attempt, read_only=method in _READ_METHODS)
+                )
+                if delay is None:
+                    raise DatabaseError(e) from e
+            finally:
+                stats.record(query, args, time.perf_counter() - start, failed=failed)
+                await self.__close_connections(con)
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def execute(self, query, *args) -> Any:
+        return await self.__run("execute", query, args)
+
+    async def executemany(self, query, *args) -> Any:
+        # asyncpg takes the argument tuples as a single iterable.
+        return await self.__run("executemany", query, (args,))
+
+    async def fetch(self, query, *args) -> list[AGBRecordClass]:  # type: ignore
+        return await self.__run("fetch", query, args)
+
+    async def fetchrow(self, query, *args) -> Optional[AGBRecordClass]:
+        return await self.__run("fetchrow", query, args)
 
     async def fetchval(self, query, *args) -> Optional[Any]:
-        con = await self.pool.acquire()
-        try:
-            return await con.fetchval(query, *args)
-        except Exception as e:
-            raise DatabaseError(e) from e
-        finally:
-            await self.__close_connections(con)
+        return await self.__run("fetchval", query, args)
 
     async def close(self) -> None:
-        if self._pool is None:
-            return
+        if self.replicas is not None:
+            await self.replicas.close()
+        await self.pool_manager.close()
+
+
+# (maxsize, ttl) per cached table, ``None`` means unbounded / no expiry.
+# commands and badges are read from cache only, evicting them would silently drop data.
+DEFAULT_CACHE_LIMITS: dict[Table, tuple[Optional[int], Optional[float]]] = {
+    Table.USERECO: (50_000, 60 * 60),
+    Table.USERS: (100_000, 60 * 60),
+    Table.GUILDS: (50_000, None),
+    Table.AUTOMOD: (10_000, None),
+    Table.AUTOROLES: (10_000, None),
+    Table.BADGES: (None, None),
+    Table.REMINDERS: (10_000, None),
+    Table.STATUS: (None, None),
+    Table.BLACKLIST: (100_000, 60 * 60),
+    Table.COMMANDS: (None, None),
+    Table.GUILDBLACKLISTS: (50_000, None),
+}
+
+NEGATIVE_CACHE_MAXSIZE: int = 100_000
+ENSURED_USERS_MAXSIZE: int = 200_000
+# tables Database.refresh keeps up to date, reminders aren't cached.
+REFRESH_TABLES: tuple[Table, ...] = tuple(table for table in Table if table is not Table.REMINDERS)
+# rows from transactions that committed late carry an older updated_at, refresh looks back this far.
+REFRESH_OVERLAP: timedelta = timedelta(seconds=5)
+# tables with an in-memory index that holds rows the cache may have evicted.
+INDEXED_TABLES: frozenset[Table] = frozenset((Table.BLACKLIST, Table.GUILDS))
+# read for every message or command, warmed first by chunk(priority=True).
+PRIORITY_CHUNK_TABLES: tuple[Table, ...] = (Table.GUILDBLACKLISTS, Table.COMMANDS, Table.BLACKLIST)
+
+
+def _ensure_row(table: Table, columns: str, values: str) -> str:
+    # ON CONFLICT rather than NOT EXISTS, two processes ensuring the same new user would both insert.
+    return (
+        f"{table}_row AS (INSERT INTO {table} ({columns}) VALUES ({values}) "
+        f"ON CONFLICT (userid) DO NOTHING RETURNING '{table}'::text AS tbl)"
+    )
+
+
+def _userid_unique_sql(table: Table) -> str:
+    # ON CONFLICT (userid) needs a unique index on exactly that column, the primary key is one if it's userid.
+    return f"""
+DO $$
+BEGIN
+    IF to_regclass('{table}') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = to_regclass('{table}') AND i.indisunique AND i.indnkeyatts = 1
+            AND i.indpred IS NULL AND a.attname = 'userid'
+    ) THEN
+        CREATE UNIQUE INDEX {table}_userid_key ON {table} (userid);
+    END IF;
+END
+$$
+"""
+
+
+# badges aren't listed, a user only has badge rows for the badges they have.
+_ENSURE_USER_ROWS: tuple[tuple[Table, str, str], ...] = (
+    (Table.USERS, "userid", "$1"),
+    (Table.USERECO, "userid, balance, bank", "$1, $2, $3"),
+)
+
+ENSURED_USER_TABLES: frozenset[Table] = frozenset(table for table, _, _ in _ENSURE_USER_ROWS)
+# run at startup, fails while the table holds duplicate user ids.
+ENSURE_USER_INDEX_SQL: tuple[str, ...] = tuple(_userid_unique_sql(table) for table, _, _ in _ENSURE_USER_ROWS)
 
-        await self._pool.close()
-        self._pool = None
-        self.__open_connections = []
+# $1 user id, $2 balance, $3 bank. returns one row per table a row was added to.
+ENSURE_USER_QUERY: str = (
+    "WITH "
+    + ", ".join(_ensure_row(*row) for row in _ENSURE_USER_ROWS)
+    + " "
+    + " UNION ALL ".join(f"SELECT tbl FROM {table}_row" for table, _, _ in _ENSURE_USER_ROWS)
+)
 
 
 class Database(Connection):
@@ -149,24 +433,37 @@ class Database(Connection):
         bot: AGB,
         /,
         config: DBConfig,
+        *,
+        cache_limits: Optional[dict[Table, tuple[Optional[int], Optional[float]]]] = None,
+        cache_cls: type[RecordCache] = RecordCache,
+        negative_cache_ttl: float = 60.0,
+        snapshot_path: Optional[str] = None,
+        snapshot_interval: float = 300.0,
+        slow_query_threshold: Optional[float] = 0.5,
     ) -> None:
-        super().__init__(bot, config=config)
+        super().__init__(bot, config=config, slow_query_threshold=slow_query_threshold)
 
         # cache
 
-        self._commands: dict[int, Command] = {}
-        self._users: dict[int, User] = {}
-        self._economy_users: dict[int, UserEconomy] = {}
-        self._guilds: dict[int, Guild] = {}
-        self._automods: dict[int, AutoMod] = {}
-        self._autoroles: dict[int, AutoRole] = {}
-        self._badges: dict[str, Badge] = {}
-        self._blacklists: dict[int, Blacklist] = {}
-        self._guild_blacklists: dict[int, GuildBlacklist] = {}
-        self._statuses: dict[int, Status] = {}
-        self._reminders: dict[int, AGBRecord] = {}
-
-        self._table_to_cache: dict[Table, tuple[str, dict[Any, Any]]] = {
+        limits = {**DEFAULT_CACHE_LIMITS, **(cache_limits or {})}
+
+        def make_cache(table: Table) -> RecordCache[Any, Any]:
+            maxsize, ttl = limits[table]
+            return cache_cls(table.value, maxsize=maxsize, ttl=ttl)
+
+        self._commands: RecordCache[int, Command] = make_cache(Table.COMMANDS)
+        self._users: RecordCache[int, User] = make_cache(Table.USERS)
+        self._economy_users: RecordCache[int, UserEconomy] = make_cache(Table.USERECO)
+        self._guilds: RecordCache[int, Guild] = make_cache(Table.GUILDS)
+        self._automods: RecordCache[int, AutoMod] = make_cache(Table.AUTOMOD)
+        self._autoroles: RecordCache[int, AutoRole] = make_cache(Table.AUTOROLES)
+        self._badges: RecordCache[str, Badge] = make_cache(Table.BADGES)
+        self._blacklists: RecordCache[int, Blacklist] = make_cache(Table.BLACKLIST)
+        self._guild_blacklists: RecordCache[int, GuildBlacklist] = make_cache(Table.GUILDBLACKLISTS)
+        self._statuses: RecordCache[int, Status] = make_cache(Table.STATUS)
+        self._reminders: RecordCache[int, AGBRecord] = make_cache(Table.REMINDERS)
+
+        self._table_to_cache: dict[Table, tuple[str, RecordCache[Any, Any]]] = {
             Table.USERECO: ("userid", self._economy_users),
             Table.USERS: ("userid", self._users),
             Table.GUILDS: ("guildid", self._guilds),
@@ -177,33 +474,239 @@ class Database(Connection):
             Table.STATUS: ("id", self._statuses),
             Table.BLACKLIST: ("userid", self._blacklists),
             Table.COMMANDS: ("guild", self._commands),
-            Table.GUILDBLACKLISTS: ("id", self._blacklists),
+            Table.GUILDBLACKLISTS: ("id", self._guild_blacklists),
+        }
+
+        # keys getch recently found no row for, so hot paths don't query for them on every event.
+        self._absent: RecordCache[tuple[Table, Any], bool] = cache_cls(
+            "absent", maxsize=NEGATIVE_CACHE_MAXSIZE, ttl=negative_cache_ttl
+        )
+        # (table, key) -> [generation, getch calls in flight], only kept while a getch for the key runs.
+        # _forget_absent bumps the generation, a fetch that raced a write mustn't mark the key absent.
+        self._absent_generations: dict[tuple[Table, Any], list[int]] = {}
+
+        # every blacklisted user, so the per command check needs no query.
+        self.blacklist_index: BlacklistIndex = BlacklistIndex()
+        # who has which badge, what Badge objects and get_user_badges read.
+        self.badge_index: BadgeIndex = BadgeIndex()
+        # guild -> autopost channel, every guild that has one.
+        self.autopost_channels: AutopostRegistry = AutopostRegistry()
+        # lifts temporary blacklists when they run out.
+        self.blacklist_expiry: BlacklistExpiry = BlacklistExpiry(self)
+
+        # users that have a row in every per user table, see ensure_user.
+        self._ensured_users: RecordCache[int, bool] = cache_cls("ensured", maxsize=ENSURED_USERS_MAXSIZE)
+
+        # bound fetch methods per table, used by getch.
+        self._fetch_methods: dict[Table, Callable[[Any], Awaitable[Any]]] = {
+            table: getattr(self, info.fetch_method) for table, info in table_info.items() if info.fetch_method
         }
 
+        # coalesces identical single row fetches that are in flight at the same time.
+        self._single_flight: SingleFlight = SingleFlight()
+
+        # cross process invalidation, see CacheInvalidator
+        self._invalidator: CacheInvalidator = CacheInvalidator(self)
+
+        # write-behind counters
+        self.command_uses: WriteBehindCounter = WriteBehindCounter(self, Table.USERS, "userid", "usedcmds")
+
+        # high-water mark of updated_at per table, see refresh.
+        self._watermarks: dict[Table, datetime] = {}
+
+        # on-disk copy of the caches for warm restarts, see CacheSnapshot
+        self.snapshot: Optional[CacheSnapshot] = (
+            CacheSnapshot(self, snapshot_path, interval=snapshot_interval) if snapshot_path else None
+        )
+
     def __repr__(self) -> str:
-        cache_totals = " ".join(
-            f"{t.name.title()}: {len(cache.values())}" for t, (_, cache) in self._table_to_cache.items()
+        cache_totals = ", ".join(
+            f"{t.name.title()}: {cache.summary()}" for t, (_, cache) in self._table_to_cache.items()
         )
-        return f"{self.__class__.__name__}({cache_totals})"
+        return f"{self.__class__.__name__}({cache_totals}, Saved Queries: {self.saved_queries})"
+
+    @property
+    def saved_queries(self) -> int:
+        """int: How many queries were skipped because an identical fetch was already in flight."""
+        return self._single_flight.saved
+
+    def cache_stats(self) -> list[dict[str, Any]]:
+        """List[dict[str, Any]]: Size, limits and hit/miss/eviction counters of every table cache."""
+        return [cache.stats() for _, cache in self._table_to_cache.values()]
+
+    async def close(self) -> None:
+        await self._invalidator.close()
+        await self.blacklist_expiry.close()
+
+        # flush pending counters and write the last snapshot while the pool is still open.
+        if self.pool is not None:
+            with contextlib.suppress(DatabaseError):
+                await self.command_uses.close()
+            if self.snapshot is not None:
+                await self.snapshot.close()
+
+        await super().close()
 
     def _add_to_cache(self, table: Table, class_instance: Any) -> None:
         cache_key, cache_dict = self._table_to_cache[table]
-        typed_dict = table_to_cls[table].data_dict
-        cast_to = get_type_hints(typed_dict)[cache_key]
-
-        cache_key_value = getattr(class_instance, cache_key)
-        cache_dict[cast_to(cache_key_value)] = class_instance
+        cache_key_value = table_info[table].key_type(getattr(class_instance, cache_key))
+        self._forget_absent(table, cache_key_value)
+        cache_dict[cache_key_value] = class_instance
+        if table in INDEXED_TABLES:
+            self._track_indexed(table, class_instance)
+
+    def _forget_absent(self, table: Table, key: Any) -> None:
+        self._absent.pop((table, key), None)
+        if (generation := self._absent_generations.get((table, key))) is not None:
+            generation[0] += 1
+
+    def _flight_key(self, key: Hashable) -> Optional[Hashable]:
+        # the shared call runs in a task that inherits the caller's context, pinned connection included.
+        # a pinned connection (acquire/transaction blocks) belongs to one task and may see uncommitted
+        # writes, so its queries are neither shared with nor taken from other tasks.
+        if self.pinned_connection is not None:
+            return None
+        # a critical caller joining a non_critical() call would get its PoolSaturated, a caller whose
+        # reads stick to the primary would get a replica's answer. calls are shared within the same context.
+        return key, self._call_context()
+
+    def _track_indexed(self, table: Table, record: Any) -> None:
+        # the blacklist index and the autopost registry hold rows the cache may not.
+        if table is Table.BLACKLIST:
+            self._track_blacklist(record)
+        elif table is Table.GUILDS:
+            self.autopost_channels.update(record)
+
+    def _untrack_indexed(self, table: Table, key: Any) -> None:
+        if table is Table.BLACKLIST:
+            self._untrack_blacklist(key)
+        elif table is Table.GUILDS:
+            self.autopost_channels.discard(key)
+
+    def _track_blacklist(self, record: Any) -> None:
+        # a blacklist row was written or read, the index and the expiry schedule follow it.
+        self.blacklist_index.update(record)
+        self.blacklist_expiry.track(record)
+
+    def _untrack_blacklist(self, user_id: int) -> None:
+        self.blacklist_index.discard(user_id)
+        self.blacklist_expiry.cancel(user_id)
+
+    async def _apply_invalidation(self, table: Table, operation: str, keys: list[Optional[str]]) -> None:
+        # circular imports
+        from utils.default import log
 
-    async def initate_database(self, *, chunk: bool = True) -> None:
+        info = table_info[table]
+        _, cache = self._table_to_cache[table]
+        try:
+            # badge rows aren't ensured, losing one leaves the user's other rows alone.
+            if table is Table.BADGES:
+                if None in keys:
+                    await self.fetch_badges(cache=True)
+                    return
+                for user_id in dict.fromkeys(keys):
+                    # the key is the user, a badge row doesn't say which badges they have left.
+                    await self.fetch_user_badges(int(user_id))  # type: ignore
+                return
+
+            cache_keys = [info.key_type(key) for key in dict.fromkeys(keys) if key is not None]
+            for cache_key in cache_keys:
+                self._forget_absent(table, cache_key)
+            if operation == "DELETE":
+                for cache_key in cache_keys:
+                    if table in ENSURED_USER_TABLES:
+                        self.forget_ensured_user(cache_key)
+                    cache.pop(cache_key, None)
+                    self._untrack_indexed(table, cache_key)
+                return
+
+            # only refresh what's cached, everything else gets fetched on demand anyways.
+            # the indexes hold every blacklisted user and autopost channel, not only the cached ones.
+            stale = [key for key in cache_keys if table in INDEXED_TABLES or cache.peek(key) is not None]
+            if not stale:
+                return
+
+            # one query for every row of the statement, not one per row. a replica may not have the change yet.
+            with self.primary():
+                rows = await self.fetch(compile_select_any(table, info.key_column), stale)
+            cls = table_to_cls[table]
+            found = set()
+            for row in rows:
+                key = row[info.key_column]
+                found.add(key)
+                if cache.peek(key) is not None:
+                    self._add_to_cache(table, cls(self, row))
+                elif table in INDEXED_TABLES:
+                    self._track_indexed(table, row)
+            for key in stale:
+                if key not in found:
+                    cache.pop(key, None)
+        except (DatabaseError, ValueError) as e:
+            log(f"{DATABASE_LOGGING_PREFIX} Failed to apply invalidation for {table} {keys}: {e}")
+
+    async def initate_database(self, *, chunk: bool = True, listen: bool = True) -> None:
         # circular imports
         from utils.default import log
 
         log(f"{DATABASE_LOGGING_PREFIX} Initializing database...")
         await self.create_connection()
-        if chunk:
+        self.command_uses.start()
+        try:
+            # before the updated_at columns, they go on the migrated table.
+            async with self.transaction():
+                for statement in BADGES_MIGRATION_SQL:
+                    await self.execute(statement)
+        except (DatabaseError, PostgresError) as e:
+            log(f"{DATABASE_LOGGING_PREFIX} Could not migrate the badges table: {e}")
+        # the partial indexes the in-memory indexes are loaded through, loading them never runs DDL.
+        for statement in (BLACKLISTED_INDEX_SQL, AUTOPOST_INDEX_SQL):
+            try:
+                await self.execute(statement)
+            except (DatabaseError, PostgresError) as e:
+                log(f"{DATABASE_LOGGING_PREFIX} Could not create an index: {e}")
+        for statement in ENSURE_USER_INDEX_SQL:
+            try:
+                await self.execute(statement)
+            except (DatabaseError, PostgresError) as e:
+                log(
+                    f"{DATABASE_LOGGING_PREFIX} Could not make userid unique, ensure_user needs it. "
+                    f"Remove the duplicate rows and restart: {e}"
+                )
+        try:
+            installed = await install_updated_at(self)
+        except (DatabaseError, PostgresError) as e:
+            log(f"{DATABASE_LOGGING_PREFIX} Could not install the {UPDATED_AT_COLUMN} columns: {e}")
+        else:
+            # everything cached from here on is at least as new as this.
+            with self.primary():
+                baseline: datetime = await self.fetchval("SELECT now()")
+            self._watermarks = {table: baseline for table in installed if table in REFRESH_TABLES}
+        if listen and self.pool_manager.notifications:
+            try:
+                await self._invalidator.install()
+                await self._invalidator.start()
+            except (OSError, PostgresError) as e:
+                log(f"{DATABASE_LOGGING_PREFIX} Cache invalidation unavailable: {e}")
+
+        # a snapshot replaces the startup chunk, it's reconciled in the background.
+        taken_at = self.snapshot.load() if self.snapshot is not None else None
+        # after the snapshot, whose rows may be outdated.
+        await self.load_blacklist_index()
+        await self.load_badge_index()
+        await self.load_autopost_channels()
+        try:
+            if migrated := await self.blacklist_expiry.install():
+                log(f"{DATABASE_LOGGING_PREFIX} Moved {migrated} temporary blacklists to the expires_at column.")
+            await self.blacklist_expiry.load()
+        except DatabaseError as e:
+            log(f"{DATABASE_LOGGING_PREFIX} Could not load the temporary blacklists: {e}")
+        self.blacklist_expiry.start()
+        if chunk and taken_at is None:
             log(f"{DATABASE_LOGGING_PREFIX} Chunking database...")
-            await self.chunk(commands=True)
+            await self.chunk(priority=True)
             log(f"{DATABASE_LOGGING_PREFIX} Chunking database... Done!")
+        if self.snapshot is not None:
+            self.snapshot.start(reconcile_from=taken_at)
 
         log(f"{DATABASE_LOGGING_PREFIX} Database initialized.")
 
@@ -216,31 +719,166 @@ class Database(Connection):
         blacklists: bool = False,
         commands: bool = False,
         guilds: bool = False,
+        guild_blacklists: bool = False,
         statuses: bool = False,
         users: bool = False,
         user_economy: bool = False,
-    ) -> None:
+        priority: bool = False,
+        batch_size: int = 5000,
+    ) -> dict[Table, int]:
+        """Fetch whole tables into their caches.
+
+        The selected tables are chunked concurrently, each over its own pool connection,
+        and read in pages of ``batch_size`` rows. A table stops being read once its cache is full.
+
+        Parameters
+        ----------
+        priority: bool
+            Also chunk :data:`PRIORITY_CHUNK_TABLES`, the tables checked for every message
+            and command. They're chunked before any other selected table.
+        batch_size: int
+            The amount of rows fetched per round trip. Defaults to 5000.
+
+        Returns
+        -------
+        dict[:class:`Table`, int]
+            The amount of entries cached per table.
+        """
+        selected = {
+            Table.AUTOMOD: auto_mod,
+            Table.AUTOROLES: auto_roles,
+            Table.BADGES: badges,
+            Table.BLACKLIST: blacklists,
+            Table.COMMANDS: commands,
+            Table.GUILDS: guilds,
+            Table.GUILDBLACKLISTS: guild_blacklists,
+            Table.STATUS: statuses,
+            Table.USERS: users,
+            Table.USERECO: user_economy,
+        }
+        if priority:
+            selected.update(dict.fromkeys(PRIORITY_CHUNK_TABLES, True))
+
+        tables = [table for table, enabled in selected.items() if enabled]
+        first = [table for table in tables if table in PRIORITY_CHUNK_TABLES] if priority else []
+        groups = (first, [table for table in tables if table not in first])
+
+        counts: dict[Table, int] = {}
+        for group in groups:
+            if not group:
+                continue
+            # a pinned connection can't be shared between tasks.
+            if self.pinned_connection is not None:
+                for table in group:
+                    counts[table] = await self._chunk_table(table, batch_size)
+            else:
+                results = await asyncio.gather(*(self._chunk_table(table, batch_size) for table in group))
+                counts.update(zip(group, results))
+
+        return counts
+
+    async def _chunk_table(self, table: Table, batch_size: int) -> int:
         # circular imports
         from utils.default import log
 
-        to_chunk = (
-            ("Auto Mod", auto_mod, self.fetch_automods),
-            ("Auto Roles", auto_roles, self.fetch_autoroles),
-            ("Badges", badges, self.fetch_badges),
-            ("Blacklists", blacklists, self.fetch_blacklists_table),
-            ("Commands", commands, self.fetch_commands),
-            ("Guilds", guilds, self.fetch_guilds),
-            ("Statuses", statuses, self.fetch_statuses),
-            ("Users", users, self.fetch_users),
-            ("Users Economy", user_economy, self.fetch_economy_users),
-        )
-        for (pretty_name, to_chunk, to_call) in to_chunk:
-            should_chunk = to_chunk
-            if should_chunk is True:
-                prefix: str = f"{DATABASE_LOGGING_PREFIX} Chunking {pretty_name}..."
-                log(prefix)
-                objs = await to_call(cache=True)
-                log(f"{prefix} Done! Fetched and cached {len(objs)} entries.")
+        prefix: str = f"{DATABASE_LOGGING_PREFIX} Chunking {table.name.title()}..."
+        log(prefix)
+        start = time.perf_counter()
+
+        if table is Table.BADGES:
+            count = len(await self.fetch_badges(cache=True))
+        else:
+            cache = self._table_to_cache[table][1]
+            count = 0
+            async with contextlib.aclosing(self.stream(table, batch_size=batch_size)) as batches:
+                async for batch in batches:
+                    for inst in batch:
+                        self._add_to_cache(table, inst)
+                    count += len(batch)
+                    if cache.maxsize is not None and count >= cache.maxsize:
+                        log(f"{prefix} Cache is full, stopping at {count:,} entries.")
+                        break
+
+        elapsed = time.perf_counter() - start
+        rate = count / elapsed if elapsed > 0 else float(count)
+        log(f"{prefix} Done! Cached {count:,} entries in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+        return count
+
+    async def refresh(self, table: Table) -> int:
+        """Patch the cache of a table with the rows changed since the last refresh.
+
+        Only rows whose ``updated_at`` is past the table's high-water mark are fetched,
+        unlike :meth:`chunk` which reads the whole table. Bounded caches only get rows
+        they already hold, unbounded caches get every changed row. Deleted rows are
+        left to the cache invalidation and the cache TTLs.
+
+        Parameters
+        ----------
+        table: :class:`Table`
+            The table to refresh.
+
+        Returns
+        -------
+        int
+            The amount of rows that changed since the last refresh.
+        """
+        since = self._watermarks.get(table)
+        if since is None:
+            return 0
+
+        # a lagging replica would move the watermark past rows it hasn't replayed yet.
+        with self.primary():
+            rows = await self.fetch(compile_changed_since(table, UPDATED_AT_COLUMN), since - REFRESH_OVERLAP)
+        if not rows:
+            return 0
+
+        self._watermarks[table] = max(since, rows[-1][UPDATED_AT_COLUMN])
+        # rows inside the overlap were seen by the last refresh already.
+        changed = sum(1 for row in rows if row[UPDATED_AT_COLUMN] > since)
+        if table is Table.BADGES:
+            if changed:
+                await self.fetch_badges(cache=True)
+            return changed
+
+        key_column = table_info[table].key_column
+        cache = self._table_to_cache[table][1]
+        cls = table_to_cls[table]
+        for row in rows:
+            key = row[key_column]
+            self._forget_absent(table, key)
+            if cache.maxsize is None or key in cache:
+                self._add_to_cache(table, cls(self, row))
+            elif table in INDEXED_TABLES:
+                self._track_indexed(table, row)
+
+        return changed
+
+    async def refresh_all(self) -> dict[Table, int]:
+        """Run :meth:`refresh` for every cached table. Failures are logged and skipped.
+
+        Returns
+        -------
+        dict[:class:`Table`, int]
+            The amount of changed rows per table.
+        """
+        # circular imports
+        from utils.default import log
+
+        if not self.blacklist_index.loaded:
+            await self.load_blacklist_index()
+        if not self.badge_index.loaded:
+            await self.load_badge_index()
+        if not self.autopost_channels.loaded:
+            await self.load_autopost_channels()
+
+        counts: dict[Table, int] = {}
+        for table in REFRESH_TABLES:
+            try:
+                counts[table] = await self.refresh(table)
+            except DatabaseError as e:
+                log(f"{DATABASE_LOGGING_PREFIX} Failed to refresh {table}: {e}")
+
+        return counts
 
     @overload
     async def getch(self, table: Literal[Table.USERECO, "usereco", "USERECO"], key: int) -> Optional[UserEconomy]:
@@ -300,53 +938,53 @@ class Database(Connection):
         key : Any
             The key to fetch from.
 
+        Keys without a matching row are remembered for ``negative_cache_ttl`` seconds,
+        further lookups for them return ``None`` without a query until the related
+        ``add_*``/``remove_*`` method runs or the row gets edited.
+
         Returns
         -------
         Optional[:class:`AGBRecord`]
             The related record wrapped in the related class.
         """
 
-        def get_enum() -> Optional[Table]:
-            if table is Table:
-                return table  # type: ignore
-            elif isinstance(table, str):
-                try:
-                    return Table[table]
-                except KeyError:
-                    try:
-                        return Table(table)
-                    except ValueError:
-                        return None
-            else:
-                raise TypeError(f"Expected Table or str, got {type(table)}")
-
-        actual_table = get_enum()
+        actual_table = resolve_table(table)
         if actual_table is None:
+            if not isinstance(table, (str, Table)):
+                raise TypeError(f"Expected Table or str, got {type(table)}")
             raise ValueError(f"Invalid table: {str(table)}")
 
-        primary_key, cache_dict = self._table_to_cache[actual_table]
-        table_to_method = {
-            Table.USERECO: self.fetch_economy_user,
-            Table.USERS: self.fetch_user,
-            Table.GUILDS: self.fetch_guild,
-            Table.AUTOMOD: self.fetch_automod,
-            Table.AUTOROLES: self.fetch_autorole,
-            Table.BADGES: self.fetch_badge,
-            Table.STATUS: self.fetch_status,
-            Table.BLACKLIST: self.fetch_blacklist,
-            Table.COMMANDS: self.fetch_command,
-            Table.GUILDBLACKLISTS: self.fetch_guild_blacklist,
-        }
-        cls = table_to_cls[actual_table]
-        data_types = get_type_hints(cls.data_dict)
-        if not isinstance(key, data_types[primary_key]):
-            raise TypeError(f"Key must be of type {data_types[primary_key]} for table {actual_table.name}")
+        info = table_info[actual_table]
+        fetch_method = self._fetch_methods.get(actual_table)
+        if fetch_method is None:
+            raise ValueError(f"Table {actual_table.name} can't be used with getch")
 
+        if not isinstance(key, info.key_type):
+            raise TypeError(f"Key must be of type {info.key_type} for table {actual_table.name}")
+
+        cache_dict = self._table_to_cache[actual_table][1]
         if not (record := cache_dict.get(key)):
+            absent_key = (actual_table, key)
+            if absent_key in self._absent:
+                return None
+
+            generation = self._absent_generations.get(absent_key)
+            if generation is None:
+                generation = self._absent_generations[absent_key] = [0, 0]
+            generation[1] += 1
+            started_at = generation[0]
             try:
-                record = await table_to_method[actual_table](key)
+                record = await fetch_method(key, cache=True)
             except DatabaseError:
                 return None
+            finally:
+                generation[1] -= 1
+                if not generation[1]:
+                    del self._absent_generations[absent_key]
+
+            # a row added while the fetch ran isn't absent, even though the fetch missed it.
+            if record is None and generation[0] == started_at:
+                self._absent[absent_key] = True
 
         return record
 
@@ -384,18 +1022,25 @@ class Database(Connection):
             Whether to fetch one or many. This is ``True`` if `where` is not ``None``
             unless it's explicitly set to ``False``.
         """
-        query = f"SELECT * FROM {table.value}"
+        query = compile_select(table, tuple(where) if where else ())
         cls = table_to_cls[table]
         values = tuple(where.values()) if where else ()
 
         if fetch_one is None:
             fetch_one = where is not None
 
-        if where is not None:
-            query += " WHERE " + " AND ".join(f"{k} = ${i}" for i, (k, v) in enumerate(where.items(), start=1))
-
         if fetch_one is True:
-            data = await self.fetchrow(query, *values)
+            try:
+                hash(values)
+            except TypeError:
+                flight_key = None
+            else:
+                flight_key = self._flight_key((query, values))
+            if flight_key is None:
+                data = await self.fetchrow(query, *values)
+            else:
+                data = await self._single_flight.do(flight_key, lambda: self.fetchrow(query, *values))
+
             if data is None:
                 return None
 
@@ -417,6 +1062,180 @@ class Database(Connection):
 
         return to_ret
 
+    # streaming & aggregates ---
+
+    @staticmethod
+    def _check_columns(table: Table, *columns: str) -> None:
+        known = table_info[table].columns
+        for column in columns:
+            if column not in known:
+                raise ValueError(f"Unknown column {column!r} for table {table.name}")
+
+    async def stream(
+        self, table: Union[str, Table], *, where: Optional[dict[str, Any]] = None, batch_size: int = 1000
+    ) -> AsyncIterator[list[AGBRecord[Any]]]:
+        """Iterate over a whole table in batches through a server side cursor.
+
+        Only ``batch_size`` rows are held in memory at a time and nothing is cached,
+        use this instead of the ``fetch_*`` methods when every row has to be looked at once.
+        The cursor holds a pool connection of its own until the iteration ends, queries
+        made between batches use other connections. The SQLite backend has just one,
+        finish iterating before querying there.
+
+        Parameters
+        ----------
+        table: Union[str, :class:`Table`]
+            The table to iterate over.
+        where: Optional[dict[str, Any]]
+            Columns to match.
+        batch_size: int
+            The amount of rows fetched per round trip. Defaults to 1000.
+
+        Yields
+        ------
+        list[:class:`AGBRecord`]
+            The next batch of rows wrapped in the related class.
+        """
+        actual_table = resolve_table(table)
+        if actual_table is None:
+            raise ValueError(f"Invalid table: {str(table)}")
+        if actual_table is Table.BADGES:
+            raise ValueError("Badges are grouped per badge and can't be streamed, use fetch_badges instead")
+        if where:
+            self._check_columns(actual_table, *where)
+
+        query = compile_select(actual_table, tuple(where) if where else ())
+        cls = table_to_cls[actual_table]
+        values = tuple(where.values()) if where else ()
+
+        # cursors only live inside a transaction.
+        async with self._cursor_transaction() as connection:
+            cursor = await connection.cursor(query, *values)
+            while batch := await cursor.fetch(batch_size):
+                yield [cls(self, entry) for entry in batch]
+
+    async def sum_column(self, table: Table, column: str, *, where: Optional[dict[str, Any]] = None) -> int:
+        """Sum a column on the server.
+
+        Parameters
+        ----------
+        table: :class:`Table`
+            The table to sum in.
+        column: str
+            The column to sum.
+        where: Optional[dict[str, Any]]
+            Columns to match.
+
+        Returns
+        -------
+        int
+            The sum, ``0`` if no rows matched.
+        """
+        self._check_columns(table, column, *(where or ()))
+        query = compile_aggregate(table, "sum", column, tuple(where) if where else ())
+        return int(await self.fetchval(query, *(where.values() if where else ())) or 0)
+
+    async def count_rows(self, table: Table, *, where: Optional[dict[str, Any]] = None) -> int:
+        """Count the rows of a table on the server.
+
+        Parameters
+        ----------
+        table: :class:`Table`
+            The table to count.
+        where: Optional[dict[str, Any]]
+            Columns to match.
+
+        Returns
+        -------
+        int
+            The amount of matching rows.
+        """
+        self._check_columns(table, *(where or ()))
+        query = compile_aggregate(table, "count", "*", tuple(where) if where else ())
+        return int(await self.fetchval(query, *(where.values() if where else ())) or 0)
+
+    async def distinct_ids(self, *tables: Table, column: str = "userid", batch_size: int = 5000) -> AsyncIterator[int]:
+        """Iterate over every distinct value of ``column`` across ``tables``.
+
+        The de-duplication happens on the server and the values are read through
+        a cursor, so no table is ever loaded into memory as a whole. Like :meth:`stream`
+        the cursor holds a pool connection of its own until the iteration ends.
+
+        Parameters
+        ----------
+        *tables: :class:`Table`
+            The tables to combine. ``column`` has to exist in all of them.
+        column: str
+            The column to read. Defaults to ``"userid"``.
+        batch_size: int
+            The amount of values fetched per round trip. Defaults to 5000.
+
+        Yields
+        ------
+        int
+            Each distinct value.
+        """
+        if not tables:
+            raise ValueError("At least one table is required")
+        for table in tables:
+            self._check_columns(table, column)
+
+        query = compile_distinct(tables, column)
+        async with self._cursor_transaction() as connection:
+            cursor = await connection.cursor(query)
+            while batch := await cursor.fetch(batch_size):
+                for row in batch:
+                    yield row[0]
+
+    # per user rows ---
+
+    async def ensure_user(self, user_id: int, *, balance: int = 1000, bank: int = 500) -> list[Table]:
+        """Make sure a user has a row in every per user table.
+
+        All the checks and inserts run as a single statement. Users that were
+        ensured before are remembered and cost no query at all.
+
+        Parameters
+        ----------
+        user_id: int
+            ID of the user.
+        balance: int
+            The balance for a new economy row. Defaults to 1000.
+        bank: int
+            The bank amount for a new economy row. Defaults to 500.
+
+        Returns
+        -------
+        list[:class:`Table`]
+            The tables a row was added to. Empty if the user already had every row.
+        """
+        if user_id in self._ensured_users:
+            return []
+
+        flight_key = self._flight_key((ENSURE_USER_QUERY, user_id))
+        if flight_key is not None:
+            rows = await self._single_flight.do(
+                flight_key, lambda: self.fetch(ENSURE_USER_QUERY, user_id, balance, bank)
+            )
+        else:
+            rows = await self.fetch(ENSURE_USER_QUERY, user_id, balance, bank)
+        added = [Table(row["tbl"]) for row in rows]
+        for table in added:
+            self._forget_absent(table, user_id)
+
+        self._ensured_users[user_id] = True
+        return added
+
+    def forget_ensured_user(self, user_id: int) -> None:
+        """Forget that a user was ensured, for when one of their rows is deleted.
+
+        Parameters
+        ----------
+        user_id: int
+            ID of the user.
+        """
+        self._ensured_users.pop(user_id, None)
+
     # economy ---
 
     @property
@@ -448,6 +1267,7 @@ class Database(Connection):
         query = f"INSERT INTO {Table.USERECO} (userid, balance, bank) VALUES ($1, $2, $3) RETURNING *"
         data = await self.fetchrow(query, user_id, balance, bank)
         inst = UserEconomy(self, data)
+        self._forget_absent(Table.USERECO, user_id)
         if cache:
             self._economy_users[user_id] = inst
         return inst
@@ -467,6 +1287,8 @@ class Database(Connection):
         """
         query = f"DELETE FROM {Table.USERECO} WHERE userid = $1"
         await self.execute(query, user_id)
+        self._forget_absent(Table.USERECO, user_id)
+        self.forget_ensured_user(user_id)
         return self._economy_users.pop(user_id, None)
 
     def get_economy_user(self, user_id: int) -> Optional[UserEconomy]:
@@ -541,6 +1363,7 @@ class Database(Connection):
         query = f"INSERT INTO {Table.USERS} (userid) VALUES ($1) RETURNING *"
         data = await self.fetchrow(query, user_id)
         inst = User(self, data)
+        self._forget_absent(Table.USERS, user_id)
         if cache:
             self._users[user_id] = inst
 
@@ -561,6 +1384,8 @@ class Database(Connection):
         """
         query = f"DELETE FROM {Table.USERS} WHERE userid = $1"
         await self.execute(query, user_id)
+        self._forget_absent(Table.USERS, user_id)
+        self.forget_ensured_user(user_id)
         return self._users.pop(user_id, None)
 
     def get_user(self, user_id: int) -> Optional[User]:
@@ -635,6 +1460,7 @@ class Database(Connection):
         query = f"INSERT INTO {Table.GUILDS} (guildid) VALUES ($1) RETURNING *"
         data = await self.fetchrow(query, guild_id)
         inst = Guild(self, data)
+        self._forget_absent(Table.GUILDS, guild_id)
         if cache:
             self._guilds[guild_id] = inst
         return inst
@@ -654,8 +1480,27 @@ class Database(Connection):
         """
         query = f"DELETE FROM {Table.GUILDS} WHERE guildid = $1"
         await self.execute(query, guild_id)
+        self._forget_absent(Table.GUILDS, guild_id)
+        self.autopost_channels.discard(guild_id)
         return self._guilds.pop(guild_id, None)
 
+    async def load_autopost_channels(self) -> int:
+        """(Re)load :attr:`autopost_channels` from the database.
+
+        Returns
+        -------
+        int
+            The amount of guilds with an autopost channel, ``0`` if loading failed.
+        """
+        # circular imports
+        from utils.default import log
+
+        try:
+            return await self.autopost_channels.load(self)
+        except DatabaseError as e:
+            log(f"{DATABASE_LOGGING_PREFIX} Could not load the autopost channels: {e}")
+            return 0
+
     def get_guild(self, guild_id: int) -> Optional[Guild]:
         """Get a guild from the cache.
 
@@ -732,6 +1577,7 @@ class Database(Connection):
         data = await self.fetchrow(query, *args)
 
         inst = AutoMod(self, data)
+        self._forget_absent(Table.AUTOMOD, guild_id)
         if cache:
             self._automods[guild_id] = inst
         return inst
@@ -751,6 +1597,7 @@ class Database(Connection):
         """
         query = f"DELETE FROM {Table.AUTOMOD} WHERE guildid = $1"
         await self.execute(query, guild_id)
+        self._forget_absent(Table.AUTOMOD, guild_id)
         return self._automods.pop(guild_id, None)
 
     def get_automod(self, guild_id: int) -> Optional[AutoMod]:
@@ -785,6 +1632,7 @@ class Database(Connection):
         query = f"INSERT INTO {Table.AUTOROLES} (guildid, roleids) VALUES ($1, $2) RETURNING *"
         data = await self.fetchrow(query, guild_id, role_ids)
         inst = AutoRole(self, data)
+        self._forget_absent(Table.AUTOROLES, guild_id)
         if cache:
             self._autoroles[guild_id] = inst
         return inst
@@ -804,6 +1652,7 @@ class Database(Connection):
         """
         query = f"DELETE FROM {Table.AUTOROLES} WHERE guild_id = $1"
         await self.execute(query, guild_id)
+        self._forget_absent(Table.AUTOROLES, guild_id)
         return self._autoroles.pop(guild_id, None)
 
     def get_autorole(self, role_id: int) -> Optional[AutoRole]:
@@ -849,15 +1698,15 @@ class Database(Connection):
         return list(self._badges.values())
 
     async def add_badge(self, badge: str, user_ids: Optional[list[int]] = None, cache: bool = False) -> Badge:
-        """Add a badge to the badges table.
+        """Add a badge, optionally giving it to some users.
         Make sure to add the badge to the ValidBadge list.
 
         Parameters
         ----------
         badge: str
             Name of the badge to add.
-        user_id: int
-            ID of the user to add.
+        user_ids: Optional[list[int]]
+            IDs of the users to give the badge to.
         cache: bool
             Whether to cache the entry. Defaults to ``False``.
 
@@ -866,33 +1715,36 @@ class Database(Connection):
         :class:`Badge`
             Object representing the added badge.
         """
-        query = f"INSERT INTO {Table.BADGES} (badge) VALUES ($1) RETURNING *"
-        data = await self.fetchrow(query, badge)
-        inst = Badge(badge, self, data)
+        inst = Badge(badge, self)
         if user_ids:
+            query = f"INSERT INTO {Table.BADGES} (badge, userid) VALUES ($1, $2) ON CONFLICT DO NOTHING"
+            await self.executemany(query, *[(badge, user_id) for user_id in user_ids])
             for user_id in user_ids:
-                await inst.add(user_id)
+                self.badge_index.add(badge, user_id)
 
+        self._forget_absent(Table.BADGES, badge)
         if cache:
-            self._badges[inst.id] = inst
+            self._badges[badge] = inst
         return inst
 
     async def remove_badge(self, badge: ValidBadge) -> Optional[Badge]:
-        """Remove a badge from the badges table.
+        """Take a badge away from everyone.
         Make sure to remove the badge from the ValidBadge list.
 
         Parameters
         ----------
-        badge: Union[:class:`Badge`, int, str]
-            Badge to remove.
+        badge: str
+            Name of the badge to remove.
 
         Returns
         -------
         :class:`Badge`
             Object representing the removed badge. If found in cache else ``None``.
         """
-        query = f"ALTER TABLE {Table.BADGES} DROP COLUMN {badge}"
-        await self.execute(query)
+        query = f"DELETE FROM {Table.BADGES} WHERE badge = $1"
+        await self.execute(query, badge)
+        self.badge_index.drop(badge)
+        self._forget_absent(Table.BADGES, badge)
         return self._badges.pop(badge, None)
 
     def get_badge(self, badge: ValidBadge) -> Optional[Badge]:
@@ -910,9 +1762,50 @@ class Database(Connection):
         """
         return self._badges.get(badge)
 
+    def get_user_badges(self, user_id: int) -> list[Badge]:
+        """Get the badges of a user from the badge index, without a query.
+
+        Parameters
+        ----------
+        user_id: int
+            ID of the user.
+
+        Returns
+        -------
+        list[:class:`Badge`]
+            The badges the user has, sorted by name.
+        """
+        to_return: list[Badge] = []
+        for name in sorted(self.badge_index.badges_of(user_id)):
+            inst = self._badges.get(name)
+            if inst is None:
+                inst = self._badges[name] = Badge(name, self)
+            to_return.append(inst)
+        return to_return
+
+    async def fetch_user_badges(self, user_id: int) -> list[Badge]:
+        """Fetch the badges of a user from the database and update the badge index.
+
+        Parameters
+        ----------
+        user_id: int
+            ID of the user.
+
+        Returns
+        -------
+        list[:class:`Badge`]
+            The badges the user has, sorted by name.
+        """
+        query = f"SELECT badge FROM {Table.BADGES} WHERE userid = $1"
+        rows = await self.fetch(query, user_id)
+        self.badge_index.set_user(user_id, (row["badge"] for row in rows))
+        return self.get_user_badges(user_id)
+
     async def fetch_badges(self, cache: bool = False) -> list[Badge]:
         """Fetch all badges from the database.
 
+        This reloads the badge index.
+
         Parameters
         ----------
         cache: bool
@@ -923,25 +1816,34 @@ class Database(Connection):
         list[:class:`Badge`]
             List of objects representing the badges.
         """
-        query = f"SELECT * FROM {Table.BADGES}"
-        data = await self.fetchrow(query)
-        if not data:
-            return []
-
-        to_return: dict[str, Badge] = {}
-        for name, value in data.items():
-            # don't need it.
-            if name == "userid":
-                continue
-
-            inst = Badge(name, self, data)
-            to_return[name] = inst
+        await self.badge_index.load(self)
+        names = dict.fromkeys((*get_args(ValidBadge), *self.badge_index.names))
+        to_return: dict[str, Badge] = {name: self._badges.get(name) or Badge(name, self) for name in names}
 
         if cache:
-            self._badges = to_return
+            self._badges.clear()
+            self._badges.update(to_return)
 
         return list(to_return.values())
 
+    async def load_badge_index(self) -> int:
+        """(Re)load :attr:`badge_index` and the badge cache from the database.
+
+        Returns
+        -------
+        int
+            The amount of users with a badge, ``0`` if loading failed.
+        """
+        # circular imports
+        from utils.default import log
+
+        try:
+            await self.fetch_badges(cache=True)
+        except DatabaseError as e:
+            log(f"{DATABASE_LOGGING_PREFIX} Could not load the badge index: {e}")
+            return 0
+        return len(self.badge_index)
+
     async def fetch_badge(self, badge: ValidBadge, cache: bool = False) -> Optional[Badge]:
         """Fetch a badge from the database.
 
@@ -957,12 +1859,16 @@ class Database(Connection):
         Optional[:class:`Badge`]
             Object representing the badge.
         """
-        query = f"SELECT {badge} FROM {Table.BADGES}"
-        data = await self.fetchrow(query, badge)
-        if not data:
-            return None
-
-        inst = Badge(badge, self, data)
+        query = f"SELECT userid FROM {Table.BADGES} WHERE badge = $1"
+        rows = await self.fetch(query, badge)
+        current = {row["userid"] for row in rows}
+        index = self.badge_index
+        for user_id in index.members(badge) - current:
+            index.discard(badge, user_id)
+        for user_id in current:
+            index.add(badge, user_id)
+
+        inst = Badge(badge, self)
         if cache:
             self._badges[badge] = inst
 
@@ -982,6 +1888,7 @@ class Database(Connection):
         query = f"INSERT INTO {Table.STATUS} (status) VALUES ($1) RETURNING *"
         data = await self.fetchrow(query, status)
         inst = Status(self, data)
+        self._forget_absent(Table.STATUS, data["id"])  # type: ignore
         if cache:
             self._statuses[data["id"]] = inst  # type: ignore
         return inst
@@ -989,6 +1896,7 @@ class Database(Connection):
     async def remove_status(self, status_id: int) -> Optional[Status]:
         query = f"DELETE FROM {Table.STATUS} WHERE id = $1"
         await self.execute(query, status_id)
+        self._forget_absent(Table.STATUS, status_id)
         return self._statuses.pop(status_id, None)
 
     def get_status(self, status_id: int) -> Optional[Status]:
@@ -1005,7 +1913,7 @@ class Database(Connection):
     @property
     def blacklisted_users(self) -> list[Blacklist]:
         """List[:class:`Blacklist`]: The cached blacklisted users."""
-        return list(self._blacklisted_users.values())
+        return list(self._blacklists.values())
 
     async def add_blacklist(
         self,
@@ -1046,6 +1954,8 @@ class Database(Connection):
 
         data = await self.fetchrow(query, *args)
         inst = Blacklist(self, data)
+        self._forget_absent(Table.BLACKLIST, user_id)
+        self._track_blacklist(inst)
         if cache:
             self._blacklists[user_id] = inst
         return inst
@@ -1060,14 +1970,16 @@ class Database(Connection):
         from Cogs.Utils import create_blacklist_date
 
         blacklistdate = create_blacklist_date(days)
-        args = (user_id, blacklistdate, True)
-        query = f"INSERT INTO {Table.BLACKLIST} (userid, blacklisted, blacklistedtill) VALUES ($1, $2, $3) RETURNING *"
+        args = (user_id, True, blacklistdate, parse_blacklistedtill(blacklistdate))
+        query = f"INSERT INTO {Table.BLACKLIST} (userid, blacklisted, blacklistedtill, expires_at) VALUES ($1, $2, $3, $4) RETURNING *"
         if reason is not None:
-            query = f"INSERT INTO {Table.BLACKLIST} (userid, blacklisted, blacklistedtill, reason) VALUES ($1, $2, $3, $4) RETURNING *"
+            query = f"INSERT INTO {Table.BLACKLIST} (userid, blacklisted, blacklistedtill, expires_at, reason) VALUES ($1, $2, $3, $4, $5) RETURNING *"
             args += (reason,)
 
         data = await self.fetchrow(query, *args)
         inst = Blacklist(self, data)
+        self._forget_absent(Table.BLACKLIST, user_id)
+        self._track_blacklist(inst)
         if cache:
             self._blacklists[user_id] = inst
         return inst
@@ -1082,19 +1994,49 @@ class Database(Connection):
         from Cogs.Utils import create_blacklist_date
 
         blacklistdate = create_blacklist_date(days)
-        args = (user_id, blacklistdate, True)
-        query = f"UPDATE {Table.BLACKLIST} SET blacklisted = $3, blacklistedtill = $2"
+        args = (user_id, blacklistdate, True, parse_blacklistedtill(blacklistdate))
+        query = f"UPDATE {Table.BLACKLIST} SET blacklisted = $3, blacklistedtill = $2, expires_at = $4"
         if reason is not None:
-            query = f"UPDATE {Table.BLACKLIST} SET blacklisted = $3, blacklistedtill = $2, reason = $4"
+            query = f"UPDATE {Table.BLACKLIST} SET blacklisted = $3, blacklistedtill = $2, expires_at = $4, reason = $5"
             args += (reason,)
 
         query += " WHERE userid = $1 RETURNING *"
-        data = await self.fetchrow(query, Table.BLACKLIST, *args)
+        data = await self.fetchrow(query, *args)
+        if data is None:
+            return None
+
         inst = Blacklist(self, data)
-        if cache:
-            self._blacklists[user_id] = inst
+        # an already cached entry is stale now, replace it even if caching wasn't asked for.
+        if cache or user_id in self._blacklists:
+            self._add_to_cache(Table.BLACKLIST, inst)
+        else:
+            self._forget_absent(Table.BLACKLIST, user_id)
+            self._track_blacklist(inst)
         return inst
 
+    async def temp_blacklist(self, user_id: int, days: int, reason: Optional[str] = None) -> Blacklist:
+        """Blacklist a user for ``days`` days, adding their row if they have none.
+
+        The blacklist is lifted by :attr:`blacklist_expiry` when it runs out.
+
+        Parameters
+        ----------
+        user_id: int
+            ID of the user to blacklist.
+        days: int
+            For how many days.
+        reason: Optional[str]
+            Reason for blacklisting the user. Defaults to ``None``, keeping the current one.
+
+        Returns
+        -------
+        :class:`Blacklist`
+            Object representing the blacklisted user.
+        """
+        return await self.update_temp_blacklist(user_id, days, reason) or await self.add_temp_blacklist(
+            user_id, days, reason
+        )
+
     async def remove_blacklist(self, user_id: int) -> Optional[Blacklist]:
         """Remove a user from the blacklist table.
 
@@ -1110,8 +2052,41 @@ class Database(Connection):
         """
         query = f"DELETE FROM {Table.BLACKLIST} WHERE userid = $1"
         await self.execute(query, user_id)
+        self._forget_absent(Table.BLACKLIST, user_id)
+        self._untrack_blacklist(user_id)
         return self._blacklists.pop(user_id, None)
 
+    def is_blacklisted(self, user_id: int) -> bool:
+        """Whether a user is blacklisted, answered from :attr:`blacklist_index` without a query.
+
+        ``False`` for everyone until the index is loaded, checks that must not
+        let a blacklisted user through look the user up while
+        ``blacklist_index.loaded`` is ``False``.
+
+        Parameters
+        ----------
+        user_id: int
+            ID of the user to check.
+        """
+        return user_id in self.blacklist_index
+
+    async def load_blacklist_index(self) -> int:
+        """(Re)load :attr:`blacklist_index` from the database.
+
+        Returns
+        -------
+        int
+            The amount of blacklisted users, ``0`` if loading failed.
+        """
+        # circular imports
+        from utils.default import log
+
+        try:
+            return await self.blacklist_index.load(self)
+        except DatabaseError as e:
+            log(f"{DATABASE_LOGGING_PREFIX} Could not load the blacklist index: {e}")
+            return 0
+
     def get_blacklist(self, user_id: int) -> Optional[Blacklist]:
         """Get a user from the blacklist table.
 
@@ -1206,6 +2181,7 @@ class Database(Connection):
             query = "INSERT INTO commands (guild, disabled) VALUES ($1, $2) ON CONFLICT (guild) DO UPDATE SET disabled = $2 RETURNING *"
             data = await self.fetchrow(query, guild_id, [command_name])
             entry = Command(self, data)
+            self._forget_absent(Table.COMMANDS, guild_id)
             if cache:
                 self._commands[guild_id] = entry
             return entry
@@ -1220,6 +2196,7 @@ class Database(Connection):
             query = "INSERT INTO commands (guild, disabled) VALUES ($1, $2) ON CONFLICT (guild) DO UPDATE SET disabled = $2 RETURNING *"
             data = await self.fetchrow(query, guild_id, [])
             entry = Command(self, data)
+            self._forget_absent(Table.COMMANDS, guild_id)
             if cache:
                 self._commands[guild_id] = entry
 
@@ -1238,7 +2215,8 @@ class Database(Connection):
             to_return[command["guild"]] = Command(self, command)
 
         if cache:
-            self._commands = to_return
+            self._commands.clear()
+            self._commands.update(to_return)
 
         return list(to_return.values())
 
@@ -1279,6 +2257,7 @@ class Database(Connection):
         query = "INSERT INTO commands (guild, disabled) VALUES ($1, $2) ON CONFLICT (guild) DO UPDATE SET disabled = $2 RETURNING *"
         data = await self.fetchrow(query, guild_id, [])
         entry = Command(self, data)
+        self._forget_absent(Table.COMMANDS, guild_id)
         if cache:
             self._commands[guild_id] = entry
         return entry
@@ -1353,6 +2332,7 @@ class Database(Connection):
         query += " RETURNING *"
         data = await self.execute(query, *args)
         inst = GuildBlacklist(self, data)
+        self._forget_absent(Table.GUILDBLACKLISTS, guild_id)
         if cache:
             self._guild_blacklists[guild_id] = inst
         return inst
@@ -1375,6 +2355,7 @@ class Database(Connection):
         """
         query = f"DELETE FROM {Table.GUILDBLACKLISTS} WHERE id = $1"
         await self.execute(query, guild_id)
+        self._forget_absent(Table.GUILDBLACKLISTS, guild_id)
         return self._guild_blacklists.pop(guild_id, None)
 
     async def fetch_guild_blacklists(
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional
+
+from utils.errors import DatabaseError
+
+from ..logger import formatColor
+from .models import Blacklist, Table
+
+if TYPE_CHECKING:
+    from .database import Database
+
+__all__: tuple[str, ...] = ("BlacklistExpiry", "EXPIRES_AT_COLUMN", "parse_blacklistedtill")
+
+EXPIRY_LOGGING_PREFIX = formatColor("[Blacklist Expiry]", "green")
+
+EXPIRES_AT_COLUMN = "expires_at"
+
+EXPIRES_AT_SQL: tuple[str, ...] = (
+    f"ALTER TABLE {Table.BLACKLIST} ADD COLUMN IF NOT EXISTS {EXPIRES_AT_COLUMN} timestamptz",
+    f"CREATE INDEX IF NOT EXISTS {Table.BLACKLIST}_{EXPIRES_AT_COLUMN}_idx "
+    f"ON {Table.BLACKLIST} ({EXPIRES_AT_COLUMN}) WHERE {EXPIRES_AT_COLUMN} IS NOT NULL",
+)
+
+# formats blacklistedtill was written in, str() of a local datetime with or without the offset.
+_BLACKLISTEDTILL_FORMATS: tuple[str, ...] = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S.%f+00")
+
+# woken at least this often, so wall clock changes can't delay a lift for long.
+MAX_SLEEP: float = 3600.0
+
+
+class _Pending(NamedTuple):
+    fire_at: datetime  # when to try, later than expires_at after a failed lift
+    expires_at: datetime
+    # the row is only lifted if it still has both, a blacklist set since is left alone.
+    blacklistedtill: Optional[str]
+
+
+def parse_blacklistedtill(value: Any) -> Optional[datetime]:
+    """Parse the legacy text ``blacklistedtill`` column into an aware datetime, ``None`` if it can't be."""
+    if value is None or isinstance(value, datetime):
+        return value.astimezone(timezone.utc) if value is not None else None
+
+    text = str(value).strip()
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        for fmt in _BLACKLISTEDTILL_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+            if fmt.endswith("+00"):
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            break
+        else:
+            return None
+
+    # naive values came from datetime.now(), local time.
+    return parsed.astimezone(timezone.utc)
+
+
+class BlacklistExpiry:
+    """Lifts temporary blacklists exactly when they run out.
+
+    The pending expiries are kept in a min-heap of ``(fire_at, user_id)``.
+    One task sleeps until the earliest one, lifts it and sleeps again, it's
+    woken early whenever an earlier expiry is scheduled. Entries of users
+    whose expiry changed or was cancelled stay in the heap and are skipped
+    when they come up.
+
+    A lift only changes the row if it still has the ``expires_at`` and
+    ``blacklistedtill`` the expiry was scheduled from.
+
+    The expiries live in the indexed ``expires_at`` column of the blacklist
+    table, only the rows that have one are read on startup.
+    """
+
+    __slots__: tuple[str, ...] = ("database", "_heap", "_expiries", "_wakeup", "_task", "lifted")
+
+    def __init__(self, database: Database, /) -> None:
+        self.database: Database = database
+        self._heap: list[tuple[datetime, int]] = []
+        # user_id -> current expiry, what the heap entries are checked against.
+        self._expiries: dict[int, _Pending] = {}
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+        self.lifted: int = 0
+
+    def __repr__(self) -> str:
+        upcoming = self.next_expiry
+        return (
+            f"<{self.__class__.__name__} pending={len(self._expiries)} "
+            f"next={upcoming.isoformat() if upcoming else None} lifted={self.lifted}>"
+        )
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+    @property
+    def next_expiry(self) -> Optional[datetime]:
+        """Optional[:class:`datetime.datetime`]: When the next temporary blacklist runs out."""
+        while self._heap and self._is_stale(*self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _is_stale(self, fire_at: datetime, user_id: int) -> bool:
+        pending = self._expiries.get(user_id)
+        return pending is None or pending.fire_at != fire_at
+
+    def schedule(
+        self,
+        user_id: int,
+        expires_at: datetime,
+        blacklistedtill: Optional[str] = None,
+        *,
+        fire_at: Optional[datetime] = None,
+    ) -> None:
+        """Lift the blacklist of a user at ``expires_at``, replacing any earlier schedule for them.
+
+        Parameters
+        ----------
+        user_id: int
+            ID of the user.
+        expires_at: datetime.datetime
+            The row's ``expires_at``.
+        blacklistedtill: Optional[str]
+            The row's ``blacklistedtill``, the lift only happens if it's unchanged.
+        fire_at: Optional[datetime.datetime]
+            When to lift it, defaults to ``expires_at``.
+        """
+        expires_at = expires_at.astimezone(timezone.utc)
+        pending = _Pending((fire_at or expires_at).astimezone(timezone.utc), expires_at, blacklistedtill)
+        if self._expiries.get(user_id) == pending:
+            return
+
+        upcoming = self.next_expiry
+        self._expiries[user_id] = pending
+        heapq.heappush(self._heap, (pending.fire_at, user_id))
+        if upcoming is None or pending.fire_at < upcoming:
+            self._wakeup.set()
+
+    def cancel(self, user_id: int) -> None:
+        """Forget the expiry of a user, their heap entry is skipped later."""
+        self._expiries.pop(user_id, None)
+
+    def track(self, record: Any) -> None:
+        """Schedule or cancel from a blacklist row, a :class:`Blacklist` or a raw record."""
+        user_id = int(record["userid"])
+        try:
+            expires_at = record[EXPIRES_AT_COLUMN]
+        except KeyError:
+            # selected without the column, the schedule can't tell anything from it.
+            return
+        if record["blacklisted"] and expires_at not in (None, NotImplemented):
+            blacklistedtill = record["blacklistedtill"]
+            self.schedule(user_id, expires_at, None if blacklistedtill is NotImplemented else blacklistedtill)
+        else:
+            self.cancel(user_id)
+
+    async def install(self) -> int:
+        """Add the ``expires_at`` column and its index, and fill it from ``blacklistedtill`` where it's missing.
+
+        Returns
+        -------
+        int
+            The amount of rows that got an ``expires_at``.
+        """
+        database = self.database
+        async with database.transaction():
+            for statement in EXPIRES_AT_SQL:
+                await database.execute(statement)
+
+            rows = await database.fetch(
+                f"SELECT userid, blacklistedtill FROM {Table.BLACKLIST} "
+                f"WHERE blacklisted AND blacklistedtill IS NOT NULL AND {EXPIRES_AT_COLUMN} IS NULL"
+            )
+            parsed = [(row["userid"], parse_blacklistedtill(row["blacklistedtill"])) for row in rows]
+            parsed = [(user_id, expires_at) for user_id, expires_at in parsed if expires_at is not None]
+            if parsed:
+                await database.executemany(
+                    f"UPDATE {Table.BLACKLIST} SET {EXPIRES_AT_COLUMN} = $2 WHERE userid = $1", *parsed
+                )
+
+        return len(parsed)
+
+    async def load(self) -> int:
+        """Replace the schedule with the temporary blacklists in the database.
+
+        Returns
+        -------
+        int
+            The amount of pending expiries.
+        """
+        rows = await self.database.fetch(
+            f"SELECT userid, blacklistedtill, {EXPIRES_AT_COLUMN} FROM {Table.BLACKLIST} "
+            f"WHERE {EXPIRES_AT_COLUMN} IS NOT NULL AND blacklisted"
+        )
+        self._expiries = {}
+        for row in rows:
+            expires_at = row[EXPIRES_AT_COLUMN].astimezone(timezone.utc)
+            self._expiries[row["userid"]] = _Pending(expires_at, expires_at, row["blacklistedtill"])
+        self._heap = [(pending.fire_at, user_id) for user_id, pending in self._expiries.items()]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+        return len(self._expiries)
+
+    async def lift(
+        self, user_id: int, expires_at: datetime, blacklistedtill: Optional[str] = None
+    ) -> Optional[Blacklist]:
+        """Lift the blacklist of a user if it ran out.
+
+        The row is only changed if it still has the ``expires_at`` and
+        ``blacklistedtill`` the lift is for and that time passed, so a
+        blacklist that was extended or made permanent in the meantime stays.
+
+        Parameters
+        ----------
+        user_id: int
+            ID of the user.
+        expires_at: datetime.datetime
+            The ``expires_at`` the row must have.
+        blacklistedtill: Optional[str]
+            The ``blacklistedtill`` the row must have.
+
+        Returns
+        -------
+        Optional[:class:`Blacklist`]
+            The updated row, ``None`` if nothing was lifted.
+        """
+        database = self.database
+        data = await database.fetchrow(
+            f"UPDATE {Table.BLACKLIST} SET blacklisted = false, blacklistedtill = NULL, {EXPIRES_AT_COLUMN} = NULL "
+            f"WHERE userid = $1 AND blacklisted AND {EXPIRES_AT_COLUMN} = $2 AND {EXPIRES_AT_COLUMN} <= $3 "
+            f"AND blacklistedtill IS NOT DISTINCT FROM $4 RETURNING *",
+            user_id,
+            expires_at,
+            datetime.now(timezone.utc),
+            blacklistedtill,
+        )
+        if data is None:
+            return None
+
+        inst = Blacklist(database, data)
+        if user_id in database._blacklists:
+            database._add_to_cache(Table.BLACKLIST, inst)
+        else:
+            database._track_blacklist(inst)
+        self.lifted += 1
+        return inst
+
+    async def _run(self) -> None:
+        # circular imports
+        from utils.default import log
+
+        while True:
+            self._wakeup.clear()
+            upcoming = self.next_expiry
+            delay = MAX_SLEEP if upcoming is None else (upcoming - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), min(delay, MAX_SLEEP))
+                continue
+
+            _, user_id = heapq.heappop(self._heap)
+            pending = self._expiries.pop(user_id)
+            try:
+                lifted = await self.lift(user_id, pending.expires_at, pending.blacklistedtill)
+            except DatabaseError as e:
+                # try again in a minute instead of losing the expiry.
+                log(f"{EXPIRY_LOGGING_PREFIX} Failed to lift the blacklist of {user_id}: {e}")
+                if user_id not in self._expiries:
+                    self.schedule(
+                        user_id,
+                        pending.expires_at,
+                        pending.blacklistedtill,
+                        fire_at=datetime.now(timezone.utc) + timedelta(minutes=1),
+                    )
+                continue
+
+            if lifted is not None:
+                log(
+                    f"{EXPIRY_LOGGING_PREFIX} Lifted the temporary blacklist of {user_id} "
+                    f"(ran out {pending.expires_at})."
+                )
+
+    def start(self) -> None:
+        """Start the sleeper task. Does nothing if it's already running."""
+        if self._task is not None and not self._task.done():
+            return
+
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the sleeper task."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
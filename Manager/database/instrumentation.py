@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import re
+import sys
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Iterator, Optional, Union
+
+from ..logger import formatColor
+
+__all__: tuple[str, ...] = ("QueryStats", "ShapeStats", "LatencyHistogram", "attribute_to")
+
+SLOW_QUERY_LOGGING_PREFIX = formatColor("[Slow Query]", "yellow")
+
+# $1 style placeholders are kept.
+_NUMBER_RE = re.compile(r"(?<![$\w])\d+\b")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SPACE_RE = re.compile(r"\s+")
+
+# frames from these modules are skipped when looking for who ran a query.
+_INTERNAL_MODULES: tuple[str, ...] = ("Manager.database", "asyncio", "contextlib", "asyncpg")
+
+# set for calls that run in a task of their own on someone else's behalf, like shared single-flight calls.
+# their own frames lead back to the task, not to whoever wanted the query.
+_attributed_caller: ContextVar[Optional[str]] = ContextVar("agb_attributed_caller", default=None)
+
+
+@contextlib.contextmanager
+def attribute_to(caller: str) -> Iterator[None]:
+    """Attribute the queries of tasks created inside the block to ``caller``."""
+    token = _attributed_caller.set(caller)
+    try:
+        yield
+    finally:
+        _attributed_caller.reset(token)
+
+
+@lru_cache(maxsize=2048)
+def query_shape(query: str) -> str:
+    """Collapse whitespace and replace inlined literals, so queries built with f-strings share a shape."""
+    shape = _STRING_RE.sub("?", query)
+    shape = _NUMBER_RE.sub("?", shape)
+    return _SPACE_RE.sub(" ", shape).strip()
+
+
+def _percentile(ordered: list[float], percent: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LatencyHistogram:
+    """Count, total and percentiles over the most recent ``window`` samples, in seconds."""
+
+    __slots__: tuple[str, ...] = ("samples", "count", "total", "max")
+
+    def __init__(self, window: int = 1024) -> None:
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentiles(self, *percents: float) -> tuple[float, ...]:
+        """The requested percentiles of the recent samples, e.g. ``percentiles(50, 95, 99)``."""
+        ordered = sorted(self.samples)
+        return tuple(_percentile(ordered, percent) for percent in percents)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class ShapeStats(LatencyHistogram):
+    """:class:`LatencyHistogram` for one query shape, with errors, slow queries and callers.
+
+    ``callers`` is sampled, see :class:`QueryStats`.
+    """
+
+    __slots__: tuple[str, ...] = ("shape", "errors", "slow", "callers")
+
+    def __init__(self, shape: str, window: int = 1024) -> None:
+        super().__init__(window)
+        self.shape: str = shape
+        self.errors: int = 0
+        self.slow: int = 0
+        self.callers: Counter[str] = Counter()
+
+    def __repr__(self) -> str:
+        p50, p95, p99 = self.percentiles(50, 95, 99)
+        return (
+            f"<{self.__class__.__name__} count={self.count} p50={p50 * 1000:.1f}ms "
+            f"p95={p95 * 1000:.1f}ms p99={p99 * 1000:.1f}ms shape={self.shape!r}>"
+        )
+
+
+class QueryStats:
+    """Timing, counts and callers per query shape, plus pool acquire wait times.
+
+    Parameters
+    ----------
+    slow_query_threshold: Optional[float]
+        Queries taking longer than this many seconds are logged with their arguments.
+        ``None`` disables the slow query log.
+    window: int
+        How many recent samples the percentiles are computed over. Defaults to ``1024``.
+    caller_sample: int
+        Finding the caller walks the stack, so it's only done for every slow
+        query and every ``caller_sample``\th query of a shape. Defaults to ``64``.
+    """
+
+    __slots__: tuple[str, ...] = ("slow_query_threshold", "window", "caller_sample", "shapes", "acquire")
+
+    def __init__(
+        self, *, slow_query_threshold: Optional[float] = 0.5, window: int = 1024, caller_sample: int = 64
+    ) -> None:
+        self.slow_query_threshold: Optional[float] = slow_query_threshold
+        self.window: int = window
+        self.caller_sample: int = caller_sample
+        self.shapes: dict[str, ShapeStats] = {}
+        self.acquire: LatencyHistogram = LatencyHistogram(window)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} shapes={len(self.shapes)} queries={self.total_queries}>"
+
+    @property
+    def total_queries(self) -> int:
+        """int: The amount of queries recorded."""
+        return sum(stats.count for stats in self.shapes.values())
+
+    @staticmethod
+    def caller() -> str:
+        """The module that ran the current query, the first frame outside the database package."""
+        attributed = _attributed_caller.get()
+        if attributed is not None:
+            return attributed
+
+        frame = sys._getframe(1)
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "")
+            if not module.startswith(_INTERNAL_MODULES):
+                return f"{module}.{frame.f_code.co_name}"
+            frame = frame.f_back
+        return "unknown"
+
+    @staticmethod
+    def holder() -> Union[str, asyncio.Task[Any], None]:
+        """Who is running right now, without walking the stack. See :meth:`describe_holder`."""
+        return _attributed_caller.get() or asyncio.current_task()
+
+    @staticmethod
+    def describe_holder(holder: Union[str, asyncio.Task[Any], None]) -> str:
+        """What :meth:`caller` would have returned for a :meth:`holder`, found from where its task is suspended."""
+        if holder is None:
+            return "unknown"
+        if isinstance(holder, str):
+            return holder
+
+        found = None
+        awaited: Any = holder.get_coro()
+        while awaited is not None:
+            frame = getattr(awaited, "cr_frame", None) or getattr(awaited, "gi_frame", None)
+            if frame is not None:
+                module = frame.f_globals.get("__name__", "")
+                if not module.startswith(_INTERNAL_MODULES):
+                    # innermost wins, the walk goes from the task's coroutine down to what it awaits.
+                    found = f"{module}.{frame.f_code.co_name}"
+            awaited = getattr(awaited, "cr_await", None) or getattr(awaited, "gi_yieldfrom", None)
+        return found or f"task {holder.get_name()}"
+
+    def record(
+        self, query: str, args: tuple[Any, ...], seconds: float, *, caller: Optional[str] = None, failed: bool = False
+    ) -> None:
+        """Record one finished query.
+
+        Called from the task that ran it, the caller is looked up from there when it's needed.
+        """
+        shape = query_shape(query)
+        stats = self.shapes.get(shape)
+        if stats is None:
+            stats = self.shapes[shape] = ShapeStats(shape, self.window)
+
+        threshold = self.slow_query_threshold
+        slow = threshold is not None and seconds >= threshold
+        if caller is None and (slow or stats.count % self.caller_sample == 0):
+            caller = self.caller()
+        if caller is not None:
+            stats.callers[caller] += 1
+
+        stats.add(seconds)
+        if failed:
+            stats.errors += 1
+
+        if slow:
+            stats.slow += 1
+            # circular imports
+            from utils.default import log
+
+            shown_args = ", ".join(repr(arg)[:100] for arg in args[:10])
+            log(f"{SLOW_QUERY_LOGGING_PREFIX} {seconds * 1000:.0f}ms from {caller}: {shape} | args: ({shown_args})")
+
+    def record_acquire(self, seconds: float) -> None:
+        """Record how long getting a connection from the pool took."""
+        self.acquire.add(seconds)
+
+    def top(self, amount: int = 10, *, by: str = "total") -> list[ShapeStats]:
+        """The shapes with the highest ``total`` time, ``count``, ``max`` or ``errors``."""
+        return sorted(self.shapes.values(), key=lambda stats: getattr(stats, by), reverse=True)[:amount]
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        self.shapes.clear()
+        self.acquire = LatencyHistogram(self.window)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+from typing import TYPE_CHECKING, Any, Optional
+
+import asyncpg
+
+from ..logger import formatColor
+from .models import Table, table_info
+
+if TYPE_CHECKING:
+    from asyncpg import Connection as AsyncConnection
+
+    from .database import Database
+
+__all__: tuple[str, ...] = ("CacheInvalidator", "INVALIDATION_CHANNEL")
+
+INVALIDATION_LOGGING_PREFIX = formatColor("[Invalidation]", "green")
+INVALIDATION_CHANNEL = "agb_cache_invalidation"
+
+# keys per notification, a payload has to stay below 8000 bytes.
+KEYS_PER_NOTIFICATION = 200
+
+# sends {"table", "op", "keys", "origin"} once per statement, with the keys of every row it changed.
+# origin is the application_name of the session that made the change, so a process can skip its own writes.
+# statement level, a batched write like the usedcmds flush would otherwise notify once per row.
+NOTIFY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION agb_notify_change() RETURNS trigger AS $$
+DECLARE
+    keys text[];
+BEGIN
+    FOR keys IN
+        SELECT array_agg(key) FROM (
+            SELECT key, (row_number() OVER () - 1) / {KEYS_PER_NOTIFICATION} AS chunk
+            FROM (SELECT to_jsonb(changed) ->> TG_ARGV[0] AS key FROM changed) AS changed_keys
+        ) AS numbered
+        GROUP BY chunk
+    LOOP
+        PERFORM pg_notify(
+            '{INVALIDATION_CHANNEL}',
+            json_build_object(
+                'table', TG_TABLE_NAME,
+                'op', TG_OP,
+                'keys', keys,
+                'origin', current_setting('application_name', true)
+            )::text
+        );
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# badges are cached per badge, not per row. their key is the user whose badges changed.
+_TRIGGER_KEYS: dict[Table, str] = {
+    table: ("userid" if table is Table.BADGES else info.key_column) for table, info in table_info.items()
+}
+
+# a trigger with transition tables handles a single event. deletes expose the old rows, the others the new ones.
+_TRIGGER_EVENTS: tuple[tuple[str, str], ...] = (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+
+
+def _trigger_sql(table: Table) -> tuple[str, ...]:
+    statements = [
+        # the row level trigger older versions installed.
+        f"DROP TRIGGER IF EXISTS agb_{table}_notify_change ON {table}",
+    ]
+    for event, transition in _TRIGGER_EVENTS:
+        name = f"agb_{table}_notify_{event.lower()}"
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {name} AFTER {event} ON {table} REFERENCING {transition} TABLE AS changed "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION agb_notify_change('{_TRIGGER_KEYS[table]}')"
+        )
+    return tuple(statements)
+
+
+class CacheInvalidator:
+    """Keeps the :class:`Database` caches in sync with changes made by other processes.
+
+    Holds one dedicated connection (outside the pool) that ``LISTEN``\\s on
+    :data:`INVALIDATION_CHANNEL`. The triggers installed by :meth:`install`
+    notify the primary keys of the rows every statement inserted, updated or
+    deleted, up to :data:`KEYS_PER_NOTIFICATION` per notification.
+    Changes made by this process are skipped.
+    """
+
+    __slots__: tuple[str, ...] = ("database", "_connection", "_tasks", "_closed", "_reconnect_task", "received")
+
+    def __init__(self, database: Database, /) -> None:
+        self.database: Database = database
+        self._connection: Optional[AsyncConnection] = None
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._closed: bool = True
+        self._reconnect_task: Optional[asyncio.Task[None]] = None
+        self.received: int = 0
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} listening={self.listening} received={self.received}>"
+
+    @property
+    def listening(self) -> bool:
+        """bool: Whether the listener connection is open."""
+        return self._connection is not None and not self._connection.is_closed()
+
+    async def install(self) -> None:
+        """Create or replace the notify function and a trigger on every managed table."""
+        async with self.database.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(NOTIFY_FUNCTION_SQL)
+                for table in Table:
+                    if await connection.fetchval("SELECT to_regclass($1)", str(table)) is None:
+                        continue
+                    for statement in _trigger_sql(table):
+                        await connection.execute(statement)
+
+    async def start(self) -> None:
+        """Open the listener connection. Does nothing if it's already open."""
+        # circular imports
+        from utils.default import log
+
+        self._closed = False
+        if self.listening:
+            return
+
+        connection: AsyncConnection = await asyncpg.connect(**self.database._connect_kwargs())
+        await connection.add_listener(INVALIDATION_CHANNEL, self._on_notification)
+        connection.add_termination_listener(self._on_termination)
+        self._connection = connection
+        log(f"{INVALIDATION_LOGGING_PREFIX} Listening for cache invalidations.")
+
+    async def close(self) -> None:
+        """Close the listener connection and stop handling notifications."""
+        self._closed = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+        if self._connection is not None:
+            with contextlib.suppress(Exception):
+                await self._connection.close()
+            self._connection = None
+
+        for task in tuple(self._tasks):
+            task.cancel()
+
+    def _on_termination(self, connection: AsyncConnection) -> None:
+        self._connection = None
+        if self._closed or self._reconnect_task is not None:
+            return
+
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        # circular imports
+        from utils.default import log
+
+        delay = 1.0
+        try:
+            while not self._closed and not self.listening:
+                try:
+                    await self.start()
+                except (OSError, asyncpg.PostgresError) as e:
+                    log(f"{INVALIDATION_LOGGING_PREFIX} Reconnect failed: {e}, retrying in {delay:.0f}s.")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 60.0)
+        finally:
+            self._reconnect_task = None
+
+    def _on_notification(self, connection: AsyncConnection, pid: int, channel: str, payload: str) -> None:
+        try:
+            data: dict[str, Any] = json.loads(payload)
+            table = Table(data["table"])
+            keys: list[Optional[str]] = list(data["keys"])
+        except (ValueError, KeyError, TypeError):
+            return
+
+        if data.get("origin") == self.database.instance_id:
+            return
+
+        self.received += 1
+        task = asyncio.create_task(self.database._apply_invalidation(table, data.get("op", ""), keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
@@ -1,7 +1,20 @@
 from __future__ import annotations
 
+from datetime import datetime
 from enum import Enum
-from typing import TYPE_CHECKING, Any, Dict, Generic, List, Optional, Type, TypeVar, Union, get_type_hints
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generic,
+    List,
+    NamedTuple,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+    get_type_hints,
+)
 
 from asyncpg import Record
 
@@ -15,6 +28,7 @@ from ._kwarg_types import Reminders as RemindersDataKwargs
 from ._kwarg_types import Status as StatusDataKwargs
 from ._kwarg_types import UserEco as UserEcoDataKwargs
 from ._kwarg_types import Users as UsersDataKwargs
+from .queries import compile_update
 from .types import AutoMod as AutoModData
 from .types import AutoRoles as AutoRolesData
 from .types import Badges as BadgesData
@@ -28,8 +42,6 @@ from .types import UserEco as UserEcoData
 from .types import Users as UsersData
 
 if TYPE_CHECKING:
-    from datetime import datetime
-
     from typing_extensions import Self, Unpack
 
     from .database import Connection, Database
@@ -63,6 +75,10 @@ __all__: tuple[str, ...] = (
     "Blacklist",
     "Command",
     "GuildBlacklist",
+    "TableInfo",
+    "ColumnValidator",
+    "table_info",
+    "resolve_table",
 )
 ReturnC = TypeVar("ReturnC", bound="AGBRecord")
 
@@ -91,18 +107,63 @@ class AGBRecordClass(Record):
         return self[name]
 
 
-class AGBRecord(Generic[ReturnC]):
+def _alias_property(column: str) -> property:
+    def fget(self: AGBRecord) -> Any:
+        return getattr(self, column)
+
+    def fset(self: AGBRecord, value: Any) -> None:
+        setattr(self, column, value)
+
+    return property(fget, fset, doc=f"Alias for ``{column}``.")
+
+
+def _inherited_columns(bases: tuple[type, ...]) -> dict[str, None]:
+    columns: dict[str, None] = {}
+    for base in bases:
+        columns.update(getattr(base, "__columns__", {}))
+    return columns
+
+
+class AGBRecordMeta(type):
+    """Generates ``__slots__`` for every column of ``data_dict`` and a property per alias.
+
+    Subclasses can declare ``__extra_slots__`` for attributes that aren't columns.
+    """
+
+    def __new__(mcs, name: str, bases: tuple[type, ...], namespace: dict[str, Any], **kwargs: Any) -> AGBRecordMeta:
+        inherited: set[str] = set()
+        for base in bases:
+            inherited.update(getattr(base, "__all_slots__", ()))
+
+        data_dict = namespace.get("data_dict")
+        columns: tuple[str, ...] = tuple(data_dict.__annotations__) if data_dict is not None else ()
+        extra: tuple[str, ...] = tuple(namespace.pop("__extra_slots__", ()))
+        slots = tuple(dict.fromkeys(s for s in (*namespace.get("__slots__", ()), *columns, *extra) if s not in inherited))
+
+        namespace["__slots__"] = slots
+        # dict for ordered, O(1) membership checks.
+        namespace["__columns__"] = dict.fromkeys(columns) if data_dict is not None else _inherited_columns(bases)
+        for alias, column in namespace.get("attrs_aliases", {}).items():
+            namespace[alias] = _alias_property(column)
+
+        cls = super().__new__(mcs, name, bases, namespace, **kwargs)
+        cls.__all_slots__ = frozenset(inherited | set(slots))  # type: ignore
+        return cls
+
+
+class AGBRecord(Generic[ReturnC], metaclass=AGBRecordMeta):
+    __slots__ = ("connection", "database", "_extra")
+
     data_dict: Type[ValidType]
     table: Table
     database: Database
     connection: Connection
-    original_record: Record
     attrs_aliases: dict[str, str] = {}
 
     def __init__(
         self,
         connection_database: Union[Connection, Database],
-        record: AGBRecordClass,
+        record: Optional[AGBRecordClass],
     ) -> None:
         self.connection: Connection = (
             connection_database.connection  # type: ignore
@@ -110,93 +171,77 @@ class AGBRecord(Generic[ReturnC]):
             else connection_database
         )
         self.database: Database = connection_database  # type: ignore
-        self.original_record: Record = record
+        # columns the schema doesn't know about, None unless there are any.
+        self._extra: Optional[dict[str, Any]] = None
 
-    def __getitem__(self, key: str) -> Any:
-        original_record = object.__getattribute__(self, "original_record")
-        attrs_aliases = object.__getattribute__(self, "attrs_aliases")
-        if key in attrs_aliases:
-            key = attrs_aliases[key]
+        if record is None:
+            return
 
-        return original_record.get(key, NotImplemented)
+        self._update(record)
+
+    def _update(self, record: Union[AGBRecordClass, dict[str, Any]]) -> None:
+        columns = self.__columns__  # type: ignore
+        for key, value in record.items():
+            if key in columns:
+                setattr(self, key, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+
+    def _write_through(self) -> None:
+        # makes this object the cached one for its row, so get_* returns what was just written.
+        if hasattr(self.database, "_add_to_cache"):
+            self.database._add_to_cache(self.table, self)
+
+    @property
+    def original_record(self) -> dict[str, Any]:
+        """dict[str, Any]: The columns this record was created with, including columns unknown to the schema."""
+        data = {column: getattr(self, column) for column in self.__columns__ if hasattr(self, column)}  # type: ignore
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def __getitem__(self, key: str) -> Any:
+        key = self.attrs_aliases.get(key, key)
+        return getattr(self, key, NotImplemented)
 
     def __getattr__(self, name: str) -> Any:
-        if self[name] is NotImplemented:
-            raise AttributeError(f"{self.__class__.__name__} has no attribute {name}")
-        return self[name]
+        # only reached for unset columns or columns that aren't in the schema.
+        try:
+            extra = object.__getattribute__(self, "_extra")
+        except AttributeError:
+            extra = None
+        if extra and name in extra:
+            return extra[name]
+        raise AttributeError(f"{self.__class__.__name__} has no attribute {name}")
 
     def __repr__(self) -> str:
-        return self.original_record.__repr__()
+        attrs = " ".join(f"{key}={value!r}" for key, value in self.original_record.items())
+        return f"<{self.__class__.__name__} {attrs}>"
 
     def __int__(self) -> int:  # yes, this is kinda weird and hacky
         possible_int_keys = ("id", "user_id", "guild_id")
+        original_record = self.original_record
         return next(
-            (int(self.original_record[key]) for key in possible_int_keys if key in self.original_record),
+            (int(original_record[key]) for key in possible_int_keys if key in original_record),
             0,
         )
 
-    @staticmethod
-    def __handle_column_type(data: ValidType, **inputs: Any) -> None:
-        def _handle_type(possible_types: tuple[Any, ...], column: str, value: Any, is_list: bool = False) -> None:
-            possible_none: bool = type(None) in possible_types
-            can_none = " or None" if possible_none else ""
-            if not isinstance(value, possible_types):
-                friendly_types = " or ".join(t.__name__ for t in possible_types if t is not type(None))
-                if is_list:
-                    raise TypeError(
-                        f'Expected value of "{column}" to be a list with all items of type {friendly_types}'
-                    )
-
-                raise TypeError(
-                    f'Expected value of "{column}" to be of type {friendly_types}{can_none}, got {type(value).__name__}'
-                )
-
-        typed_dict = get_type_hints(data)
-        for column, value in inputs.items():
-            _type = typed_dict.get(column)
-            if not _type:
-                raise TypeError(f"Invalid column {column} for table {data.__class__.__name__}")
-            origin = getattr(_type, "__origin__", None)
-            if origin is Union:
-                _handle_type(_type.__args__, column, value)
-            elif origin is list:
-                if not isinstance(input, list):
-                    raise TypeError(f"{input} must be of type list")
-                for item in value:
-                    _handle_type((_type.__args__[0],), item, True)  # type: ignore
-            else:
-                _handle_type((_type,), column, value)
-
-    def __handle_query_inputs(
-        self, *, where: dict[str, Any], **kwargs
-    ) -> tuple[dict[str, Any], dict[str, Any], list[str]]:
-        self.__handle_column_type(self.data_dict, **kwargs)  # type: ignore
-
-        inputs = {}
-        index = 1
-
-        values: list[Any] = []
-        for key, value in where.items():
-            where[key] = f"${index}"
-            values.insert(index, value)
-            index += 1
-
-        for key, value in kwargs.items():
-            inputs[key] = f"${index}"
-            values.insert(index, value)
-            index += 1
-
-        return where, inputs, values
-
     async def handle_execute(self, *, where: dict[str, Any], **kwargs) -> Record:
-        _where, _inputs, _values = self.__handle_query_inputs(where=where, **kwargs)
-        where = where or _where
-        query = f"UPDATE {self.table} SET {', '.join(f'{key} = {value}' for key, value in _inputs.items())}"
-        if _where:
-            query += " WHERE " + " AND ".join(f"{key} = {value}" for key, value in _where.items())
-        query += " RETURNING *"
-        data = await self.database.fetchrow(query, *_values)
-        return self.__class__(self.database, data)
+        table_info[self.table].validate(**kwargs)
+        query = compile_update(self.table, tuple(kwargs), tuple(where))
+        data = await self.database.fetchrow(query, *where.values(), *kwargs.values())
+        inst = self.__class__(self.database, data)
+        if data is None:
+            return inst
+
+        key_column = table_info[self.table].key_column
+        if getattr(self, key_column, None) == data[key_column]:
+            # whoever holds this object sees the change too.
+            self._update(data)
+        inst._write_through()
+        return inst
 
     async def modify(self, *args, **kwargs) -> Any:
         return await self.edit(*args, **kwargs)
@@ -318,26 +363,27 @@ class AutoRole(AGBRecord):
         if self.roleids and role_id in self.roleids:
             return
 
-        if not self.roleids:
-            self.roleids = [role_id]
-        else:
-            self.roleids.append(role_id)
-        await self.database.execute(
-            f"UPDATE {self.table} SET roleids = array_append(roleids, $1) WHERE guildid = $2",
+        data = await self.database.fetchrow(
+            f"UPDATE {self.table} SET roleids = array_append(roleids, $1) WHERE guildid = $2 RETURNING *",
             role_id,
             self.guild_id,
         )
+        if data is not None:
+            self._update(data)
+            self._write_through()
 
     async def remove(self, role_id: int) -> None:
         if not self.roleids or role_id not in self.roleids:
             return
 
-        self.roleids.remove(role_id)
-        await self.database.execute(
-            f"UPDATE {self.table} SET roleids = array_remove(roleids, $1) WHERE guildid = $2",
+        data = await self.database.fetchrow(
+            f"UPDATE {self.table} SET roleids = array_remove(roleids, $1) WHERE guildid = $2 RETURNING *",
             role_id,
             self.guild_id,
         )
+        if data is not None:
+            self._update(data)
+            self._write_through()
 
     async def edit(
         self,
@@ -348,13 +394,29 @@ class AutoRole(AGBRecord):
 
 
 class Badge(AGBRecord):
+    """A badge and the users who have it.
+
+    Not a single row, the badges table holds one ``(badge, userid)`` row per
+    member. The members are read from :attr:`Database.badge_index`.
+    """
+
     data_dict = BadgesData
     table = Table.BADGES
 
-    def __init__(self, name: str, database: Database, record: Record) -> None:
+    __extra_slots__ = ("name", "user_ids")
+
+    if TYPE_CHECKING:
+        badge: str
+        userid: int
+
+    def __init__(self, name: str, database: Database, record: Optional[Record] = None) -> None:
         super().__init__(database, record)
         self.name: str = name
-        self.user_ids: list[int] = list(self.original_record[self.name] or [])
+        # the index's own set, kept current by add/remove and the database.
+        self.user_ids: set[int] = database.badge_index.members(name)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} name={self.name!r} members={len(self.user_ids)}>"
 
     def has(self, user_id: int) -> bool:
         return user_id in self.user_ids
@@ -362,20 +424,22 @@ class Badge(AGBRecord):
     async def add(self, user_id: int) -> None:
         if user_id in self.user_ids:
             return
-        self.user_ids.append(user_id)
         await self.database.execute(
-            f"UPDATE {self.table} SET {self.name} = array_append({self.name}, $1)",
+            f"INSERT INTO {self.table} (badge, userid) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+            self.name,
             user_id,
         )
+        self.database.badge_index.add(self.name, user_id)
 
     async def remove(self, user_id: int) -> None:
         if user_id not in self.user_ids:
             return
-        self.user_ids.remove(user_id)
         await self.database.execute(
-            f"UPDATE {self.table} SET {self.name} = array_remove({self.name}, $1)",
+            f"DELETE FROM {self.table} WHERE badge = $1 AND userid = $2",
+            self.name,
             user_id,
         )
+        self.database.badge_index.discard(self.name, user_id)
 
     async def edit(self, where: Optional[Dict[str, Any]] = None, **kwargs: Unpack[BadgesDataKwargs]) -> Self:
         raise NotImplementedError("Use .add/remove instead")
@@ -428,6 +492,7 @@ class Blacklist(AGBRecord):
         blacklisted: bool
         blacklistedtill: Optional[str]
         reason: str
+        expires_at: Optional[datetime]
         # aliases
         user_id: int
         blacklisted_until: Optional[str]
@@ -446,6 +511,8 @@ class Command(AGBRecord):
     table = Table.COMMANDS
     attrs_aliases = {"guild_id": "guild"}
 
+    __extra_slots__ = ("disabled_names",)
+
     if TYPE_CHECKING:
         guild: int
         # aliases
@@ -453,34 +520,58 @@ class Command(AGBRecord):
 
     def __init__(self, database: Database, record: Record) -> None:
         super().__init__(database, record)
-        disabled = self.original_record["disabled"]
-        if disabled is None:
+        if record is None:
             self.disabled: list[str] = []
-        else:
-            self.disabled: list[str] = list(self.original_record["disabled"])
+            self._index_disabled()
+
+    def _update(self, record: Union[AGBRecordClass, dict[str, Any]]) -> None:
+        super()._update(record)
+        self.disabled = list(getattr(self, "disabled", None) or [])
+        self._index_disabled()
+
+    def _index_disabled(self) -> None:
+        # rebuilt only when disabled changes, so the command check is a set lookup.
+        self.disabled_names: frozenset[str] = frozenset(self.disabled)
 
     def is_disabled(self, command_name: str) -> bool:
-        return command_name in self.disabled
+        return command_name in self.disabled_names
+
+    def disabled_parts(self, qualified_name: str) -> tuple[str, ...]:
+        """The parts of a command's qualified name that are disabled, in order.
+
+        ``("tag",)`` for ``tag create`` if the ``tag`` group is disabled,
+        empty if the command can be used. One set lookup per part.
+
+        The toggle command stores bare command names, so a disabled ``create``
+        covers every group's ``create`` subcommand. That's why each part is
+        looked up on its own instead of the qualified name and its prefixes.
+        """
+        disabled_names = self.disabled_names
+        return tuple(part for part in qualified_name.split(" ") if part in disabled_names)
 
     async def add(self, command_name: str) -> None:
-        if command_name in self.disabled:
+        if command_name in self.disabled_names:
             return
-        self.disabled.append(command_name)
-        await self.database.execute(
-            f"UPDATE {self.table} SET disabled = array_append(disabled, $1) WHERE guild = $2",
+        data = await self.database.fetchrow(
+            f"UPDATE {self.table} SET disabled = array_append(disabled, $1) WHERE guild = $2 RETURNING *",
             command_name,
             self.guild_id,
         )
+        if data is not None:
+            self._update(data)
+            self._write_through()
 
     async def remove(self, command_name: str) -> None:
-        if command_name not in self.disabled:
+        if command_name not in self.disabled_names:
             return
-        self.disabled.remove(command_name)
-        await self.database.execute(
-            f"UPDATE {self.table} SET disabled = array_remove(disabled, $1) WHERE guild = $2",
+        data = await self.database.fetchrow(
+            f"UPDATE {self.table} SET disabled = array_remove(disabled, $1) WHERE guild = $2 RETURNING *",
             command_name,
             self.guild_id,
         )
+        if data is not None:
+            self._update(data)
+            self._write_through()
 
     async def edit(
         self,
@@ -528,3 +619,113 @@ table_to_cls = {
     Table.COMMANDS: Command,
     Table.GUILDBLACKLISTS: GuildBlacklist,
 }
+
+
+# precompiled table metadata ---
+# everything below is resolved once at import so lookups and edits don't
+# have to call get_type_hints or rebuild dictionaries on every call.
+
+
+class ColumnValidator:
+    """Checks values for a single column against the type in the TypedDict."""
+
+    __slots__: tuple[str, ...] = ("column", "types", "item_types", "nullable", "friendly_types")
+
+    def __init__(self, column: str, annotation: Any) -> None:
+        self.column: str = column
+        args = annotation.__args__ if getattr(annotation, "__origin__", None) is Union else (annotation,)
+
+        types: list[type] = []
+        item_types: list[type] = []
+        for arg in args:
+            origin = getattr(arg, "__origin__", None)
+            if origin is list:
+                types.append(list)
+                item_types.extend(getattr(arg, "__args__", ()))
+            else:
+                types.append(arg)
+
+        self.types: tuple[type, ...] = tuple(types)
+        self.item_types: tuple[type, ...] = tuple(item_types)
+        self.nullable: bool = type(None) in self.types
+        self.friendly_types: str = " or ".join(t.__name__ for t in self.types if t is not type(None))
+
+    def __call__(self, value: Any) -> None:
+        if not isinstance(value, self.types):
+            can_none = " or None" if self.nullable else ""
+            raise TypeError(
+                f'Expected value of "{self.column}" to be of type {self.friendly_types}{can_none}, got {type(value).__name__}'
+            )
+
+        if self.item_types and isinstance(value, list):
+            for item in value:
+                if not isinstance(item, self.item_types):
+                    friendly = " or ".join(t.__name__ for t in self.item_types)
+                    raise TypeError(f'Expected value of "{self.column}" to be a list with all items of type {friendly}')
+
+
+class TableInfo(NamedTuple):
+    table: Table
+    cls: Type[AGBRecord]
+    key_column: str
+    key_type: type
+    columns: dict[str, ColumnValidator]
+    fetch_method: Optional[str]  # name of the Database method getch uses
+
+    def validate(self, **inputs: Any) -> None:
+        """Validate column values, raises :exc:`TypeError` for unknown columns or wrong types."""
+        columns = self.columns
+        for column, value in inputs.items():
+            validator = columns.get(column)
+            if validator is None:
+                raise TypeError(f"Invalid column {column} for table {self.table}")
+            validator(value)
+
+
+_TABLE_KEYS: dict[Table, tuple[str, Optional[str]]] = {
+    Table.USERECO: ("userid", "fetch_economy_user"),
+    Table.USERS: ("userid", "fetch_user"),
+    Table.GUILDS: ("guildid", "fetch_guild"),
+    Table.AUTOMOD: ("guildid", "fetch_automod"),
+    Table.AUTOROLES: ("guildid", "fetch_autorole"),
+    Table.BADGES: ("name", "fetch_badge"),
+    Table.REMINDERS: ("id", None),
+    Table.STATUS: ("id", "fetch_status"),
+    Table.BLACKLIST: ("userid", "fetch_blacklist"),
+    Table.COMMANDS: ("guild", "fetch_command_guild"),
+    Table.GUILDBLACKLISTS: ("id", "fetch_guild_blacklist"),
+}
+
+
+def _build_table_info(table: Table) -> TableInfo:
+    cls = table_to_cls[table]
+    hints = get_type_hints(cls.data_dict, localns={"datetime": datetime})
+    key_column, fetch_method = _TABLE_KEYS[table]
+    # badges are keyed by their column name, reminders don't declare their serial id.
+    key_type = hints.get(key_column, str if table is Table.BADGES else int)
+    return TableInfo(
+        table=table,
+        cls=cls,
+        key_column=key_column,
+        key_type=key_type,
+        columns={column: ColumnValidator(column, annotation) for column, annotation in hints.items()},
+        fetch_method=fetch_method,
+    )
+
+
+table_info: dict[Table, TableInfo] = {table: _build_table_info(table) for table in Table}
+
+_table_lookup: dict[Any, Table] = {}
+for _table in Table:
+    _table_lookup[_table] = _table
+    _table_lookup[_table.name] = _table
+    _table_lookup[_table.value] = _table
+del _table
+
+
+def resolve_table(table: Union[str, Table]) -> Optional[Table]:
+    """Resolve a :class:`Table`, its name or its value to the :class:`Table`. ``None`` if unknown."""
+    try:
+        return _table_lookup.get(table)
+    except TypeError:
+        return None
@@ -0,0 +1,452 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional, TypeVar
+
+import asyncpg
+from utils.errors import DatabaseError, PoolSaturated
+
+from ..logger import formatColor
+from .instrumentation import QueryStats
+
+if TYPE_CHECKING:
+    from asyncpg import Connection as AsyncConnection
+    from asyncpg import Pool
+
+__all__: tuple[str, ...] = ("PoolManager",)
+
+POOL_LOGGING_PREFIX = formatColor("[Pool]", "green")
+
+T = TypeVar("T")
+
+# opening a new connection failed, nothing ran yet.
+CONNECT_ERRORS: tuple[type[BaseException], ...] = (
+    OSError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+)
+# the transaction was rolled back by the server, running it again is always safe.
+ROLLED_BACK_ERRORS: tuple[type[BaseException], ...] = (
+    asyncpg.SerializationError,
+    asyncpg.DeadlockDetectedError,
+)
+# the connection went away mid query, it may or may not have run. only safe to repeat for reads.
+CONNECTION_LOST_ERRORS: tuple[type[BaseException], ...] = (
+    asyncpg.PostgresConnectionError,
+    asyncpg.AdminShutdownError,
+    ConnectionResetError,
+)
+
+
+class PoolManager:
+    """Owns the asyncpg pool and adds timeouts, retries, leak detection and load shedding on top of it.
+
+    asyncpg opens a connection for every concurrent acquire up to its
+    ``max_size``, a short burst of cheap queries opens all of them. The
+    manager hands out at most :attr:`limit` connections instead and sizes
+    it from how long acquires wait: every ``target_wait`` seconds an acquire
+    spends waiting for a connection raises the limit by one, up to
+    ``max_size``. Every ``resize_interval`` seconds it's lowered by one if
+    less than half of it was in use, down to ``min_size``, and the extra
+    connections are closed once they were idle for
+    ``max_inactive_connection_lifetime`` seconds.
+
+    Parameters
+    ----------
+    min_size: int
+        Connections opened up front and kept around, the smallest :attr:`limit`. Defaults to ``2``.
+    max_size: int
+        The most connections the pool opens, the largest :attr:`limit`. Defaults to ``20``.
+    max_inactive_connection_lifetime: float
+        Seconds after which an idle connection is closed. Defaults to ``120.0``.
+    statement_cache_size: int
+        Prepared statements cached per connection. Defaults to ``1024``.
+    acquire_timeout: float
+        Seconds to wait for a connection before giving up. Defaults to ``10.0``.
+    command_timeout: Optional[float]
+        Seconds a single query may take. ``None`` means no limit. Defaults to ``60.0``.
+    retries: int
+        How often transient failures are retried. Defaults to ``3``.
+    retry_backoff: float
+        Seconds before the first retry, doubled for every further one. Defaults to ``0.2``.
+    leak_threshold: float
+        Connections held longer than this many seconds are reported as leaked. Defaults to ``60.0``.
+    target_wait: float
+        Seconds an acquire may wait before the limit is raised. Defaults to ``0.05``.
+    resize_interval: float
+        Seconds between checks whether the limit can be lowered. Defaults to ``10.0``.
+    """
+
+    __slots__: tuple[str, ...] = (
+        "min_size",
+        "max_size",
+        "max_inactive_connection_lifetime",
+        "statement_cache_size",
+        "acquire_timeout",
+        "command_timeout",
+        "retries",
+        "retry_backoff",
+        "leak_threshold",
+        "target_wait",
+        "resize_interval",
+        "limit",
+        "_pool",
+        "_held",
+        "_watchdog",
+        "_slots",
+        "_admitted",
+        "_acquires",
+        "_slow_acquires",
+        "_peak",
+        "shed",
+        "retried",
+        "timeouts",
+        "leaks",
+    )
+
+    # whether the server supports LISTEN/NOTIFY, used by the cache invalidation.
+    notifications: bool = True
+
+    def __init__(
+        self,
+        *,
+        min_size: int = 2,
+        max_size: int = 20,
+        max_inactive_connection_lifetime: float = 120.0,
+        statement_cache_size: int = 1024,
+        acquire_timeout: float = 10.0,
+        command_timeout: Optional[float] = 60.0,
+        retries: int = 3,
+        retry_backoff: float = 0.2,
+        leak_threshold: float = 60.0,
+        target_wait: float = 0.05,
+        resize_interval: float = 10.0,
+    ) -> None:
+        if not 0 <= min_size <= max_size or max_size <= 0:
+            raise ValueError("Expected 0 <= min_size <= max_size and max_size > 0")
+
+        self.min_size: int = min_size
+        self.max_size: int = max_size
+        self.max_inactive_connection_lifetime: float = max_inactive_connection_lifetime
+        self.statement_cache_size: int = statement_cache_size
+        self.acquire_timeout: float = acquire_timeout
+        self.command_timeout: Optional[float] = command_timeout
+        self.retries: int = retries
+        self.retry_backoff: float = retry_backoff
+        self.leak_threshold: float = leak_threshold
+        self.target_wait: float = target_wait
+        self.resize_interval: float = resize_interval
+        # how many connections may be held at once, see the class docs.
+        self.limit: int = max(min_size, 1)
+
+        self._pool: Optional[Pool] = None
+        # id(connection) -> (connection, acquired at, holder, reported), see QueryStats.holder
+        self._held: dict[int, tuple[AsyncConnection, float, Any, bool]] = {}
+        self._watchdog: Optional[asyncio.Task[None]] = None
+        # acquires wait here until they're within the limit.
+        self._slots: asyncio.Condition = asyncio.Condition()
+        self._admitted: int = 0
+        # since the last _shrink.
+        self._acquires: int = 0
+        self._slow_acquires: int = 0
+        self._peak: int = 0
+
+        self.shed: int = 0
+        self.retried: int = 0
+        self.timeouts: int = 0
+        self.leaks: int = 0
+
+    @classmethod
+    def from_config(cls, config: Any = None) -> PoolManager:
+        """Create a manager from the optional ``pool`` object of ``db_config.json``.
+
+        Parameters
+        ----------
+        config: Any
+            A mapping or namedtuple with any of the constructor's keyword arguments.
+        """
+        if config is None:
+            return cls()
+        options = config._asdict() if hasattr(config, "_asdict") else dict(config)
+        return cls(**options)
+
+    def __repr__(self) -> str:
+        size = f"{self.size}/{self.max_size}" if self._pool is not None else "closed"
+        return (
+            f"<{self.__class__.__name__} size={size} limit={self.limit} idle={self.idle} held={len(self._held)} "
+            f"shed={self.shed} retried={self.retried} timeouts={self.timeouts} leaks={self.leaks}>"
+        )
+
+    @property
+    def pool(self) -> Optional[Pool]:
+        return self._pool
+
+    @property
+    def size(self) -> int:
+        """int: The amount of open connections."""
+        return self._pool.get_size() if self._pool is not None else 0
+
+    @property
+    def idle(self) -> int:
+        """int: The amount of open connections nobody holds."""
+        return self._pool.get_idle_size() if self._pool is not None else 0
+
+    @property
+    def saturated(self) -> bool:
+        """bool: Whether every connection the pool may open is in use."""
+        return self._pool is not None and self.limit >= self.max_size and self._admitted >= self.limit
+
+    async def create(self, **connect_kwargs: Any) -> Pool:
+        """Create the pool, retrying transient connection failures.
+
+        Parameters
+        ----------
+        **connect_kwargs: Any
+            Passed to :func:`asyncpg.create_pool`.
+        """
+        if self._pool is not None and not self._pool._closed:
+            return self._pool
+
+        self._pool = await self.retry(
+            lambda: asyncpg.create_pool(
+                min_size=self.min_size,
+                max_size=self.max_size,
+                max_inactive_connection_lifetime=self.max_inactive_connection_lifetime,
+                statement_cache_size=self.statement_cache_size,
+                command_timeout=self.command_timeout,
+                **connect_kwargs,
+            ),
+            CONNECT_ERRORS,
+        )
+        self.start()
+        return self._pool  # type: ignore
+
+    async def acquire(self, *, critical: bool = True) -> AsyncConnection:
+        """Get a connection from the pool. It has to be given back with :meth:`release`.
+
+        Parameters
+        ----------
+        critical: bool
+            Non critical callers fail right away with :exc:`PoolSaturated`
+            instead of queueing when the pool is saturated.
+
+        Raises
+        ------
+        PoolSaturated
+            The pool is saturated and the caller isn't critical.
+        DatabaseError
+            No connection became available within ``acquire_timeout``.
+        """
+        if self._pool is None:
+            raise DatabaseError("The pool isn't created yet")
+
+        if not critical and self.saturated:
+            self.shed += 1
+            raise PoolSaturated(self.size)
+
+        start = time.monotonic()
+        try:
+            if self._admitted < self.limit:
+                # no wait_for task when there's room already.
+                self._take_slot()
+            else:
+                await asyncio.wait_for(self._admit(), self.acquire_timeout)
+            try:
+                remaining = max(self.acquire_timeout - (time.monotonic() - start), 0.001)
+                connection = await self.retry(
+                    lambda: self._pool.acquire(timeout=remaining),  # type: ignore
+                    CONNECT_ERRORS,
+                )
+            except BaseException:
+                await self._leave()
+                raise
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            raise DatabaseError(
+                f"Timed out after {self.acquire_timeout}s waiting for a connection, "
+                f"{len(self._held)} held, oldest by {self._oldest_holder()}"
+            ) from e
+        except CONNECT_ERRORS as e:
+            raise DatabaseError(e) from e
+
+        self._acquires += 1
+        if time.monotonic() - start > self.target_wait:
+            self._slow_acquires += 1
+        self._held[id(connection)] = (connection, time.monotonic(), QueryStats.holder(), False)
+        return connection
+
+    async def release(self, connection: AsyncConnection) -> None:
+        """Give a connection from :meth:`acquire` back to the pool."""
+        held = self._held.pop(id(connection), None)
+        try:
+            if self._pool is not None:
+                with contextlib.suppress(Exception):
+                    await self._pool.release(connection)
+        finally:
+            if held is not None:
+                await self._leave()
+
+    def _take_slot(self) -> None:
+        self._admitted += 1
+        self._peak = max(self._peak, self._admitted)
+
+    async def _admit(self) -> None:
+        async with self._slots:
+            while self._admitted >= self.limit:
+                if self.limit >= self.max_size:
+                    await self._slots.wait()
+                    continue
+                try:
+                    await asyncio.wait_for(self._slots.wait(), self.target_wait)
+                except asyncio.TimeoutError:
+                    self.limit = min(self.limit + 1, self.max_size)
+            self._take_slot()
+
+    async def _leave(self) -> None:
+        self._admitted -= 1
+        async with self._slots:
+            self._slots.notify()
+
+    def _shrink(self) -> int:
+        """Lower :attr:`limit` by one if less than half of it was used since the last call.
+
+        Returns
+        -------
+        int
+            The new limit.
+        """
+        # circular imports
+        from utils.default import log
+
+        acquires, slow, peak = self._acquires, self._slow_acquires, self._peak
+        self._acquires = self._slow_acquires = 0
+        self._peak = self._admitted
+
+        if slow:
+            log(
+                f"{POOL_LOGGING_PREFIX} {slow:,} of {acquires:,} acquires waited over "
+                f"{self.target_wait * 1000:.0f}ms, the limit is {self.limit} connections."
+            )
+        elif peak < self.limit / 2:
+            self.limit = max(self.limit - 1, self.min_size, 1)
+        return self.limit
+
+    async def retry(
+        self,
+        func: Callable[[], Awaitable[T]],
+        errors: tuple[type[BaseException], ...],
+    ) -> T:
+        """Call ``func``, retrying with exponential backoff when it raises one of ``errors``.
+
+        Parameters
+        ----------
+        func: Callable[[], Awaitable[T]]
+            Called for every attempt.
+        errors: tuple[type[BaseException], ...]
+            The exceptions worth retrying.
+        """
+        # circular imports
+        from utils.default import log
+
+        delay = self.retry_backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return await func()
+            except asyncio.TimeoutError:
+                # a subclass of OSError, but waiting again won't help.
+                raise
+            except errors as e:
+                if attempt >= self.retries:
+                    raise
+                self.retried += 1
+                log(f"{POOL_LOGGING_PREFIX} {e.__class__.__name__}: {e}, retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        raise AssertionError("unreachable")
+
+    def retry_delay(self, error: BaseException, attempt: int, *, read_only: bool) -> Optional[float]:
+        """How long to wait before running a failed query again, ``None`` if it shouldn't be.
+
+        Parameters
+        ----------
+        error: BaseException
+            What the query raised.
+        attempt: int
+            How many times the query failed already, starting at ``0``.
+        read_only: bool
+            Whether the query only reads. Queries that lost their connection
+            are only repeated if they do, a write may have gone through already.
+        """
+        if attempt >= self.retries:
+            return None
+        if isinstance(error, ROLLED_BACK_ERRORS) or (read_only and isinstance(error, CONNECTION_LOST_ERRORS)):
+            self.retried += 1
+            return self.retry_backoff * 2**attempt
+        return None
+
+    def _oldest_holder(self) -> str:
+        if not self._held:
+            return "nobody"
+        _, acquired_at, holder, _ = min(self._held.values(), key=lambda entry: entry[1])
+        return f"{QueryStats.describe_holder(holder)} ({time.monotonic() - acquired_at:.0f}s)"
+
+    def check_leaks(self) -> list[str]:
+        """Report connections held longer than ``leak_threshold``, each one only once.
+
+        Returns
+        -------
+        list[str]
+            The callers that acquired the newly reported connections.
+        """
+        # circular imports
+        from utils.default import log
+
+        now = time.monotonic()
+        leaked: list[str] = []
+        for key, (connection, acquired_at, holder, reported) in tuple(self._held.items()):
+            if reported or now - acquired_at < self.leak_threshold:
+                continue
+            self._held[key] = (connection, acquired_at, holder, True)
+            caller = QueryStats.describe_holder(holder)
+            self.leaks += 1
+            leaked.append(caller)
+            log(
+                f"{POOL_LOGGING_PREFIX} Connection held for {now - acquired_at:.0f}s by {caller}, "
+                "it was probably never released."
+            )
+
+        return leaked
+
+    async def _watch(self) -> None:
+        interval = min(max(self.leak_threshold / 2, 1.0), self.resize_interval)
+        next_resize = time.monotonic() + self.resize_interval
+        while True:
+            await asyncio.sleep(interval)
+            self.check_leaks()
+            if time.monotonic() >= next_resize:
+                next_resize = time.monotonic() + self.resize_interval
+                self._shrink()
+
+    def start(self) -> None:
+        """Start the leak watchdog and the resizing. Does nothing if it's already running."""
+        if self._watchdog is not None and not self._watchdog.done():
+            return
+
+        self._watchdog = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        """Stop the watchdog and resizing and close the pool."""
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._watchdog
+            self._watchdog = None
+
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        self._held.clear()
+        self._admitted = self._peak = 0
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .models import Table
+
+__all__: tuple[str, ...] = (
+    "compile_select",
+    "compile_select_any",
+    "compile_update",
+    "compile_aggregate",
+    "compile_distinct",
+    "compile_changed_since",
+)
+
+# Every distinct shape is compiled once. Since the text for a shape never changes,
+# asyncpg's per-connection statement cache also only prepares each shape once per connection.
+
+
+def _where_clause(columns: tuple[str, ...], start: int) -> str:
+    if not columns:
+        return ""
+    return " WHERE " + " AND ".join(f"{column} = ${index}" for index, column in enumerate(columns, start=start))
+
+
+@lru_cache(maxsize=512)
+def compile_select(table: Table, where: tuple[str, ...] = ()) -> str:
+    """Compile ``SELECT * FROM table [WHERE ...]``.
+
+    Parameters
+    ----------
+    table: :class:`Table`
+        The table to select from.
+    where: tuple[str, ...]
+        Columns to match, bound to ``$1`` onwards in order.
+
+    Returns
+    -------
+    str
+        The query.
+    """
+    return f"SELECT * FROM {table}{_where_clause(where, 1)}"
+
+
+@lru_cache(maxsize=32)
+def compile_select_any(table: Table, column: str) -> str:
+    """Compile ``SELECT * FROM table WHERE column = ANY($1)``.
+
+    Parameters
+    ----------
+    table: :class:`Table`
+        The table to select from.
+    column: str
+        The column matched against the array bound to ``$1``.
+
+    Returns
+    -------
+    str
+        The query.
+    """
+    return f"SELECT * FROM {table} WHERE {column} = ANY($1)"
+
+
+@lru_cache(maxsize=512)
+def compile_update(table: Table, columns: tuple[str, ...], where: tuple[str, ...] = ()) -> str:
+    """Compile ``UPDATE table SET ... [WHERE ...] RETURNING *``.
+
+    Parameters
+    ----------
+    table: :class:`Table`
+        The table to update.
+    columns: tuple[str, ...]
+        Columns to set, bound after the ``where`` columns.
+    where: tuple[str, ...]
+        Columns to match, bound to ``$1`` onwards in order.
+
+    Returns
+    -------
+    str
+        The query.
+    """
+    offset = len(where) + 1
+    assignments = ", ".join(f"{column} = ${index}" for index, column in enumerate(columns, start=offset))
+    return f"UPDATE {table} SET {assignments}{_where_clause(where, 1)} RETURNING *"
+
+
+@lru_cache(maxsize=128)
+def compile_aggregate(table: Table, function: str, column: str, where: tuple[str, ...] = ()) -> str:
+    """Compile ``SELECT function(column) FROM table [WHERE ...]``.
+
+    Parameters
+    ----------
+    table: :class:`Table`
+        The table to aggregate.
+    function: str
+        The aggregate function, e.g. ``sum`` or ``count``.
+    column: str
+        The column or expression to aggregate.
+    where: tuple[str, ...]
+        Columns to match, bound to ``$1`` onwards in order.
+
+    Returns
+    -------
+    str
+        The query.
+    """
+    return f"SELECT {function}({column}) FROM {table}{_where_clause(where, 1)}"
+
+
+@lru_cache(maxsize=128)
+def compile_distinct(tables: tuple[Table, ...], column: str) -> str:
+    """Compile a query returning every distinct value of ``column`` over ``tables``.
+
+    Parameters
+    ----------
+    tables: tuple[:class:`Table`, ...]
+        The tables to combine.
+    column: str
+        The column, it has to exist in every table.
+
+    Returns
+    -------
+    str
+        The query.
+    """
+    return " UNION ".join(f"SELECT {column} FROM {table}" for table in tables)
+
+
+@lru_cache(maxsize=32)
+def compile_changed_since(table: Table, column: str) -> str:
+    """Compile a query returning every row of ``table`` with ``column`` after ``$1``, oldest first.
+
+    Parameters
+    ----------
+    table: :class:`Table`
+        The table to select from.
+    column: str
+        The timestamp column to compare, e.g. ``updated_at``.
+
+    Returns
+    -------
+    str
+        The query.
+    """
+    return f"SELECT * FROM {table} WHERE {column} > $1 ORDER BY {column}"
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from .instrumentation import QueryStats, attribute_to
+
+__all__: tuple[str, ...] = ("SingleFlight",)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into a single call.
+
+    The first caller for a key starts the call in its own task, everyone
+    arriving while it's still running awaits that same task instead of
+    starting another one. Cancelling one waiter doesn't cancel the call for
+    the others.
+
+    The call runs with the context of the caller that started it, calls that
+    depend on per-task state, like a pinned connection, mustn't go through here.
+    """
+
+    __slots__: tuple[str, ...] = ("_calls", "saved")
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Future[Any]] = {}
+        self.saved: int = 0
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} in_flight={len(self._calls)} saved={self.saved}>"
+
+    @property
+    def in_flight(self) -> int:
+        """int: The number of calls currently running."""
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Run ``func`` or join the call already running for ``key``.
+
+        Parameters
+        ----------
+        key: Hashable
+            Identifies calls that are interchangeable.
+        func: Callable[[], Awaitable[T]]
+            Called to start the call if none is running for ``key``.
+
+        Returns
+        -------
+        T
+            The result of the shared call. Exceptions are raised to every waiter.
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.saved += 1
+            return await asyncio.shield(future)
+
+        # the call's own frames end at its task, its queries are counted for whoever started it.
+        with attribute_to(QueryStats.caller()):
+            future = asyncio.ensure_future(func())
+        self._calls[key] = future
+
+        def _done(fut: asyncio.Future[Any]) -> None:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+
+        future.add_done_callback(_done)
+        return await asyncio.shield(future)
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Optional
+
+from utils.errors import DatabaseError
+
+from ..logger import formatColor
+from .models import Table, table_info, table_to_cls
+from .watermark import UPDATED_AT_COLUMN
+
+if TYPE_CHECKING:
+    from .database import Database
+
+__all__: tuple[str, ...] = ("CacheSnapshot", "SNAPSHOT_TABLES")
+
+SNAPSHOT_LOGGING_PREFIX = formatColor("[Snapshot]", "green")
+SNAPSHOT_VERSION = 2
+
+# marshal's format belongs to the interpreter that wrote it, so the header names it too: the
+# snapshot version, the Python major and minor version and marshal.version. it's checked before
+# anything is unmarshalled, a snapshot from another interpreter is ignored instead of misread.
+_HEADER = struct.Struct("<8sHBBB")
+_MAGIC = b"AGBSNAP\0"
+
+
+def _header() -> bytes:
+    return _HEADER.pack(_MAGIC, SNAPSHOT_VERSION, *sys.version_info[:2], marshal.version)
+
+# badges are reloaded with one query by fetch_badges, reminders aren't cached.
+SNAPSHOT_TABLES: tuple[Table, ...] = tuple(table for table in Table if table not in (Table.BADGES, Table.REMINDERS))
+
+
+# marshal only knows builtin types. datetimes are the only other type asyncpg returns for
+# these tables, they're stored as a 1-tuple of their ISO format since no column holds a tuple.
+def _encode(value: Any) -> Any:
+    return (value.isoformat(),) if isinstance(value, datetime) else value
+
+
+def _decode(value: Any) -> Any:
+    return datetime.fromisoformat(value[0]) if type(value) is tuple else value
+
+
+class CacheSnapshot:
+    """Writes the :class:`Database` caches to a local file and loads them back on startup.
+
+    The file is a small header and a single :mod:`marshal` payload, read through
+    :mod:`mmap`. Snapshots written by another Python version are ignored.
+    Loading it fills the caches in milliseconds, :meth:`reconcile` then brings
+    them up to date with Postgres using the ``updated_at`` column: rows whose
+    ``updated_at`` changed are refetched, deleted rows are dropped and rows
+    changed after the snapshot was taken are added to unbounded caches.
+
+    Parameters
+    ----------
+    database: :class:`Database`
+        The database whose caches are snapshotted.
+    path: str
+        Where the snapshot file lives.
+    interval: float
+        Seconds between periodic snapshots. Defaults to ``300.0``.
+    """
+
+    __slots__: tuple[str, ...] = ("database", "path", "interval", "_task", "last_written_at", "last_rows")
+
+    def __init__(self, database: Database, /, path: str, *, interval: float = 300.0) -> None:
+        self.database: Database = database
+        self.path: str = path
+        self.interval: float = interval
+        self._task: Optional[asyncio.Task[None]] = None
+        self.last_written_at: Optional[float] = None
+        self.last_rows: int = 0
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} path={self.path!r} rows={self.last_rows}>"
+
+    def _build_payload(self, taken_at: datetime) -> tuple[dict[str, Any], int]:
+        tables: dict[str, Any] = {}
+        rows = 0
+        for table in SNAPSHOT_TABLES:
+            cache = self.database._table_to_cache[table][1]
+            columns = tuple(table_info[table].columns)
+            entries = [
+                tuple(_encode(getattr(inst, column, None)) for column in columns) for inst in cache.values()
+            ]
+            tables[table.value] = (columns, entries)
+            rows += len(entries)
+
+        payload = {"taken_at": taken_at.isoformat(), "tables": tables}
+        return payload, rows
+
+    def _write_file(self, payload: dict[str, Any]) -> None:
+        data = _header() + marshal.dumps(payload)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # write next to the real file and swap, a crash mid write never leaves a broken snapshot.
+        temp = f"{self.path}.tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, self.path)
+
+    async def write(self) -> int:
+        """Write the current caches to :attr:`path`.
+
+        Returns
+        -------
+        int
+            The amount of rows written.
+        """
+        # circular imports
+        from utils.default import log
+
+        start = time.perf_counter()
+        # the server's clock, so the watermark compares against updated_at without any skew.
+        with self.database.primary():
+            taken_at: datetime = await self.database.fetchval("SELECT now()")
+        payload, rows = self._build_payload(taken_at)
+        await asyncio.to_thread(self._write_file, payload)
+
+        self.last_written_at = time.time()
+        self.last_rows = rows
+        log(f"{SNAPSHOT_LOGGING_PREFIX} Wrote {rows:,} rows in {(time.perf_counter() - start) * 1000:.0f}ms.")
+        return rows
+
+    def load(self) -> Optional[datetime]:
+        """Fill the caches from :attr:`path`.
+
+        Returns
+        -------
+        Optional[:class:`datetime.datetime`]
+            When the snapshot was taken, pass it to :meth:`reconcile`.
+            ``None`` if there's no usable snapshot.
+        """
+        # circular imports
+        from utils.default import log
+
+        start = time.perf_counter()
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                header = mapped[: _HEADER.size]
+                if header != _header():
+                    raise ValueError(f"written by another snapshot or Python version, header {header!r}")
+                with memoryview(mapped) as view, view[_HEADER.size :] as data:
+                    payload = marshal.loads(data)
+            taken_at = datetime.fromisoformat(payload["taken_at"])
+            tables: dict[str, Any] = payload["tables"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, TypeError, KeyError, AttributeError) as e:
+            log(f"{SNAPSHOT_LOGGING_PREFIX} Ignoring unreadable snapshot {self.path}: {e}")
+            return None
+
+        rows = 0
+        for name, (columns, entries) in tables.items():
+            try:
+                table = Table(name)
+            except ValueError:
+                continue
+
+            cls = table_to_cls[table]
+            for entry in entries:
+                record = {column: _decode(value) for column, value in zip(columns, entry)}
+                self.database._add_to_cache(table, cls(self.database, record))
+            rows += len(entries)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        age = (datetime.now(taken_at.tzinfo) - taken_at).total_seconds()
+        log(f"{SNAPSHOT_LOGGING_PREFIX} Loaded {rows:,} rows in {elapsed:.0f}ms, snapshot is {age:,.0f}s old.")
+        return taken_at
+
+    async def reconcile(self, taken_at: datetime) -> None:
+        """Bring the caches loaded by :meth:`load` up to date with Postgres.
+
+        Parameters
+        ----------
+        taken_at: :class:`datetime.datetime`
+            When the snapshot was taken, as returned by :meth:`load`.
+        """
+        # circular imports
+        from utils.default import log
+
+        start = time.perf_counter()
+        changed = deleted = added = 0
+        for table in SNAPSHOT_TABLES:
+            try:
+                with self.database.primary():
+                    counts = await self._reconcile_table(table, taken_at)
+            except DatabaseError as e:
+                # nothing to compare against, don't keep rows that can't be trusted.
+                self.database._table_to_cache[table][1].clear()
+                log(f"{SNAPSHOT_LOGGING_PREFIX} Dropped {table} from the snapshot, can't reconcile it: {e}")
+                continue
+
+            changed += counts[0]
+            deleted += counts[1]
+            added += counts[2]
+
+        await self.database.fetch_badges(cache=True)
+        log(
+            f"{SNAPSHOT_LOGGING_PREFIX} Reconciled in {time.perf_counter() - start:.2f}s: "
+            f"{changed:,} changed, {deleted:,} deleted, {added:,} added since the snapshot."
+        )
+
+    async def _reconcile_table(self, table: Table, taken_at: datetime) -> tuple[int, int, int]:
+        database = self.database
+        info = table_info[table]
+        key = info.key_column
+        cls = table_to_cls[table]
+        cache = database._table_to_cache[table][1]
+
+        entries = cache.items()
+        keys = [cache_key for cache_key, _ in entries]
+        stamps = [getattr(inst, UPDATED_AT_COLUMN, None) for _, inst in entries]
+
+        changed_rows = await database.fetch(
+            f"SELECT {table}.* FROM {table} "
+            f"JOIN unnest($1::bigint[], $2::timestamptz[]) AS snapshot(key, updated_at) "
+            f"ON {table}.{key} = snapshot.key "
+            f"WHERE {table}.{UPDATED_AT_COLUMN} IS DISTINCT FROM snapshot.updated_at",
+            keys,
+            stamps,
+        )
+        for row in changed_rows:
+            database._add_to_cache(table, cls(database, row))
+
+        deleted_keys = await database.fetch(
+            f"SELECT snapshot.key FROM unnest($1::bigint[]) AS snapshot(key) "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {table}.{key} = snapshot.key)",
+            keys,
+        )
+        for row in deleted_keys:
+            cache.pop(row["key"], None)
+
+        added = 0
+        # bounded caches are filled on demand, only caches that hold the whole table need new rows.
+        if cache.maxsize is None:
+            new_rows = await database.fetch(
+                f"SELECT * FROM {table} WHERE {UPDATED_AT_COLUMN} > $1",
+                taken_at,
+            )
+            for row in new_rows:
+                if row[key] not in cache:
+                    added += 1
+                database._add_to_cache(table, cls(database, row))
+
+        return len(changed_rows), len(deleted_keys), added
+
+    async def _run(self, reconcile_from: Optional[datetime]) -> None:
+        # circular imports
+        from utils.default import log
+
+        if reconcile_from is not None:
+            await self.reconcile(reconcile_from)
+
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.write()
+            except (DatabaseError, OSError, ValueError) as e:
+                log(f"{SNAPSHOT_LOGGING_PREFIX} Failed to write {self.path}: {e}")
+
+    def start(self, *, reconcile_from: Optional[datetime] = None) -> None:
+        """Start writing a snapshot every :attr:`interval` seconds. Does nothing if it's already running.
+
+        Parameters
+        ----------
+        reconcile_from: Optional[:class:`datetime.datetime`]
+            Run :meth:`reconcile` with this first, as returned by :meth:`load`.
+        """
+        if self._task is not None and not self._task.done():
+            return
+
+        self._task = asyncio.create_task(self._run(reconcile_from))
+
+    async def close(self) -> None:
+        """Stop the periodic task and write a final snapshot."""
+        # circular imports
+        from utils.default import log
+
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        try:
+            await self.write()
+        except (DatabaseError, OSError, ValueError) as e:
+            log(f"{SNAPSHOT_LOGGING_PREFIX} Failed to write {self.path}: {e}")
@@ -0,0 +1,539 @@
+"""An in-process stand-in for Postgres, backed by :mod:`sqlite3`.
+
+Selected with ``"backend": "sqlite"`` in ``db_config.json``, the database
+lives in memory unless ``"sqlite_path"`` points to a file:
+
+.. code-block:: json
+
+    {"backend": "sqlite", "sqlite_path": ":memory:"}
+
+It understands the SQL :mod:`Manager.database` generates, translated to
+SQLite once per query: ``$n`` placeholders, ``::type`` casts, ``unnest`` of
+array arguments, ``array_append``/``array_remove``, ``IS DISTINCT FROM``,
+``now()``, ``to_regclass``, ``RETURNING`` and ``WITH`` blocks that insert,
+update or delete. Arrays are stored as JSON, timestamps as ISO strings.
+Postgres only DDL (functions, triggers, ``ALTER TABLE``, ``DO``, ``LISTEN``) is
+accepted and ignored, the schema is created from :data:`table_info` with
+the ``updated_at`` column built in.
+
+Meant for tests and load tests, there is one connection and queries run
+synchronously on the event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import json
+import re
+import sqlite3
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
+
+from .models import Table, table_info
+from .pool import PoolManager
+from .watermark import UPDATED_AT_COLUMN
+
+__all__: tuple[str, ...] = ("SQLitePoolManager", "SQLitePool", "SQLiteConnection", "SQLiteRecord", "translate")
+
+# the TypedDicts only document these in comments.
+_DEFAULTS: dict[tuple[Table, str], str] = {
+    (Table.USERECO, "balance"): "500",
+    (Table.USERECO, "bank"): "500",
+    (Table.USERECO, "isbot"): "false",
+    (Table.USERS, "isbot"): "false",
+    (Table.USERS, "usedcmds"): "0",
+    (Table.USERS, "bio"): "'Mysterious User.'",
+    (Table.USERS, "msgtracking"): "true",
+    (Table.GUILDS, "prefix"): "'/'",
+    (Table.BLACKLIST, "blacklisted"): "false",
+    (Table.BLACKLIST, "reason"): "'Unspecified'",
+    (Table.GUILDBLACKLISTS, "name"): "'Unknown'",
+    (Table.GUILDBLACKLISTS, "blacklisted"): "false",
+}
+
+_IGNORED_RE = re.compile(
+    r"^\s*(CREATE\s+OR\s+REPLACE\s+FUNCTION|CREATE\s+TRIGGER|DROP\s+TRIGGER|ALTER\s+TABLE|DO|LISTEN|UNLISTEN|NOTIFY)\b",
+    re.IGNORECASE,
+)
+_CAST_RE = re.compile(r"::\s*\w+(\s*\[\])?")
+_PARAM_RE = re.compile(r"\$(\d+)")
+_SQLITE_PARAM_RE = re.compile(r"\?(\d+)")
+_NOT_DISTINCT_RE = re.compile(r"\bIS\s+NOT\s+DISTINCT\s+FROM\b", re.IGNORECASE)
+_DISTINCT_RE = re.compile(r"\bIS\s+DISTINCT\s+FROM\b", re.IGNORECASE)
+_UNNEST_RE = re.compile(r"\bunnest\(([^()]*)\)\s+AS\s+(\w+)\s*\(([^()]*)\)", re.IGNORECASE)
+_UPDATE_RE = re.compile(r"^(\s*UPDATE\s+(\w+)\s+SET\s+)", re.IGNORECASE)
+_DML_RE = re.compile(r"^\s*(INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+_CTE_NAME_RE = re.compile(r"\s*(\w+)\s+AS\s*\(", re.IGNORECASE)
+_ISO_RE = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?([+-]\d{2}:\d{2})?")
+
+
+def _column_kind(types: tuple[type, ...]) -> str:
+    if list in types:
+        return "array"
+    if datetime in types:
+        return "timestamp"
+    if bool in types:
+        return "bool"
+    if int in types:
+        return "integer"
+    return "text"
+
+
+# column name -> how its values are stored, the same name has the same type in every table.
+_COLUMN_KINDS: dict[str, str] = {
+    column: _column_kind(validator.types) for info in table_info.values() for column, validator in info.columns.items()
+}
+_SQLITE_TYPES: dict[str, str] = {
+    "array": "TEXT",
+    "timestamp": "TEXT",
+    "bool": "BOOLEAN",
+    "integer": "INTEGER",
+    "text": "TEXT",
+}
+_TABLE_NAMES: frozenset[str] = frozenset(table.value for table in Table)
+
+
+def schema_sql(table: Table) -> str:
+    """The ``CREATE TABLE`` statement for a table, generated from :data:`table_info`."""
+    info = table_info[table]
+    columns = info.columns
+    # badges are keyed by name in memory, their rows by (badge, userid). reminders don't declare their serial id.
+    primary_key = info.key_column if info.key_column in columns else None
+    definitions: list[str] = []
+    if primary_key is None and table is not Table.BADGES:
+        primary_key = info.key_column
+        definitions.append(f"{primary_key} INTEGER PRIMARY KEY")
+    # SQLite lets NULL into primary keys, Postgres doesn't. rejecting it here too keeps the stand-in honest.
+    key_columns = ("badge", "userid") if table is Table.BADGES else (primary_key,)
+
+    for column, validator in columns.items():
+        kind = _COLUMN_KINDS[column]
+        definition = f"{column} {_SQLITE_TYPES[kind]}"
+        if column == primary_key:
+            definition += " PRIMARY KEY"
+        if column in key_columns:
+            definition += " NOT NULL"
+        if column == UPDATED_AT_COLUMN:
+            definition += " NOT NULL DEFAULT (now())"
+        elif (table, column) in _DEFAULTS:
+            definition += f" DEFAULT {_DEFAULTS[table, column]}"
+        definitions.append(definition)
+    if table is Table.BADGES:
+        definitions.append(f"PRIMARY KEY ({', '.join(key_columns)})")
+
+    return f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(definitions)})"
+
+
+class _Statement(NamedTuple):
+    sql: Optional[str]  # None for statements that are ignored
+    params: int  # the highest placeholder used
+    # data-modifying WITH blocks, run first into temp tables named like the block: (name, sql, params)
+    ctes: tuple[tuple[str, str, int], ...] = ()
+
+
+def _split_with(query: str) -> Optional[tuple[list[tuple[str, str]], str]]:
+    # WITH a AS (...), b AS (...) rest -> ([(a, ...), (b, ...)], rest)
+    match = re.match(r"\s*WITH\s+", query, re.IGNORECASE)
+    if match is None:
+        return None
+
+    blocks: list[tuple[str, str]] = []
+    position = match.end()
+    while True:
+        name = _CTE_NAME_RE.match(query, position)
+        if name is None:
+            return None
+        depth, index, quoted = 1, name.end(), False
+        while depth:
+            char = query[index]
+            if char == "'":
+                quoted = not quoted
+            elif not quoted:
+                depth += (char == "(") - (char == ")")
+            index += 1
+        blocks.append((name.group(1), query[name.end() : index - 1]))
+        position = index
+        comma = re.match(r"\s*,", query[position:])
+        if comma is None:
+            return blocks, query[position:]
+        position += comma.end()
+
+
+def _translate_sql(query: str) -> tuple[str, int]:
+    sql = _CAST_RE.sub("", query)
+    sql = _PARAM_RE.sub(r"?\1", sql)
+    sql = _NOT_DISTINCT_RE.sub("IS", sql)
+    sql = _DISTINCT_RE.sub("IS NOT", sql)
+
+    def unnest(match: re.Match[str]) -> str:
+        arrays = [array.strip() for array in match.group(1).split(",")]
+        columns = [column.strip() for column in match.group(3).split(",")]
+        selected = ", ".join(f"c{i}.value AS {column}" for i, column in enumerate(columns))
+        joined = " ".join(f"JOIN json_each({array}) AS c{i} ON c{i}.key = c0.key" for i, array in enumerate(arrays) if i)
+        return f"(SELECT {selected} FROM json_each({arrays[0]}) AS c0 {joined}) AS {match.group(2)}"
+
+    sql = _UNNEST_RE.sub(unnest, sql)
+
+    # stands in for the agb_touch_updated_at trigger. an AFTER trigger wouldn't show up in RETURNING.
+    update = _UPDATE_RE.match(sql)
+    if update is not None and update.group(2) in _TABLE_NAMES:
+        sql = f"{update.group(1)}{UPDATED_AT_COLUMN} = now(), {sql[update.end():]}"
+
+    params = max((int(index) for index in _SQLITE_PARAM_RE.findall(sql)), default=0)
+    return sql, params
+
+
+@lru_cache(maxsize=1024)
+def translate(query: str) -> _Statement:
+    """Translate a Postgres query to SQLite.
+
+    Parameters
+    ----------
+    query: str
+        The query, as passed to ``execute``/``fetch*``.
+    """
+    if _IGNORED_RE.match(query):
+        return _Statement(None, 0)
+
+    split = _split_with(query)
+    if split is not None and any(_DML_RE.match(body) for _, body in split[0]):
+        ctes = tuple((name, *_translate_sql(body)) for name, body in split[0])
+        return _Statement(*_translate_sql(split[1]), ctes)  # type: ignore
+
+    return _Statement(*_translate_sql(query))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _encode_item(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return (value.astimezone(timezone.utc) if value.tzinfo else value).isoformat()
+    return value
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return json.dumps([_encode_item(item) for item in value])
+    return _encode_item(value)
+
+
+def _array_append(array: Optional[str], value: Any) -> str:
+    items = json.loads(array) if array is not None else []
+    items.append(value)
+    return json.dumps(items)
+
+
+def _array_remove(array: Optional[str], value: Any) -> Optional[str]:
+    if array is None:
+        return None
+    return json.dumps([item for item in json.loads(array) if item != value])
+
+
+def _decode_any(value: Any) -> Any:
+    # expressions like now() have no column to go by.
+    if type(value) is str and _ISO_RE.fullmatch(value):
+        return datetime.fromisoformat(value)
+    return value
+
+
+_DECODERS: dict[str, Any] = {
+    "array": lambda value: json.loads(value) if value is not None else None,
+    "timestamp": lambda value: datetime.fromisoformat(value) if value is not None else None,
+    "bool": lambda value: bool(value) if value is not None else None,
+}
+
+
+@lru_cache(maxsize=1024)
+def _decoders(names: tuple[str, ...]) -> tuple[Any, ...]:
+    decoders = []
+    for name in names:
+        kind = _COLUMN_KINDS.get(name)
+        decoders.append(_DECODERS.get(kind) if kind is not None else _decode_any)  # type: ignore
+    return tuple(decoders)
+
+
+class SQLiteRecord:
+    """A read-only row, with the parts of the :class:`asyncpg.Record` interface the models use."""
+
+    __slots__: tuple[str, ...] = ("_keys", "_values")
+
+    def __init__(self, keys: dict[str, int], values: tuple[Any, ...]) -> None:
+        self._keys: dict[str, int] = keys
+        self._values: tuple[Any, ...] = values
+
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, (int, slice)):
+            return self._values[key]
+        return self._values[self._keys[key]]
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._values[self._keys[name]]
+        except KeyError:
+            raise AttributeError(f"{self.__class__.__name__} has no attribute {name}") from None
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._keys
+
+    def __repr__(self) -> str:
+        return f"<Record {' '.join(f'{key}={value!r}' for key, value in self.items())}>"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        index = self._keys.get(key)
+        return default if index is None else self._values[index]
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def values(self) -> Iterator[Any]:
+        return iter(self._values)
+
+    def items(self) -> Iterator[tuple[str, Any]]:
+        return zip(self._keys, self._values)
+
+
+def _records(description: Any, rows: Iterable[tuple[Any, ...]]) -> list[SQLiteRecord]:
+    names = tuple(column[0] for column in description)
+    keys = {name: index for index, name in enumerate(names)}
+    decoders = _decoders(names)
+    return [
+        SQLiteRecord(keys, tuple(value if decode is None else decode(value) for decode, value in zip(decoders, row)))
+        for row in rows
+    ]
+
+
+class _Transaction:
+    __slots__: tuple[str, ...] = ("connection", "name")
+
+    def __init__(self, connection: SQLiteConnection) -> None:
+        self.connection: SQLiteConnection = connection
+        self.name: str = f"agb_{next(connection._savepoints)}"
+
+    async def __aenter__(self) -> _Transaction:
+        self.connection._db.execute(f"SAVEPOINT {self.name}")
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        db = self.connection._db
+        if exc_type is not None:
+            db.execute(f"ROLLBACK TO {self.name}")
+        db.execute(f"RELEASE {self.name}")
+
+
+class _Cursor:
+    __slots__: tuple[str, ...] = ("_cursor",)
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self._cursor: sqlite3.Cursor = cursor
+
+    async def fetch(self, n: int) -> list[SQLiteRecord]:
+        rows = self._cursor.fetchmany(n)
+        return _records(self._cursor.description, rows) if rows else []
+
+
+class SQLiteConnection:
+    """One SQLite connection with the query methods of :class:`asyncpg.Connection`."""
+
+    __slots__: tuple[str, ...] = ("_db", "_savepoints")
+
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self._db: sqlite3.Connection = db
+        self._savepoints: Iterator[int] = itertools.count()
+
+    def is_closed(self) -> bool:
+        try:
+            self._db.total_changes
+        except sqlite3.ProgrammingError:
+            return True
+        return False
+
+    def transaction(self, **kwargs: Any) -> _Transaction:
+        # isolation levels mean nothing with a single connection.
+        return _Transaction(self)
+
+    @contextlib.contextmanager
+    def _savepoint(self) -> Iterator[None]:
+        name = f"agb_{next(self._savepoints)}"
+        self._db.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            self._db.execute(f"ROLLBACK TO {name}")
+            raise
+        finally:
+            self._db.execute(f"RELEASE {name}")
+
+    def _run(self, query: str, args: tuple[Any, ...]) -> tuple[list[SQLiteRecord], str]:
+        statement = translate(query)
+        if statement.sql is None:
+            return [], query.split(None, 1)[0].upper()
+
+        params = [_encode(arg) for arg in args]
+        db = self._db
+        if not statement.ctes:
+            cursor = db.execute(statement.sql, params[: statement.params])
+            records = _records(cursor.description, cursor.fetchall()) if cursor.description else []
+            return records, self._status(statement.sql, cursor, records)
+
+        with self._savepoint():
+            for name, sql, count in statement.ctes:
+                cursor = db.execute(sql, params[:count])
+                rows = cursor.fetchall()
+                columns = [column[0] for column in cursor.description or ()]
+                db.execute(f"DROP TABLE IF EXISTS temp.{name}")
+                db.execute(f"CREATE TEMP TABLE {name} ({', '.join(columns) or 'unused'})")
+                if rows:
+                    db.executemany(f"INSERT INTO temp.{name} VALUES ({', '.join('?' * len(columns))})", rows)
+            try:
+                cursor = db.execute(statement.sql, params[: statement.params])
+                records = _records(cursor.description, cursor.fetchall()) if cursor.description else []
+            finally:
+                for name, _, _ in statement.ctes:
+                    db.execute(f"DROP TABLE IF EXISTS temp.{name}")
+        return records, self._status(statement.sql, cursor, records)
+
+    @staticmethod
+    def _status(sql: str, cursor: sqlite3.Cursor, records: list[SQLiteRecord]) -> str:
+        verb = sql.split(None, 1)[0].upper()
+        count = len(records) if verb == "SELECT" or cursor.rowcount < 0 else cursor.rowcount
+        return f"INSERT 0 {count}" if verb == "INSERT" else f"{verb} {count}"
+
+    async def execute(self, query: str, *args: Any) -> str:
+        return self._run(query, args)[1]
+
+    async def executemany(self, query: str, args: Iterable[Iterable[Any]]) -> None:
+        with self._savepoint():
+            for arguments in args:
+                self._run(query, tuple(arguments))
+
+    async def fetch(self, query: str, *args: Any) -> list[SQLiteRecord]:
+        return self._run(query, args)[0]
+
+    async def fetchrow(self, query: str, *args: Any) -> Optional[SQLiteRecord]:
+        records = self._run(query, args)[0]
+        return records[0] if records else None
+
+    async def fetchval(self, query: str, *args: Any, column: int = 0) -> Any:
+        records = self._run(query, args)[0]
+        return records[0][column] if records else None
+
+    async def cursor(self, query: str, *args: Any) -> _Cursor:
+        statement = translate(query)
+        if statement.sql is None or statement.ctes:
+            raise sqlite3.NotSupportedError(f"Can't open a cursor for {query!r}")
+        params = [_encode(arg) for arg in args]
+        return _Cursor(self._db.execute(statement.sql, params[: statement.params]))
+
+    async def close(self) -> None:
+        self._db.close()
+
+
+class _AcquireContext:
+    __slots__: tuple[str, ...] = ("pool", "timeout", "connection")
+
+    def __init__(self, pool: SQLitePool, timeout: Optional[float]) -> None:
+        self.pool: SQLitePool = pool
+        self.timeout: Optional[float] = timeout
+        self.connection: Optional[SQLiteConnection] = None
+
+    async def _acquire(self) -> SQLiteConnection:
+        await asyncio.wait_for(self.pool._lock.acquire(), self.timeout)
+        return self.pool._connection
+
+    def __await__(self) -> Any:
+        return self._acquire().__await__()
+
+    async def __aenter__(self) -> SQLiteConnection:
+        self.connection = await self._acquire()
+        return self.connection
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.pool.release(self.connection)  # type: ignore
+
+
+class SQLitePool:
+    """A pool of the one :class:`SQLiteConnection`, handed out to one caller at a time like :class:`asyncpg.Pool`.
+
+    Parameters
+    ----------
+    path: str
+        The database file, ``":memory:"`` for an in-memory database.
+    """
+
+    __slots__: tuple[str, ...] = ("path", "_connection", "_lock", "_closed")
+
+    def __init__(self, path: str = ":memory:") -> None:
+        db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        db.create_function("now", 0, _now)
+        db.create_function("to_regclass", 1, lambda name: name if name in _TABLE_NAMES else None, deterministic=True)
+        db.create_function("array_append", 2, _array_append, deterministic=True)
+        db.create_function("array_remove", 2, _array_remove, deterministic=True)
+        for table in Table:
+            db.execute(schema_sql(table))
+
+        self.path: str = path
+        self._connection: SQLiteConnection = SQLiteConnection(db)
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._closed: bool = False
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _AcquireContext:
+        return _AcquireContext(self, timeout)
+
+    async def release(self, connection: SQLiteConnection) -> None:
+        if self._lock.locked():
+            self._lock.release()
+
+    def get_size(self) -> int:
+        return 1
+
+    def get_idle_size(self) -> int:
+        return 0 if self._lock.locked() else 1
+
+    async def close(self) -> None:
+        self._closed = True
+        await self._connection.close()
+
+
+class SQLitePoolManager(PoolManager):
+    """:class:`PoolManager` for the SQLite backend, see :mod:`Manager.database.sqlite`.
+
+    Parameters
+    ----------
+    path: str
+        The database file, ``":memory:"`` for an in-memory database. Defaults to ``":memory:"``.
+    acquire_timeout: float
+        Seconds to wait for the connection before giving up. Defaults to ``10.0``.
+    """
+
+    __slots__: tuple[str, ...] = ("path",)
+
+    # SQLite has no LISTEN/NOTIFY, everything runs in this process anyways.
+    notifications: bool = False
+
+    def __init__(self, path: str = ":memory:", *, acquire_timeout: float = 10.0) -> None:
+        super().__init__(min_size=1, max_size=1, acquire_timeout=acquire_timeout, command_timeout=None, retries=0)
+        self.path: str = path
+
+    @classmethod
+    def from_config(cls, config: Any = None) -> SQLitePoolManager:
+        """Create a manager from ``db_config.json``, using its optional ``sqlite_path``."""
+        return cls(getattr(config, "sqlite_path", ":memory:"))
+
+    async def create(self, **connect_kwargs: Any) -> SQLitePool:  # type: ignore
+        """Open the database and create the schema. The connection options are ignored."""
+        if self._pool is not None and not self._pool._closed:
+            return self._pool  # type: ignore
+
+        self._pool = SQLitePool(self.path)  # type: ignore
+        self.start()
+        return self._pool  # type: ignore
@@ -30,6 +30,8 @@ class DBConfig(NamedTuple):
     password: str
     database: str
     port: str
+    backend: str = "postgres"  # or "sqlite", see Manager.database.sqlite
+    sqlite_path: str = ":memory:"
 
 
 class UserEco(TypedDict):
@@ -38,6 +40,7 @@ class UserEco(TypedDict):
     bank: int  # defaults to 500
     lastdaily: Optional[datetime]  # defaults to None
     isbot: bool  # defaults to False
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class Users(TypedDict):
@@ -50,6 +53,7 @@ class Users(TypedDict):
     bio: str  # defaults to 'Mysterious User.'
     msgtracking: bool  # defaults to True
     todos: Optional[List[str]]  # defaults to None
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class Guilds(TypedDict):
@@ -57,37 +61,38 @@ class Guilds(TypedDict):
     hentaichannel: Optional[int]  # defaults to None
     prefix: str  # defaults to '/'
     welcomer: Optional[int]  # defaults to None
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class AutoMod(TypedDict):
     guildid: int  # primary key
     logchannelid: Optional[int]  # defaults to None
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class AutoRoles(TypedDict):
     guildid: int  # primary key
     roleids: Optional[List[int]]  # defaults to None
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class Badges(TypedDict):
-    userid: int  # primary key
-    owner: Optional[List[int]]  # defaults to None
-    admin: Optional[List[int]]  # defaults to None
-    mod: Optional[List[int]]  # defaults to None
-    partner: Optional[List[int]]  # defaults to None
-    support: Optional[List[int]]  # defaults to None
-    friend: Optional[List[int]]  # defaults to None
+    badge: str  # primary key with userid, one row per badge a user has
+    userid: int  # indexed
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class Reminders(TypedDict):
     userid: int  # primary key
     time: Optional[datetime]  # defaults to None
     message: Optional[str]  # defaults to None
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class Status(TypedDict):
     id: int  # primary key, serial
     status: Optional[str]  # defaults to None
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class Blacklist(TypedDict):
@@ -95,14 +100,18 @@ class Blacklist(TypedDict):
     blacklisted: bool  # defaults to False
     blacklistedtill: Optional[str]  # defaults to None
     reason: Optional[str]  # defaults to 'Unspecified'
+    expires_at: Optional[datetime]  # when a temporary blacklist runs out, see BlacklistExpiry
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class Commands(TypedDict):
     guild: int  # primary key
     disabled: Optional[List[str]]  # defaults to None
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
 
 
 class GuildBlacklist(TypedDict):
     id: int  # primary key
     name: str  # defaults to 'Unknown''
     blacklisted: bool  # defaults to False
+    updated_at: Optional[datetime]  # set by the agb_touch_updated_at trigger
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from .models import Table
+
+if TYPE_CHECKING:
+    from .database import Connection
+
+__all__: tuple[str, ...] = ("UPDATED_AT_COLUMN", "install_updated_at")
+
+UPDATED_AT_COLUMN = "updated_at"
+
+TOUCH_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION agb_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.{UPDATED_AT_COLUMN} := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def _updated_at_sql(table: Table) -> tuple[str, ...]:
+    name = f"agb_{table}_touch_updated_at"
+    return (
+        # now() is stable, so existing rows get the default without rewriting the table.
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {UPDATED_AT_COLUMN} timestamptz NOT NULL DEFAULT now()",
+        f"CREATE INDEX IF NOT EXISTS {table}_{UPDATED_AT_COLUMN}_idx ON {table} ({UPDATED_AT_COLUMN})",
+        f"DROP TRIGGER IF EXISTS {name} ON {table}",
+        f"CREATE TRIGGER {name} BEFORE UPDATE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION agb_touch_updated_at()",
+    )
+
+
+async def install_updated_at(connection: Connection) -> list[Table]:
+    """Add the ``updated_at`` column, its index and the trigger keeping it current to every managed table.
+
+    Safe to run on every startup, tables that don't exist are skipped.
+
+    Parameters
+    ----------
+    connection: :class:`Connection`
+        The connection to install with.
+
+    Returns
+    -------
+    list[:class:`Table`]
+        The tables that have the column.
+    """
+    installed: list[Table] = []
+    async with connection.transaction():
+        await connection.execute(TOUCH_FUNCTION_SQL)
+        for table in Table:
+            if await connection.fetchval("SELECT to_regclass($1)", str(table)) is None:
+                continue
+            for statement in _updated_at_sql(table):
+                await connection.execute(statement)
+            installed.append(table)
+
+    return installed
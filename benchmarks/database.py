@@ -0,0 +1,178 @@
+"""Micro-benchmarks for the database layer hot paths.
+
+Runs against the in-process SQLite backend (see :mod:`Manager.database.sqlite`)
+with the users table and its cache holding 1k, 100k and 1M rows, and prints
+one JSON object per benchmark and size to stdout. Logs go to stderr.
+
+Run with ``python -m benchmarks.database``, pass ``--sizes 1000`` for a quick
+run and ``--baseline old.jsonl`` to exit with an error when a benchmark got
+slower than ``--tolerance`` compared to an earlier run.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import random
+import sys
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from Manager.database import Database, Table
+from Manager.database.models import table_info
+from Manager.database.queries import compile_update
+from Manager.database.types import DBConfig
+
+SIZES: tuple[int, ...] = (1_000, 100_000, 1_000_000)
+# operations per benchmark, the ones hitting SQLite run fewer.
+CACHE_OPS = 100_000
+QUERY_OPS = 1_000
+INSERT_BATCH = 100_000
+
+
+def _result(name: str, rows: int, ops: int, seconds: float) -> dict[str, Any]:
+    return {
+        "benchmark": name,
+        "rows": rows,
+        "ops": ops,
+        "seconds": round(seconds, 6),
+        "us_per_op": round(seconds / ops * 1e6, 3),
+        "ops_per_sec": round(ops / seconds, 1) if seconds else None,
+        "python": platform.python_version(),
+    }
+
+
+def bench_sync(func: Callable[[Any], Any], keys: list[Any]) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    return time.perf_counter() - start
+
+
+async def bench_async(func: Callable[[Any], Awaitable[Any]], keys: list[Any]) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        await func(key)
+    return time.perf_counter() - start
+
+
+async def populate(db: Database, rows: int) -> None:
+    query = f"INSERT INTO {Table.USERS} (userid, usedcmds) SELECT key, key FROM unnest($1::bigint[]) AS data(key)"
+    for start in range(0, rows, INSERT_BATCH):
+        await db.execute(query, list(range(start + 1, min(start + INSERT_BATCH, rows) + 1)))
+
+
+async def run_size(rows: int, *, seed: int = 0) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    db = Database(
+        None,  # type: ignore
+        DBConfig("", "", "", "", "", backend="sqlite"),
+        cache_limits={Table.USERS: (rows, None)},
+    )
+    await db.initate_database(chunk=False, listen=False)
+    results: list[dict[str, Any]] = []
+    try:
+        await populate(db, rows)
+
+        start = time.perf_counter()
+        await db.chunk(users=True)
+        results.append(_result("chunk", rows, rows, time.perf_counter() - start))
+
+        hits = [rng.randint(1, rows) for _ in range(CACHE_OPS)]
+        users = [db._users.peek(key) for key in hits[:QUERY_OPS]]
+        cached = list(db._users.values())
+
+        elapsed = bench_sync(lambda user: db._add_to_cache(Table.USERS, user), cached[:CACHE_OPS])
+        results.append(_result("_add_to_cache", rows, min(CACHE_OPS, len(cached)), elapsed))
+
+        elapsed = bench_sync(db.get_user, hits)
+        results.append(_result("get_user", rows, CACHE_OPS, elapsed))
+
+        elapsed = await bench_async(lambda key: db.getch(Table.USERS, key), hits)
+        results.append(_result("getch hit", rows, CACHE_OPS, elapsed))
+
+        # the first lookup of a missing key queries, the rest hit the negative cache.
+        missing = [rows + 1 + index % QUERY_OPS for index in range(CACHE_OPS)]
+        elapsed = await bench_async(lambda key: db.getch(Table.USERS, key), missing)
+        results.append(_result("getch missing", rows, CACHE_OPS, elapsed))
+
+        for key in hits[:QUERY_OPS]:
+            db._users.pop(key, None)
+        elapsed = await bench_async(lambda key: db.getch(Table.USERS, key), hits[:QUERY_OPS])
+        results.append(_result("getch miss", rows, QUERY_OPS, elapsed))
+
+        elapsed = await bench_async(db.fetch_user, hits[:QUERY_OPS])
+        results.append(_result("fetch_user", rows, QUERY_OPS, elapsed))
+
+        sample = [user for user in users if user is not None] or cached[:1]
+        attribute_users = [sample[index % len(sample)] for index in range(CACHE_OPS)]
+        elapsed = bench_sync(lambda user: (user.userid, user.usedcmds, user.bio, user.msgtracking), attribute_users)
+        results.append(_result("attribute access", rows, CACHE_OPS, elapsed))
+
+        elapsed = bench_sync(lambda user: (user["userid"], user["usedcmds"], user["bio"]), attribute_users)
+        results.append(_result("item access", rows, CACHE_OPS, elapsed))
+
+        info = table_info[Table.USERS]
+
+        def build(user: Any) -> str:
+            info.validate(bio="benchmark", usedcmds=1)
+            return compile_update(Table.USERS, ("bio", "usedcmds"), ("userid",))
+
+        elapsed = bench_sync(build, attribute_users)
+        results.append(_result("handle_execute query building", rows, CACHE_OPS, elapsed))
+
+        elapsed = await bench_async(lambda user: user.edit(bio="benchmark"), attribute_users[:QUERY_OPS])
+        results.append(_result("edit", rows, QUERY_OPS, elapsed))
+    finally:
+        await db.close()
+
+    return results
+
+
+def compare(results: list[dict[str, Any]], baseline_path: str, tolerance: float) -> list[str]:
+    """The benchmarks slower than ``tolerance`` (e.g. ``0.2`` for 20%) compared to a previous run."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(entry["benchmark"], entry["rows"]): entry for entry in map(json.loads, filter(str.strip, f))}
+
+    regressions: list[str] = []
+    for entry in results:
+        old = baseline.get((entry["benchmark"], entry["rows"]))
+        if old is None or not old["us_per_op"]:
+            continue
+        change = entry["us_per_op"] / old["us_per_op"] - 1
+        if change > tolerance:
+            regressions.append(
+                f"{entry['benchmark']} at {entry['rows']:,} rows: "
+                f"{old['us_per_op']}us -> {entry['us_per_op']}us (+{change:.0%})"
+            )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="rows in the users table and cache")
+    parser.add_argument("--baseline", help="JSON lines from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    results: list[dict[str, Any]] = []
+    for rows in args.sizes:
+        # chunk() and the counters log to stdout, keep it for the results.
+        with contextlib.redirect_stdout(sys.stderr):
+            size_results = asyncio.run(run_size(rows))
+        for entry in size_results:
+            print(json.dumps(entry), flush=True)
+        results.extend(size_results)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+"""Per-command cost of checking a guild's disabled commands.
+
+Compares the old ``global_commands_check``, which scanned the ``disabled``
+list once for the qualified name and once per part of it, with the lookups
+in the per-guild index :class:`Command` rebuilds when ``disabled`` changes.
+The guild has 10, 100 and 500 disabled commands, the checked commands are
+a mix of allowed and disabled ones, with and without a parent group.
+
+Run with ``python -m benchmarks.disabled_commands``.
+"""
+from __future__ import annotations
+
+import random
+import timeit
+
+from Manager.database import Command, Database
+from Manager.database.types import DBConfig
+
+NUMBER = 10_000
+SIZES: tuple[int, ...] = (10, 100, 500)
+
+
+def legacy_check(disabled: list[str], qualified_name: str, is_group: bool) -> tuple[bool, list[str]]:
+    disabled_commands = []
+    left_overs = []
+    if not is_group and qualified_name in disabled:
+        return False, [qualified_name]
+
+    group_disabled = False
+    for index, cmd in enumerate(qualified_name.split(" ")):
+        if cmd in disabled:
+            if index == 0:
+                group_disabled = True
+            disabled_commands.append(cmd)
+        else:
+            left_overs.append(cmd)
+    return group_disabled, disabled_commands
+
+
+def indexed_check(entry: Command, qualified_name: str, is_group: bool) -> tuple[bool, list[str]]:
+    disabled_commands = entry.disabled_parts(qualified_name)
+    if not disabled_commands:
+        return False, []
+    if not is_group:
+        return False, [qualified_name]
+    return disabled_commands[0] == qualified_name.split(" ", 1)[0], list(disabled_commands)
+
+
+def main() -> None:
+    rng = random.Random(0)
+    db = Database(None, DBConfig("localhost", "agb", "", "agb", "5432"))  # type: ignore
+    for size in SIZES:
+        disabled = [f"command{index}" for index in range(size)]
+        entry = Command(db, {"guild": 1, "disabled": disabled})  # type: ignore
+        # half the invocations hit a disabled command, like a guild that disabled most of a cog.
+        names = [
+            (f"command{rng.randrange(size * 2)}", False)
+            if rng.random() < 0.5
+            else (f"group{rng.randrange(20)} command{rng.randrange(size * 2)}", True)
+            for _ in range(200)
+        ]
+        for qualified_name, is_group in names:
+            assert legacy_check(disabled, qualified_name, is_group) == indexed_check(entry, qualified_name, is_group)
+
+        def run_legacy() -> None:
+            for qualified_name, is_group in names:
+                legacy_check(disabled, qualified_name, is_group)
+
+        def run_indexed() -> None:
+            for qualified_name, is_group in names:
+                indexed_check(entry, qualified_name, is_group)
+
+        per_call = NUMBER // 10 * len(names)
+        before = min(timeit.repeat(run_legacy, number=NUMBER // 10, repeat=3)) / per_call * 1e6
+        after = min(timeit.repeat(run_indexed, number=NUMBER // 10, repeat=3)) / per_call * 1e6
+        print(f"{size:>4} disabled  before: {before:6.2f}us  after: {after:6.2f}us  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
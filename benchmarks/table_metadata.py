@@ -0,0 +1,84 @@
+"""Per-call overhead of resolving table metadata.
+
+Compares the old approach, calling ``get_type_hints`` and rebuilding the
+table -> fetch method mapping on every call, with the precompiled
+``table_info`` registry.
+
+Run with ``python -m benchmarks.table_metadata``.
+"""
+from __future__ import annotations
+
+import timeit
+from typing import Any, Union, get_type_hints
+
+from Manager.database import Database, Table
+from Manager.database.models import resolve_table, table_info, table_to_cls
+from Manager.database.types import DBConfig
+
+NUMBER = 100_000
+
+
+def legacy_getch_prelude(db: Database, table: Union[str, Table], key: Any) -> None:
+    def get_enum() -> Table:
+        try:
+            return Table[table]  # type: ignore
+        except KeyError:
+            return Table(table)
+
+    actual_table = get_enum()
+    primary_key, _ = db._table_to_cache[actual_table]
+    table_to_method = {
+        Table.USERECO: db.fetch_economy_user,
+        Table.USERS: db.fetch_user,
+        Table.GUILDS: db.fetch_guild,
+        Table.AUTOMOD: db.fetch_automod,
+        Table.AUTOROLES: db.fetch_autorole,
+        Table.BADGES: db.fetch_badge,
+        Table.STATUS: db.fetch_status,
+        Table.BLACKLIST: db.fetch_blacklist,
+        Table.COMMANDS: db.fetch_command_guild,
+        Table.GUILDBLACKLISTS: db.fetch_guild_blacklist,
+    }
+    data_types = get_type_hints(table_to_cls[actual_table].data_dict)
+    if not isinstance(key, data_types[primary_key]):
+        raise TypeError
+    table_to_method[actual_table]
+
+
+def registry_getch_prelude(db: Database, table: Union[str, Table], key: Any) -> None:
+    actual_table = resolve_table(table)
+    info = table_info[actual_table]  # type: ignore
+    if not isinstance(key, info.key_type):
+        raise TypeError
+    db._fetch_methods[actual_table]  # type: ignore
+
+
+def legacy_validate(**inputs: Any) -> None:
+    typed_dict = get_type_hints(table_to_cls[Table.USERS].data_dict)
+    for column, value in inputs.items():
+        _type = typed_dict[column]
+        origin = getattr(_type, "__origin__", None)
+        if origin is Union:
+            isinstance(value, tuple(getattr(t, "__origin__", t) for t in _type.__args__))
+        else:
+            isinstance(value, _type)
+
+
+def registry_validate(**inputs: Any) -> None:
+    table_info[Table.USERS].validate(**inputs)
+
+
+def main() -> None:
+    db = Database(None, DBConfig("localhost", "agb", "", "agb", "5432"))  # type: ignore
+    cases = (
+        ("getch prelude", lambda: legacy_getch_prelude(db, "users", 1), lambda: registry_getch_prelude(db, "users", 1)),
+        ("edit validation", lambda: legacy_validate(usedcmds=1, bio="x"), lambda: registry_validate(usedcmds=1, bio="x")),
+    )
+    for name, legacy, registry in cases:
+        before = min(timeit.repeat(legacy, number=NUMBER, repeat=3)) / NUMBER * 1e6
+        after = min(timeit.repeat(registry, number=NUMBER, repeat=3)) / NUMBER * 1e6
+        print(f"{name:<16} before: {before:6.2f}us  after: {after:6.2f}us  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
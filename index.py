@@ -72,11 +72,11 @@ slash_errors = (
 async def update_command_usages(interaction: Interaction) -> bool:
     bot: AGB = interaction.client  # type: ignore # shut
 
-    db_user = bot.db.get_user(interaction.user.id) or await bot.db.fetch_user(interaction.user.id)
-    if not db_user:
+    if interaction.user.bot:
         return False
 
-    await db_user.modify(usedcmds=db_user.usedcmds + 1)
+    await bot.db.ensure_user(interaction.user.id)
+    bot.db.command_uses.increment(interaction.user.id)
     return True
 
 
@@ -141,11 +141,12 @@ class AGB(commands.AutoShardedBot):
         )
         self.config = imports.get("config.json")
 
-        self.db: Database = Database(self, db_config)
+        self.db: Database = Database(self, db_config, snapshot_path=os.path.join(".cache", "db_snapshot.bin"))
         self.add_check(self.global_commands_check)
 
     async def setup_hook(self):
-        await self.db.initate_database(chunk=DEV)
+        # warms the caches the message hot path reads before the gateway connects.
+        await self.db.initate_database()
         self.session = aiohttp.ClientSession()
         self.lunar_client = Client(session=self.session, token=self.config.lunarapi.token)
         from utils.default import log
@@ -244,33 +245,25 @@ class AGB(commands.AutoShardedBot):
             return True
 
         guild_command_entry = self.db.get_command(ctx.guild.id)
-        if not guild_command_entry or not guild_command_entry.disabled:
+        if not guild_command_entry or not guild_command_entry.disabled_names:
             # no commands disabled...
             return True
 
+        qualified_name = ctx.command.qualified_name
+        disabled_commands = guild_command_entry.disabled_parts(qualified_name)
+        if not disabled_commands:
+            return True
+
         is_group: bool = isinstance(ctx.command, commands.Group) or ctx.command.parent is not None
-        disabled_commands = []
-        left_overs = []
-        if not is_group and guild_command_entry.is_disabled(ctx.command.qualified_name):
-            raise DisabledCommand(is_group=False, qualified_name=ctx.command.qualified_name)
-
-        group_disabled = False
-        for index, cmd in enumerate(ctx.command.qualified_name.split(" ")):
-            if guild_command_entry.is_disabled(cmd):
-                if index == 0:
-                    group_disabled = True
-                disabled_commands.append(cmd)
-            else:
-                left_overs.append(cmd)
-
-        if disabled_commands:
-            raise DisabledCommand(
-                is_group=is_group,
-                qualified_name=ctx.command.qualified_name,
-                group_disabled=group_disabled,
-                disabled=disabled_commands,
-            )
-        return True
+        if not is_group:
+            raise DisabledCommand(is_group=False, qualified_name=qualified_name)
+
+        raise DisabledCommand(
+            is_group=True,
+            qualified_name=qualified_name,
+            group_disabled=disabled_commands[0] == qualified_name.split(" ", 1)[0],
+            disabled=list(disabled_commands),
+        )
 
 
 intents = discord.Intents.default()
@@ -0,0 +1,40 @@
+"""Closing a WriteBehindCounter must not lose the batch a flush is writing."""
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from Manager.database import Table, WriteBehindCounter
+
+
+class _SlowConnection:
+    def __init__(self) -> None:
+        self.started = asyncio.Event()
+        self.written: dict[int, int] = {}
+
+    async def fetch(self, query: str, keys: list[int], amounts: list[int]) -> list[Any]:
+        self.started.set()
+        await asyncio.sleep(0.1)
+        for key, amount in zip(keys, amounts):
+            self.written[key] = self.written.get(key, 0) + amount
+        return []
+
+
+async def _close_during_flush() -> tuple[dict[int, int], int]:
+    connection = _SlowConnection()
+    counter = WriteBehindCounter(connection, Table.USERS, "userid", "usedcmds", flush_interval=0.01)  # type: ignore
+    counter.increment(1)
+    counter.increment(1)
+    counter.increment(2)
+    counter.start()
+    await connection.started.wait()
+    # arrives while the timed flush is writing.
+    counter.increment(3)
+    await counter.close()
+    return connection.written, counter.pending
+
+
+def test_close_during_flush_keeps_every_increment() -> None:
+    written, pending = asyncio.run(_close_during_flush())
+    assert written == {1: 2, 2: 1, 3: 1}
+    assert pending == 0
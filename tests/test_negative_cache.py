@@ -0,0 +1,63 @@
+"""getch must not remember a key as absent when a write for it raced the fetch.
+
+Runs against the in-process SQLite backend, see :mod:`Manager.database.sqlite`.
+"""
+from __future__ import annotations
+
+import asyncio
+
+from Manager.database import Database, Table
+from Manager.database.types import DBConfig
+
+
+def _database() -> Database:
+    return Database(None, DBConfig("", "", "", "", "", backend="sqlite"))  # type: ignore
+
+
+async def _getch_racing_a_write() -> tuple[object, bool, bool]:
+    db = _database()
+    await db.initate_database(chunk=False, listen=False)
+    held = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold() -> None:
+        # the fetch below waits for this connection, so the write lands while it's in flight.
+        async with db.acquire():
+            held.set()
+            await release.wait()
+
+    try:
+        holder = asyncio.create_task(hold())
+        await held.wait()
+        fetch = asyncio.create_task(db.getch(Table.USERS, 1))
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # what add_user does once its row is in, the fetch started before that.
+        db._forget_absent(Table.USERS, 1)
+        release.set()
+        await holder
+        record = await fetch
+        return record, (Table.USERS, 1) in db._absent, bool(db._absent_generations)
+    finally:
+        await db.close()
+
+
+def test_getch_racing_a_write_does_not_mark_absent() -> None:
+    record, absent, generations = asyncio.run(_getch_racing_a_write())
+    assert record is None
+    assert not absent
+    assert not generations
+
+
+async def _getch_missing() -> bool:
+    db = _database()
+    await db.initate_database(chunk=False, listen=False)
+    try:
+        assert await db.getch(Table.USERS, 1) is None
+        return (Table.USERS, 1) in db._absent
+    finally:
+        await db.close()
+
+
+def test_getch_marks_missing_rows_absent() -> None:
+    assert asyncio.run(_getch_missing())
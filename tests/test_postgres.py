@@ -0,0 +1,380 @@
+"""The queries :mod:`Manager.database` generates, run against a real Postgres.
+
+The SQLite backend can't check the parts that only exist in Postgres: the
+migrations, the triggers, LISTEN/NOTIFY and replicas. These tests run when
+``AGB_TEST_POSTGRES_DSN`` points to a server the tests may create databases
+on, every run creates its own database and drops it afterwards:
+
+.. code-block:: sh
+
+    AGB_TEST_POSTGRES_DSN=postgresql://postgres@localhost:5432/postgres python -m pytest tests/test_postgres.py
+
+The replica tests also need ``AGB_TEST_POSTGRES_REPLICA_DSN``, a streaming
+replica of that server. Its database is the one the tests created.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+import asyncpg
+import pytest
+from utils.errors import DatabaseError
+
+from Manager.database import Database, PoolManager, Table, table_info
+from Manager.database.sqlite import _DEFAULTS
+from Manager.database.types import DBConfig, ValidBadge
+from Manager.database.watermark import UPDATED_AT_COLUMN
+
+T = TypeVar("T")
+
+DSN = os.environ.get("AGB_TEST_POSTGRES_DSN")
+REPLICA_DSN = os.environ.get("AGB_TEST_POSTGRES_REPLICA_DSN")
+
+pytestmark = pytest.mark.skipif(DSN is None, reason="AGB_TEST_POSTGRES_DSN is not set")
+
+# installed by the database itself, the tests check it does.
+_INSTALLED_COLUMNS: frozenset[str] = frozenset((UPDATED_AT_COLUMN, "expires_at"))
+_POSTGRES_TYPES: dict[type, str] = {bool: "boolean", int: "bigint", str: "text", datetime: "timestamptz"}
+
+
+def _column_type(types: tuple[type, ...], item_types: tuple[type, ...]) -> str:
+    if list in types:
+        return f"{_column_type(item_types, ())}[]"
+    for kind, name in _POSTGRES_TYPES.items():
+        if kind in types:
+            return name
+    return "text"
+
+
+def _schema() -> list[str]:
+    # the production schema predates the repo, this is it as table_info describes it.
+    statements: list[str] = []
+    for table, info in table_info.items():
+        if table is Table.BADGES:
+            # the old layout, startup has to migrate it.
+            columns = ", ".join(f"{badge} bigint[] NOT NULL DEFAULT '{{}}'" for badge in ValidBadge.__args__)
+            statements.append(f"CREATE TABLE {table} ({columns})")
+            continue
+
+        definitions: list[str] = []
+        if info.key_column not in info.columns:
+            definitions.append(f"{info.key_column} serial PRIMARY KEY")
+        for column, validator in info.columns.items():
+            if column in _INSTALLED_COLUMNS:
+                continue
+            if column == info.key_column == "id":
+                definition = f"{column} serial"
+            else:
+                definition = f"{column} {_column_type(validator.types, validator.item_types)}"
+            if column == info.key_column:
+                definition += " PRIMARY KEY"
+            elif (table, column) in _DEFAULTS:
+                definition += f" DEFAULT {_DEFAULTS[table, column]}"
+            definitions.append(definition)
+        statements.append(f"CREATE TABLE {table} ({', '.join(definitions)})")
+    return statements
+
+
+def _with_database(dsn: str, database: str) -> str:
+    parts = urlsplit(dsn)
+    return urlunsplit(parts._replace(path=f"/{database}"))
+
+
+def _config(dsn: str, **extra: Any) -> Any:
+    parts = urlsplit(dsn)
+    query = parse_qs(parts.query)
+    # unix sockets are given as ?host=/path
+    host = query.get("host", [parts.hostname or "localhost"])[0]
+    config = DBConfig(host, parts.username or "", parts.password or "", parts.path.lstrip("/"), str(parts.port or 5432))
+    if not extra:
+        return config
+    return SimpleNamespace(**config._asdict(), **extra)
+
+
+@pytest.fixture(scope="module")
+def dsn() -> Iterator[str]:
+    assert DSN is not None
+    name = f"agb_test_{secrets.token_hex(4)}"
+
+    async def create() -> None:
+        admin = await asyncpg.connect(DSN)
+        try:
+            await admin.execute(f"CREATE DATABASE {name}")
+        finally:
+            await admin.close()
+
+        connection = await asyncpg.connect(_with_database(DSN, name))
+        try:
+            for statement in _schema():
+                await connection.execute(statement)
+            await connection.execute(f"INSERT INTO {Table.BADGES} (owner, friend) VALUES ($1, $2)", [1, 2], [2])
+            await connection.execute(
+                f"INSERT INTO {Table.BLACKLIST} (userid, blacklisted, blacklistedtill) VALUES ($1, true, $2)",
+                10,
+                (datetime.now(timezone.utc) + timedelta(days=2)).strftime("%Y-%m-%d %H:%M:%S"),
+            )
+        finally:
+            await connection.close()
+
+    async def drop() -> None:
+        admin = await asyncpg.connect(DSN)
+        try:
+            await admin.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        finally:
+            await admin.close()
+
+    asyncio.run(create())
+    try:
+        yield _with_database(DSN, name)
+    finally:
+        asyncio.run(drop())
+
+
+def _run(dsn: str, test: Callable[..., Awaitable[T]], *, instances: int = 1, **extra: Any) -> T:
+    async def run() -> T:
+        databases = [Database(None, _config(dsn, **extra)) for _ in range(instances)]  # type: ignore
+        try:
+            for db in databases:
+                await db.initate_database(chunk=False)
+            return await test(*databases)
+        finally:
+            for db in databases:
+                await db.close()
+
+    return asyncio.run(run())
+
+
+async def _eventually(check: Callable[[], bool], *, timeout: float = 5.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not check():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+def test_startup_migrates_the_schema(dsn: str) -> None:
+    async def test(db: Database) -> None:
+        assert db.badge_index.loaded and db.blacklist_index.loaded and db.autopost_channels.loaded
+        assert db.badge_index.badges_of(1) == {"owner"}
+        assert db.badge_index.badges_of(2) == {"owner", "friend"}
+        assert await db.fetchval("SELECT to_regclass($1)", "badges_legacy") is not None
+
+        # the temporary blacklist got its expires_at backfilled and scheduled.
+        assert db.is_blacklisted(10)
+        assert await db.fetchval(f"SELECT expires_at FROM {Table.BLACKLIST} WHERE userid = 10") is not None
+        assert 10 in db.blacklist_expiry._expiries
+
+        triggers = {row["tgname"] for row in await db.fetch("SELECT tgname FROM pg_trigger WHERE NOT tgisinternal")}
+        assert {f"agb_{table}_touch_updated_at" for table in Table} <= triggers
+        events = ("insert", "update", "delete")
+        assert {f"agb_{table}_notify_{event}" for table in Table for event in events} <= triggers
+        indexes = {row["indexname"] for row in await db.fetch("SELECT indexname FROM pg_indexes")}
+        assert {"guilds_hentaichannel_idx", "badges_userid_idx"} <= indexes
+
+    _run(dsn, test)
+    # a second startup finds everything in place.
+    _run(dsn, test)
+
+
+def test_ensure_user_and_edit(dsn: str) -> None:
+    async def test(db: Database) -> None:
+        created = await db.ensure_user(100)
+        assert set(created) == {Table.USERS, Table.USERECO}
+        assert await db.ensure_user(100) == []
+
+        user = await db.getch(Table.USERS, 100)
+        assert user is not None and user.usedcmds == 0 and user.bio == "Mysterious User."
+        await user.edit(bio="hello", usedcmds=5)
+        row = await db.fetchrow(f"SELECT bio, usedcmds FROM {Table.USERS} WHERE userid = 100")
+        assert (row["bio"], row["usedcmds"]) == ("hello", 5)
+
+        guild = await db.add_guild(200, cache=True)
+        await guild.edit(hentaichannel=300)
+        assert db.autopost_channels.get(200) == 300
+
+        badge = await db.add_badge("mod")
+        await badge.add(100)  # type: ignore
+        assert db.badge_index.badges_of(100) == {"mod"}
+        assert await db.fetchval(f"SELECT count(*) FROM {Table.BADGES} WHERE userid = 100") == 1
+
+    _run(dsn, test)
+
+
+def test_ensure_user_from_two_processes(dsn: str) -> None:
+    async def drop_primary_key() -> None:
+        # older deployments created usereco without one.
+        connection = await asyncpg.connect(dsn)
+        try:
+            await connection.execute(f"ALTER TABLE {Table.USERECO} DROP CONSTRAINT IF EXISTS {Table.USERECO}_pkey")
+        finally:
+            await connection.close()
+
+    async def test(first: Database, second: Database) -> None:
+        assert await first.fetchval("SELECT to_regclass($1)", f"{Table.USERECO}_userid_key") is not None
+        created = await asyncio.gather(first.ensure_user(700), second.ensure_user(700))
+        # each row is created by exactly one of them.
+        assert sorted(str(table) for tables in created for table in tables) == [str(Table.USERECO), str(Table.USERS)]
+        for table in (Table.USERS, Table.USERECO):
+            assert await first.fetchval(f"SELECT count(*) FROM {table} WHERE userid = 700") == 1
+
+    asyncio.run(drop_primary_key())
+    _run(dsn, test, instances=2)
+
+
+def test_queries_between_streamed_batches(dsn: str) -> None:
+    async def test(db: Database) -> None:
+        for user_id in range(800, 810):
+            await db.ensure_user(user_id)
+
+        seen: list[int] = []
+        async for batch in db.stream(Table.USERS, batch_size=3):
+            # the cursor's connection isn't pinned, so a failing query here can't abort its transaction.
+            assert db.pinned_connection is None
+            with pytest.raises(DatabaseError):
+                await db.execute("SELECT * FROM agb_missing_table")
+            seen.extend(user.userid for user in batch)  # type: ignore
+        assert set(range(800, 810)) <= set(seen)
+        assert set(range(800, 810)) <= {user_id async for user_id in db.distinct_ids(Table.USERS, Table.USERECO)}
+
+    _run(dsn, test)
+
+
+def test_changes_reach_other_processes(dsn: str) -> None:
+    async def test(first: Database, second: Database) -> None:
+        await first.ensure_user(400)
+        await second.ensure_user(400)
+        cached = await first.getch(Table.USERS, 400)
+        assert cached is not None and first._invalidator.listening
+
+        # NOTIFY reaches the other process, which patches its cache.
+        await (await second.getch(Table.USERS, 400)).edit(bio="changed")  # type: ignore
+        assert await _eventually(lambda: first.get_user(400).bio == "changed")  # type: ignore
+
+        await second.add_blacklist(400, blacklisted=True)
+        assert await _eventually(lambda: first.is_blacklisted(400))
+
+        await second.remove_user(400)
+        assert await _eventually(lambda: first.get_user(400) is None)  # type: ignore
+
+    _run(dsn, test, instances=2)
+
+
+def test_batched_writes_notify_once_per_statement(dsn: str) -> None:
+    async def test(first: Database, second: Database) -> None:
+        user_ids = list(range(1000, 1300))
+        await second.execute(f"INSERT INTO {Table.USERS} (userid) SELECT unnest($1::bigint[])", user_ids)
+        for user_id in user_ids:
+            await first.getch(Table.USERS, user_id)
+
+        received = first._invalidator.received
+        # like the usedcmds flush, one statement over many rows.
+        await second.execute(f"UPDATE {Table.USERS} SET usedcmds = usedcmds + 1 WHERE userid = ANY($1)", user_ids)
+        assert await _eventually(
+            lambda: all(first.get_user(user_id).usedcmds == 1 for user_id in user_ids)  # type: ignore
+        )
+        # 300 keys, KEYS_PER_NOTIFICATION per notification.
+        assert first._invalidator.received - received == 2
+
+        await second.execute(f"DELETE FROM {Table.USERS} WHERE userid = ANY($1)", user_ids)
+        assert await _eventually(lambda: all(first.get_user(user_id) is None for user_id in user_ids))
+
+    _run(dsn, test, instances=2)
+
+
+def test_refresh_reads_changes_past_the_watermark(dsn: str) -> None:
+    async def test(db: Database) -> None:
+        await db.ensure_user(500)
+        user = await db.getch(Table.USERS, 500)
+        # written behind the database's back, no trigger tells it about this.
+        await db._invalidator.close()
+        await db.execute(f"UPDATE {Table.USERS} SET bio = 'outside' WHERE userid = 500")
+        assert user.bio != "outside"  # type: ignore
+        assert await db.refresh(Table.USERS) >= 1
+        assert db.get_user(500).bio == "outside"  # type: ignore
+
+    _run(dsn, test)
+
+
+def test_pool_limit_follows_the_load(dsn: str) -> None:
+    async def test() -> None:
+        manager = PoolManager(min_size=1, max_size=4, target_wait=0.02)
+        await manager.create(dsn=dsn)
+        try:
+            held = [await manager.acquire()]
+            assert manager.limit == 1
+
+            # a second caller waits for the only connection, then gets the limit raised.
+            held.append(await manager.acquire())
+            assert manager.limit == 2
+            held.extend(await asyncio.gather(manager.acquire(), manager.acquire()))
+            assert manager.limit == 4 and manager.saturated
+            assert manager.size == 4
+
+            for connection in held:
+                await manager.release(connection)
+            # the acquires above waited, the limit stays until a quiet interval.
+            assert manager._shrink() == 4
+            assert manager._shrink() == 3
+            assert manager._shrink() == 2
+            assert manager._shrink() == 1
+            assert manager._shrink() == 1
+        finally:
+            await manager.close()
+
+    asyncio.run(test())
+
+
+@pytest.mark.skipif(REPLICA_DSN is None, reason="AGB_TEST_POSTGRES_REPLICA_DSN is not set")
+def test_reads_go_to_the_replica(dsn: str) -> None:
+    assert REPLICA_DSN is not None
+    replica_dsn = _with_database(REPLICA_DSN, urlsplit(dsn).path.lstrip("/"))
+
+    async def test(db: Database) -> None:
+        router = db.replicas
+        assert router is not None
+        replica = router.replicas[0]
+        assert replica.healthy
+
+        def fresh(coro: Awaitable[T]) -> asyncio.Task[T]:
+            # startup wrote from this task, its reads stick to the primary for a while.
+            return asyncio.create_task(coro, context=contextvars.Context())  # type: ignore
+
+        async def read() -> bool:
+            return await db.fetchval("SELECT pg_is_in_recovery()")
+
+        queries = replica.queries
+        assert await fresh(read()) is True
+        assert replica.queries == queries + 1
+
+        # reads following a write in the same task stay on the primary.
+        async def write_then_read() -> Optional[int]:
+            await db.execute(f"INSERT INTO {Table.USERS} (userid) VALUES (600)")
+            return await db.fetchval(f"SELECT userid FROM {Table.USERS} WHERE userid = 600")
+
+        assert await fresh(write_then_read()) == 600
+        assert replica.queries == queries + 1
+
+        # pinned connections may hold uncommitted writes, they're never routed.
+        async def read_in_transaction() -> bool:
+            async with db.transaction():
+                return await read()
+
+        assert await fresh(read_in_transaction()) is False
+
+        # the primary runs the reads a replica failed.
+        await replica.manager.close()
+        assert await fresh(read()) is False
+        assert not replica.healthy and router.fallbacks == 1
+        await replica.manager.create(dsn=replica.dsn)
+        assert await router.check(replica)
+        assert await fresh(read()) is True
+
+    _run(dsn, test, replicas=[replica_dsn])
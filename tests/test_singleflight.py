@@ -0,0 +1,129 @@
+"""Single-flight must not share calls with tasks holding a pinned connection.
+
+Runs against the in-process SQLite backend, see :mod:`Manager.database.sqlite`.
+It has a single connection, so a task holding it makes every other task wait.
+"""
+from __future__ import annotations
+
+import asyncio
+
+from Manager.database import Database, Table
+from Manager.database.types import DBConfig
+
+
+def _database() -> Database:
+    return Database(None, DBConfig("", "", "", "", "", backend="sqlite"))  # type: ignore
+
+
+async def _concurrent_getch_inside_transaction() -> tuple[object, object, int]:
+    db = _database()
+    await db.initate_database(chunk=False, listen=False)
+    inserted = asyncio.Event()
+    waiting = asyncio.Event()
+
+    async def in_transaction() -> object:
+        async with db.transaction():
+            await db.execute(f"INSERT INTO {Table.USERS} (userid) VALUES ($1)", 1)
+            inserted.set()
+            await waiting.wait()
+            # joining the other task's call would wait for our own connection and miss our uncommitted row.
+            return await asyncio.wait_for(db.getch(Table.USERS, 1), timeout=5)
+
+    async def outside() -> object:
+        await inserted.wait()
+        waiting.set()
+        # starts the shared call, it waits for the connection the transaction holds.
+        return await db.getch(Table.USERS, 1)
+
+    try:
+        inside, other = await asyncio.gather(in_transaction(), outside())
+        return inside, other, db._single_flight.saved
+    finally:
+        await db.close()
+
+
+def test_getch_inside_transaction_does_not_join_shared_call() -> None:
+    inside, outside, saved = asyncio.run(_concurrent_getch_inside_transaction())
+    assert inside is not None and inside.userid == 1  # type: ignore
+    # committed by the time the other task's query ran.
+    assert outside is not None and outside.userid == 1  # type: ignore
+    assert saved == 0
+
+
+async def _concurrent_getch() -> tuple[object, object, int]:
+    db = _database()
+    await db.initate_database(chunk=False, listen=False)
+    await db.execute(f"INSERT INTO {Table.USERS} (userid) VALUES ($1)", 1)
+    held = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold() -> None:
+        # keeps both calls below in flight at once.
+        async with db.acquire():
+            held.set()
+            await release.wait()
+
+    async def getch() -> object:
+        await held.wait()
+        return await db.getch(Table.USERS, 1)
+
+    try:
+        holder = asyncio.create_task(hold())
+        first = asyncio.create_task(getch())
+        second = asyncio.create_task(getch())
+        for _ in range(5):
+            await asyncio.sleep(0)
+        release.set()
+        await holder
+        return await first, await second, db._single_flight.saved
+    finally:
+        await db.close()
+
+
+def test_concurrent_getch_share_one_call() -> None:
+    first, second, saved = asyncio.run(_concurrent_getch())
+    assert first is not None and second is not None
+    assert saved == 1
+
+
+async def _critical_getch_beside_non_critical() -> tuple[object, object, int]:
+    db = _database()
+    await db.initate_database(chunk=False, listen=False)
+    await db.execute(f"INSERT INTO {Table.USERS} (userid) VALUES ($1)", 1)
+    held = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold() -> None:
+        # saturates the pool, non critical queries give up instead of waiting.
+        async with db.acquire():
+            held.set()
+            await release.wait()
+
+    async def non_critical() -> object:
+        await held.wait()
+        with db.non_critical():
+            return await db.getch(Table.USERS, 1)
+
+    async def critical() -> object:
+        await held.wait()
+        return await db.getch(Table.USERS, 1)
+
+    try:
+        holder = asyncio.create_task(hold())
+        dropped = asyncio.create_task(non_critical())
+        waited = asyncio.create_task(critical())
+        for _ in range(5):
+            await asyncio.sleep(0)
+        release.set()
+        await holder
+        return await dropped, await waited, db._single_flight.saved
+    finally:
+        await db.close()
+
+
+def test_critical_getch_does_not_join_non_critical_call() -> None:
+    dropped, waited, saved = asyncio.run(_critical_getch_beside_non_critical())
+    assert dropped is None
+    # would have been the non critical call's PoolSaturated, read as a missing row.
+    assert waited is not None and waited.userid == 1  # type: ignore
+    assert saved == 0
@@ -17,6 +17,13 @@ class DatabaseError(Exception):
         super().__init__(self.message)
 
 
+class PoolSaturated(DatabaseError):
+    """Raised instead of waiting for a connection when the pool is saturated and the caller isn't critical."""
+
+    def __init__(self, size: int):
+        super().__init__(f"All {size} connections of the pool are in use")
+
+
 class DisabledCommand(CheckFailure):
     def __init__(
         self,
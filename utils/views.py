@@ -98,17 +98,7 @@ we will take action against any image that is deemed to be in violation of our r
 
     async def temp_ban_user(self, interaction: Interaction, /, user_id: int) -> None:
         bot: AGB = interaction.client  # type: ignore
-        base_kwargs = {
-            "blacklisted": True,
-            "blacklistedtill": self.TEMP_BAN_DAYS,
-            "reason": self.TEMP_BAN_REASON,
-        }
-
-        is_blacklisted = await bot.db.fetch_blacklist(user_id)
-        if is_blacklisted:
-            await is_blacklisted.edit(**base_kwargs)
-        else:
-            await bot.db.add_blacklist(user_id=user_id, **base_kwargs)
+        await bot.db.temp_blacklist(user_id, self.TEMP_BAN_DAYS, self.TEMP_BAN_REASON)
 
     async def delete_message(self, message: Optional[MessageT], /, *, delay: Optional[int] = None) -> Optional[str]:
         # can happen i guess
@@ -191,8 +181,11 @@ class APIImageReporter(APIImageReportView):
     async def interaction_check(self, interaction: Interaction) -> bool:
         bot: AGB = interaction.client  # type: ignore
         user_id = interaction.user.id
-        blacklisted_user = await bot.db.fetch_blacklist(user_id)
+        # looked up until the index is loaded, so a failed load doesn't let blacklisted users through.
+        if bot.db.blacklist_index.loaded and not bot.db.is_blacklisted(user_id):
+            return True
 
+        blacklisted_user = bot.db.get_blacklist(user_id) or await bot.db.fetch_blacklist(user_id, cache=True)
         if blacklisted_user and blacklisted_user.is_blacklisted:
             await interaction.response.send_message(
                 f"You are blacklisted from using this bot for the following reason\n`{blacklisted_user.reason}`",